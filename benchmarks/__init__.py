@@ -0,0 +1 @@
+# Benchmarks for the invoicing pipeline, run from the project root (e.g. python -m benchmarks.template)
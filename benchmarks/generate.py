@@ -0,0 +1,144 @@
+# Synthetic clients, items and batch files of any size for the benchmarks
+
+# Imports
+import argparse
+import csv
+import json
+import os
+import random
+from utils import Catalog, Client, Item
+from utils.batch import LONG_COLUMNS
+
+# Constants
+DESCRIPTION = """Writes synthetic client and item list CSVs and a batch file of the requested size."""
+DUE = "2030-01-01"
+SEED = 0  # Every run generates the same data
+
+
+def make_clients(count: int) -> list[Client]:
+
+    """Returns clients named Client 0 to Client count - 1."""
+
+    return [Client(f"Client {i}", f"{i} Example Street", "City, State/Province, Country") for i in range(count)]
+
+
+def make_items(count: int) -> list[Item]:
+
+    """Returns items named Item 0 to Item count - 1, with prices from $0.01 to $999.99."""
+
+    generator = random.Random(SEED)
+
+    return [
+        Item(f"Item {i}", f"Description of item {i} & its <options>", generator.randint(1, 99999) / 100, 0)
+        for i in range(count)
+    ]
+
+
+def make_catalog(clients: int, items: int) -> Catalog:
+
+    """Returns a catalog of synthetic clients and items."""
+
+    return Catalog(items=make_items(items), clients=make_clients(clients))
+
+
+def write_clients(filename: str, count: int):
+
+    """Writes a client list CSV."""
+
+    with open(filename, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["name", "address", "location"])
+        writer.writerows([client.name, client.address, client.location] for client in make_clients(count))
+
+
+def write_items(filename: str, count: int):
+
+    """Writes an item list CSV."""
+
+    with open(filename, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["name", "description", "price"])
+        writer.writerows([item.name, item.description, f"{item.price:.2f}"] for item in make_items(count))
+
+
+def batch_rows(invoices: int, items_per_invoice: int, clients: int, items: int):
+
+    """Yields the invoice key, client, due date, item name and quantity of every line item of a synthetic batch."""
+
+    generator = random.Random(SEED)
+
+    for invoice in range(invoices):
+        for line in range(items_per_invoice):
+            name = f"Item {(invoice + line) % items}"
+            yield invoice, f"Client {invoice % clients}", DUE, name, generator.randint(1, 9)
+
+
+def write_batch(filename: str, invoices: int, items_per_invoice: int, clients: int, items: int):
+
+    """Writes a synthetic long format batch file, as JSONL if the filename ends in .jsonl and as CSV otherwise."""
+
+    rows = batch_rows(invoices, items_per_invoice, clients, items)
+
+    with open(filename, "w", newline="") as file:
+
+        if filename.endswith(".jsonl"):
+            for row in rows:
+                file.write(json.dumps(dict(zip(LONG_COLUMNS, row))) + "\n")
+            return
+
+        writer = csv.writer(file)
+        writer.writerow(LONG_COLUMNS)
+        writer.writerows(rows)
+
+
+def write_wide_batch(filename: str, invoices: int, items_per_invoice: int, clients: int, items: int):
+
+    """Writes a synthetic batch in the original wide format, one column per invoice."""
+
+    columns = [[f"Client {invoice % clients}", DUE] for invoice in range(invoices)]
+
+    for invoice, client, due, name, quantity in batch_rows(invoices, items_per_invoice, clients, items):
+        columns[invoice].append(f"{name}, {quantity}")
+
+    with open(filename, "w", newline="") as file:
+        csv.writer(file).writerows(zip(*columns))
+
+
+def generate(directory: str, clients: int, items: int, invoices: int, items_per_invoice: int, wide=False) -> dict:
+
+    """Writes a client list, item list and batch file to the directory and returns their paths."""
+
+    os.makedirs(directory, exist_ok=True)
+
+    files = {
+        "clients": os.path.join(directory, "clients.csv"),
+        "items": os.path.join(directory, "items.csv"),
+        "batch": os.path.join(directory, "batch.csv"),
+    }
+
+    write_clients(files["clients"], clients)
+    write_items(files["items"], items)
+    (write_wide_batch if wide else write_batch)(files["batch"], invoices, items_per_invoice, clients, items)
+
+    return files
+
+
+def main():
+
+    parser = argparse.ArgumentParser(DESCRIPTION)
+    parser.add_argument("directory", help="Directory to write clients.csv, items.csv and batch.csv to.")
+    parser.add_argument("-clients", type=int, default=100, help="Number of clients.")
+    parser.add_argument("-items", type=int, default=200, help="Number of items.")
+    parser.add_argument("-invoices", type=int, default=1000, help="Number of invoices in the batch.")
+    parser.add_argument("-lines", type=int, default=5, help="Number of line items per invoice.")
+    parser.add_argument("-wide", action="store_true", help="Writes the batch in the wide format.")
+    arg = parser.parse_args()
+
+    files = generate(arg.directory, arg.clients, arg.items, arg.invoices, arg.lines, arg.wide)
+
+    for kind, filename in files.items():
+        print(f"{kind}: {filename}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Memory benchmark showing batch runs stay flat as the number of invoices grows
+
+# Imports
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.generate import make_catalog, write_batch
+from utils import Issuer, Template
+
+# Constants
+DESCRIPTION = """Measures peak traced memory and RSS of batch runs of increasing size, each in a fresh process."""
+CLIENTS = 100
+ITEMS = 200
+
+
+def measure(invoices: int, items_per_invoice: int, workers: int) -> dict:
+
+    """Runs one batch of HTML invoices in a temporary directory and returns its peak memory use."""
+
+    Template.set_issuer(Issuer("Brand & Co", "Brand account", "Bank", "billing@brand.com", 5555555555))
+    Template.set_terms("Payment is due within 30 days of the date of issue.")
+
+    catalog = make_catalog(CLIENTS, ITEMS)
+
+    resources = os.path.abspath("resources")
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        os.symlink(resources, os.path.join(directory, "resources"))
+        os.chdir(directory)
+        write_batch("batch.jsonl", invoices, items_per_invoice, CLIENTS, ITEMS)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+
+        Template.batch_from_file("batch.jsonl", catalog, workers=workers)
+
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "invoices": invoices,
+        "seconds": round(elapsed, 3),
+        "traced_peak_kib": peak // 1024,
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(DESCRIPTION)
+    parser.add_argument("-sizes", default="1000,10000", help="Comma separated batch sizes, e.g. 1000,10000,100000.")
+    parser.add_argument("-items", type=int, default=5, help="Number of line items per invoice.")
+    parser.add_argument("-workers", type=int, default=1, help="Number of worker processes.")
+    parser.add_argument("-single", type=int, help=argparse.SUPPRESS)  # Measures one size in this process
+    arg = parser.parse_args()
+
+    if arg.single:
+        print(json.dumps(measure(arg.single, arg.items, arg.workers)))
+        return
+
+    print(f"{'invoices':>10} {'seconds':>9} {'traced peak':>12} {'max RSS':>10}")
+
+    for size in map(int, arg.sizes.split(",")):
+
+        # A fresh process per size, since the maximum RSS of a process never goes down
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.memory", "-single", str(size), "-items", str(arg.items),
+             "-workers", str(arg.workers)],
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+
+        result = json.loads(output)
+        print(
+            f"{result['invoices']:>10} {result['seconds']:>9.2f} {result['traced_peak_kib']:>9} KiB "
+            f"{result['max_rss_kib'] // 1024:>6} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Benchmark of rendering invoices with long item tables
+
+# Imports
+import argparse
+import io
+import time
+from utils import OPTIONS, Client, Issuer, Item, Template
+from utils.native import PAGE_SIZES, PdfDocument, draw_invoice
+
+# Constants
+DESCRIPTION = """Times rendering one invoice at several item table lengths, paginated into pages of a fixed number of
+rows, to show the cost per row stays flat."""
+
+
+def make_template(rows: int) -> Template:
+
+    """Returns an invoice with the given number of line items."""
+
+    client = Client("John Doe", "1344 Example Street", "City, State/Province, Country")
+    items = [Item(f"Usage <{i}>", f"Metered usage & fees, period {i}", 0.25 + i % 100, i % 7 + 1) for i in range(rows)]
+
+    return Template(client, items, due="2030-01-01")
+
+
+def parsed_rows(template: Template) -> str:
+
+    """Renders the item table the old way, parsing every row into its own BeautifulSoup object."""
+
+    return "".join(str(item.html) for item in template.items)
+
+
+def drawn_pdf(template: Template) -> bytes:
+
+    """Draws the invoice with the native renderer into memory."""
+
+    file = io.BytesIO()
+    document = PdfDocument(file, PAGE_SIZES[OPTIONS["page-size"]])
+    draw_invoice(document, template.layout())
+    document.close()
+
+    return file.getvalue()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(DESCRIPTION)
+    parser.add_argument("-rows", default="10,1000,50000", help="Comma separated item table lengths.")
+    parser.add_argument("-parsed", action="store_true", help="Also time parsing each row with BeautifulSoup.")
+    parser.add_argument("-native", action="store_true", help="Also time drawing the PDF with the native renderer.")
+    parser.add_argument("-rows-per-page", type=int, default=10, help="Number of item rows per page.")
+    arg = parser.parse_args()
+
+    Template.set_issuer(Issuer("Brand & Co", "Brand account", "Bank", "billing@brand.com", 5555555555))
+    Template.set_terms("Payment is due within 30 days of the date of issue.")
+    Template.set_rows_per_page(arg.rows_per_page)
+    Template(Client("", "", ""), [], due="2030-01-01").render()  # Compile the template outside of the timings
+
+    header = f"{'rows':>8} {'pages':>6} {'render':>10} {'per row':>10}"
+    header += f" {'parsed':>10} {'per row':>10}" if arg.parsed else ""
+    header += f" {'native':>10} {'per row':>10}" if arg.native else ""
+    print(header)
+
+    for rows in map(int, arg.rows.split(",")):
+
+        template = make_template(rows)
+
+        start = time.perf_counter()
+        template.render()
+        elapsed = time.perf_counter() - start
+
+        line = f"{rows:>8} {len(template.pages()):>6} {elapsed * 1000:>8.2f}ms {elapsed / rows * 1e6:>8.2f}us"
+
+        if arg.parsed:
+            start = time.perf_counter()
+            parsed_rows(template)
+            parsed = time.perf_counter() - start
+            line += f" {parsed * 1000:>8.2f}ms {parsed / rows * 1e6:>8.2f}us"
+
+        if arg.native:
+            start = time.perf_counter()
+            drawn_pdf(template)
+            drawn = time.perf_counter() - start
+            line += f" {drawn * 1000:>8.2f}ms {drawn / rows * 1e6:>8.2f}us"
+
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Startup time budget for the CLI, measured with python -X importtime
+
+# Imports
+import argparse
+import subprocess
+import sys
+
+# Constants
+DESCRIPTION = """Fails if the CLI imports heavy modules at startup or its import time goes over budget."""
+
+# Commands that should start without pandas, bs4 or pdfkit
+COMMANDS = {
+    "create.py -h": ["create.py", "-h"],
+    "create.py batch -h": ["create.py", "batch", "-h"],
+    "interactive imports": ["-c", "import interface, inputs"],
+}
+
+HEAVY_MODULES = ["pandas", "numpy", "bs4", "pdfkit"]
+
+
+def import_times(command: list[str]) -> dict[str, int]:
+
+    """Returns the self import time in microseconds of every module the command imports."""
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *command],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_time, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(self_time)
+
+    return times
+
+
+def main():
+
+    parser = argparse.ArgumentParser(DESCRIPTION)
+    parser.add_argument("-budget", type=float, default=100, help="Import time budget per command in milliseconds.")
+    arg = parser.parse_args()
+
+    interpreter = import_times(["-c", "pass"])  # Imported by the interpreter itself, not the CLI
+    failed = False
+
+    for label, command in COMMANDS.items():
+
+        times = {name: time for name, time in import_times(command).items() if name not in interpreter}
+        total = sum(times.values()) / 1000
+        heavy = sorted({name.split(".")[0] for name in times} & set(HEAVY_MODULES))
+
+        print(f"{label}: {total:.1f}ms over {len(times)} modules (budget {arg.budget:.0f}ms)")
+
+        if heavy:
+            print(f"  imports heavy modules at startup: {', '.join(heavy)}")
+            failed = True
+
+        if total > arg.budget:
+            slowest = sorted(times.items(), key=lambda pair: pair[1], reverse=True)[:5]
+            print(
+                "  over budget, slowest modules: " + ", ".join(f"{name} {time / 1000:.1f}ms" for name, time in slowest)
+            )
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# Benchmark suite timing each stage of the invoicing pipeline and whole batches, with results saved as JSON
+
+# Imports
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from benchmarks.generate import generate
+from utils import EXPORT_FILE, OPTIONS, Catalog, Issuer, Template, cache_batch_totals, dataframe_from_csv
+from utils.batch import read_batch
+from utils.export import JsonLinesExporter
+from utils.renderers import NativeRenderer, Renderer
+from utils.validation import validate_batch
+
+# Constants
+DESCRIPTION = """Times each pipeline stage on synthetic data and runs whole batches without PDF conversion, with
+wkhtmltopdf, with the native renderer and as a JSON lines export, writing the results as JSON and optionally comparing
+them with the results of an earlier commit."""
+SLOWER = 1.1  # Ratio past which a benchmark is flagged as slower than the baseline
+
+
+def measure(function, repeat: int, calls: int = 1) -> dict:
+
+    """Times function over repeat rounds of calls, returning the fastest and median seconds per call."""
+
+    rounds = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        rounds.append((time.perf_counter() - start) / calls)
+
+    return {"best_seconds": round(min(rounds), 9), "median_seconds": round(statistics.median(rounds), 9)}
+
+
+def stage_benchmarks(files: dict, repeat: int) -> dict:
+
+    """Times each stage of the pipeline on its own."""
+
+    catalog = Catalog.from_csv(files["items"], files["clients"])
+    templates = list(Template.templates_from_file(files["batch"], catalog))
+    template = templates[0]
+    item = template.items[0]
+
+    def populate():
+        template.invoice = None
+        template.populate()
+
+    return {
+        "dataframe_from_csv": measure(lambda: list(dataframe_from_csv(files["items"])), repeat),
+        "catalog_from_csv": measure(lambda: Catalog.from_csv(files["items"], files["clients"]), repeat),
+        "read_batch": measure(lambda: sum(1 for invoice in read_batch(files["batch"])), repeat),
+        "validate_batch": measure(lambda: validate_batch(files["batch"], catalog), repeat),
+        "templates_from_file": measure(lambda: list(Template.templates_from_file(files["batch"], catalog)), repeat),
+        "batch_totals": measure(lambda: cache_batch_totals(templates), repeat),
+        "item_row": measure(lambda: item.row, repeat, 1000),
+        "item_html": measure(lambda: item.html, repeat, 100),
+        "render": measure(template.render, repeat, 100),
+        "populate": measure(populate, repeat, 10),
+    }
+
+
+def batch_benchmark(
+        files: dict,
+        invoices: int,
+        pdf: bool,
+        workers: int,
+        renderer: Renderer | None = None,
+        export=False
+) -> dict:
+
+    """
+    Runs a whole batch in a temporary directory, returning its duration and throughput. PDFs are converted with
+    wkhtmltopdf unless a renderer is given, and the batch is exported as JSON lines instead if export is set.
+    """
+
+    if pdf and not renderer and not shutil.which("wkhtmltopdf"):
+        return {"skipped": "wkhtmltopdf is not installed."}
+
+    catalog = Catalog.from_csv(files["items"], files["clients"])
+    project = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        os.symlink(os.path.join(project, "resources"), os.path.join(directory, "resources"))
+        os.chdir(directory)
+
+        try:
+            start = time.perf_counter()
+            if export:
+                Template.export_batch(files["batch"], catalog, JsonLinesExporter(EXPORT_FILE.format("jsonl")))
+                errors = {}
+            else:
+                errors = Template.batch_from_file(files["batch"], catalog, pdf=pdf, workers=workers, renderer=renderer)
+            elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(project)
+
+    return {
+        "seconds": round(elapsed, 6),
+        "invoices_per_second": round(invoices / elapsed, 3),
+        "errors": len(errors),
+    }
+
+
+def commit() -> str | None:
+
+    """Returns the current git commit, if the project is a git checkout."""
+
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict):
+
+    """Prints how every timing changed relative to a baseline's, flagging those that got slower."""
+
+    print(f"Compared with {baseline.get('commit') or 'baseline'}:")
+
+    timings = {f"stages.{name}": stage["best_seconds"] for name, stage in results["stages"].items()}
+    timings |= {f"batch.{name}": run["seconds"] for name, run in results["batch"].items() if "seconds" in run}
+
+    earlier = {f"stages.{name}": stage["best_seconds"] for name, stage in baseline["stages"].items()}
+    earlier |= {f"batch.{name}": run["seconds"] for name, run in baseline["batch"].items() if "seconds" in run}
+
+    for name, seconds in timings.items():
+
+        if not earlier.get(name):
+            print(f"{name:>30} {'new':>8}")
+            continue
+
+        ratio = seconds / earlier[name]
+        print(f"{name:>30} {ratio:>7.2f}x" + ("  slower" if ratio > SLOWER else ""))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(DESCRIPTION)
+    parser.add_argument("-clients", type=int, default=100, help="Number of synthetic clients.")
+    parser.add_argument("-items", type=int, default=200, help="Number of synthetic items.")
+    parser.add_argument("-invoices", type=int, default=200, help="Number of invoices per batch.")
+    parser.add_argument("-lines", type=int, default=5, help="Number of line items per invoice.")
+    parser.add_argument("-repeat", type=int, default=5, help="Number of rounds each stage is timed over.")
+    parser.add_argument("-workers", type=int, default=1, help="Number of worker processes for the batch runs.")
+    parser.add_argument("-no-pdf", action="store_true", help="Skips the batch run converting PDFs with wkhtmltopdf.")
+    parser.add_argument("-output", default="benchmark.json", help="File to write the JSON results to.")
+    parser.add_argument("-compare", help="JSON results of an earlier run to compare with.")
+    arg = parser.parse_args()
+
+    Template.set_issuer(Issuer("Brand & Co", "Brand account", "Bank", "billing@brand.com", 5555555555))
+    Template.set_terms("Payment is due within 30 days of the date of issue.")
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        files = generate(directory, arg.clients, arg.items, arg.invoices, arg.lines)
+
+        results = {
+            "commit": commit(),
+            "created": dt.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "parameters": {
+                "clients": arg.clients,
+                "items": arg.items,
+                "invoices": arg.invoices,
+                "lines": arg.lines,
+                "repeat": arg.repeat,
+                "workers": arg.workers,
+            },
+            "stages": stage_benchmarks(files, arg.repeat),
+            "batch": {
+                "html": batch_benchmark(files, arg.invoices, pdf=False, workers=arg.workers),
+                "native": batch_benchmark(files, arg.invoices, True, arg.workers, NativeRenderer(OPTIONS)),
+                "export": batch_benchmark(files, arg.invoices, pdf=False, workers=1, export=True),
+            },
+        }
+
+        if not arg.no_pdf:
+            results["batch"]["pdf"] = batch_benchmark(files, arg.invoices, pdf=True, workers=arg.workers)
+
+    with open(arg.output, "w") as file:
+        json.dump(results, file, indent=4)
+
+    for name, stage in results["stages"].items():
+        print(f"{name:>30} {stage['best_seconds'] * 1000:>10.3f}ms")
+
+    for name, run in results["batch"].items():
+        summary = run.get("skipped") or f"{run['invoices_per_second']:.1f} invoices/s"
+        print(f"{'batch ' + name:>30} {summary}")
+
+    if arg.compare:
+        with open(arg.compare) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
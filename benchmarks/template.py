@@ -0,0 +1,68 @@
+# Benchmark comparing the BeautifulSoup populate path with the compiled template render path
+
+# Imports
+import argparse
+import timeit
+from utils import ROWS_PER_PAGE, Item, Issuer, Client, Template
+
+# Constants
+DESCRIPTION = """Times filling out invoices with a fresh BeautifulSoup tree versus the compiled template."""
+
+
+def make_templates(count: int, items_per_invoice: int) -> list[Template]:
+
+    """Returns a list of identical-shape invoices with a handful of line items each."""
+
+    Template.set_issuer(Issuer("Brand & Co", "Brand account", "Bank", "billing@brand.com", 5555555555))
+    Template.set_terms("Payment is due within 30 days of the date of issue.")
+
+    client = Client("John Doe", "1344 Example Street", "City, State/Province, Country")
+    items = [Item(f"Item {i}", f"Description of item {i}", 9.99 + i, i + 1) for i in range(items_per_invoice)]
+
+    return [Template(client, items, due="2030-01-01") for _ in range(count)]
+
+
+def legacy(template: Template) -> str:
+
+    """Renders an invoice the way save used to: parse the template, then search and replace each field."""
+
+    template.invoice = None
+    template.populate()
+
+    return str(template.invoice)
+
+
+def compiled(template: Template) -> str:
+
+    """Renders an invoice from the compiled template."""
+
+    return template.render()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(DESCRIPTION)
+    parser.add_argument("-invoices", type=int, default=500, help="Number of invoices rendered per path.")
+    parser.add_argument("-items", type=int, default=5, help="Number of line items per invoice.")
+    arg = parser.parse_args()
+
+    # Only the compiled template splits long invoices over pages, so the two paths match on a single page
+    if arg.items > ROWS_PER_PAGE:
+        parser.error(f"-items must be at most {ROWS_PER_PAGE}, the item rows on a page.")
+
+    templates = make_templates(arg.invoices, arg.items)
+
+    # Both paths must produce the exact same document
+    assert legacy(templates[0]) == compiled(templates[0]), "Compiled output differs from the populated tree."
+
+    legacy_time = timeit.timeit(lambda: [legacy(template) for template in templates], number=1)
+    compiled_time = timeit.timeit(lambda: [compiled(template) for template in templates], number=1)
+
+    print(f"{arg.invoices} invoices, {arg.items} items each")
+    print(f"BeautifulSoup populate: {legacy_time:.3f}s ({legacy_time / arg.invoices * 1000:.3f}ms per invoice)")
+    print(f"Compiled template:      {compiled_time:.3f}s ({compiled_time / arg.invoices * 1000:.3f}ms per invoice)")
+    print(f"Speedup: {legacy_time / compiled_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
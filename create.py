@@ -2,22 +2,38 @@
 __author__ = "Matteo Golin"
 
 # Imports
-from utils import Item, Issuer, Client, Template
+import json
+import sys
+from utils import ARCHIVE_FILE, EXPORT_ARCHIVE_FILE, EXPORT_FILE, EXPORT_INDEX_FILE, INDEX_FILE, MANIFEST_FILE, OPTIONS
+from utils import Catalog, CompiledCatalog, Issuer, Template
+from utils.batch import convert_batch
+from utils.cache import RenderCache
+from utils.export import EXPORTERS
+from utils.manifest import RunManifest, shard_filename
+from utils.profiling import PROFILER
+from utils.renderers import RENDERERS
+from utils.sinks import ArchiveSink, OutputSink
+from utils.validation import validate_batch
 from interface import Interface
 from inputs import parser
 
-# Get command line arguments
-arg = parser.parse_args()
 
-# Get template from user input
-if arg.i:
-    interface = Interface()
-    template = interface.invoice_from_input()
-    template.save(pdf=True)
+# Functions
+def load_catalog(arg) -> Catalog:
 
-elif arg.command == "batch":
-    Item.from_csv(arg.items.name)
-    Client.from_csv(arg.clients.name)
+    """Returns the compiled catalog if given, otherwise the catalog of the client and item list CSVs."""
+
+    if arg.catalog:
+        return CompiledCatalog(arg.catalog.name)
+    elif arg.clients and arg.items:
+        return Catalog.from_csv(arg.items.name, arg.clients.name)
+
+    parser.error("Either the client and item list CSVs or a compiled --catalog is required.")
+
+
+def set_template(arg):
+
+    """Sets the issuer, terms and agreements, pagination and output layout every invoice is rendered with."""
 
     issuer = Issuer(
         name=arg.name,
@@ -34,4 +50,191 @@ elif arg.command == "batch":
     else:
         Template.terms_from_file(arg.terms_file.name)
 
-    Template.batch_from_file(arg.batch.name, pdf=True)
+    Template.set_rows_per_page(arg.rows_per_page)
+    Template.set_output_layout(arg.output_layout)
+
+
+def output_sink(arg) -> OutputSink:
+
+    """
+    Returns the sink indexing the batch's files, moving them into an archive if asked. Exports are indexed and archived
+    under names of their own, so they never replace the index or archive of a PDF run.
+    """
+
+    if arg.export:
+        index_file = arg.index or shard_filename(EXPORT_INDEX_FILE.format(arg.export), arg.shard)
+        archive_file = EXPORT_ARCHIVE_FILE.format(arg.export, arg.archive)
+    else:
+        index_file = arg.index or shard_filename(INDEX_FILE, arg.shard)
+        archive_file = ARCHIVE_FILE.format(arg.archive)
+
+    if arg.archive:
+        return ArchiveSink(index_file, shard_filename(archive_file, arg.shard))
+
+    return OutputSink(index_file, append=arg.incremental)
+
+
+def main():
+
+    # Get command line arguments
+    arg = parser.parse_args()
+
+    # Get template from user input
+    if arg.i:
+        interface = Interface()
+        template = interface.invoice_from_input()
+        template.save(pdf=True)
+
+    elif arg.command == "batch":
+
+        if arg.incremental and arg.merge_chunks:
+            parser.error("--incremental cannot be used with --merge-chunks, since merged chunks are regenerated whole.")
+
+        if arg.concurrency and (arg.workers > 1 or arg.chunk_size > 1 or arg.merge_chunks):
+            parser.error("--concurrency cannot be used with --workers, --chunk-size or --merge-chunks.")
+
+        if arg.concurrency and arg.renderer != "pdfkit":
+            parser.error("--concurrency only schedules wkhtmltopdf processes, so it needs the pdfkit renderer.")
+
+        if arg.merge and (
+                arg.workers > 1 or arg.chunk_size > 1 or arg.merge_chunks or arg.concurrency or arg.incremental
+        ):
+            parser.error(
+                "--merge cannot be used with --workers, --chunk-size, --merge-chunks, --concurrency or --incremental."
+            )
+
+        if arg.bookmarks and not arg.merge:
+            parser.error("--bookmarks can only be used with --merge.")
+
+        if arg.export and (
+                arg.workers > 1 or arg.chunk_size > 1 or arg.merge_chunks or arg.merge or arg.concurrency
+                or arg.incremental
+        ):
+            parser.error(
+                "--export cannot be used with --workers, --chunk-size, --merge-chunks, --merge, --concurrency or "
+                "--incremental."
+            )
+
+        if arg.export_file and arg.export not in ["jsonl", "csv"]:
+            parser.error("--export-file can only be used with --export jsonl or --export csv.")
+
+        if arg.archive and (arg.merge or arg.incremental):
+            parser.error("--archive cannot be used with --merge or --incremental, since the archive is written anew.")
+
+        if arg.profile or arg.profile_populate:
+            PROFILER.enable(profiled_stage="populate" if arg.profile_populate else None)
+
+        catalog = load_catalog(arg)
+
+        # Check the whole batch up front, so no invoice is rendered from a batch that would fail partway through
+        if arg.validate_only or not arg.no_validate:
+
+            problems = validate_batch(arg.batch.name, catalog)
+
+            for problem in problems:
+                print(problem, file=sys.stderr)
+
+            if problems:
+                sys.exit(1)
+
+            if arg.validate_only:
+                sys.exit(0)
+
+        set_template(arg)
+
+        if arg.export:
+
+            export_file = None
+            if arg.export != "ubl":  # UBL invoices are each written to a file of their own
+                export_file = arg.export_file or shard_filename(EXPORT_FILE.format(arg.export), arg.shard)
+
+            # Exports are only indexed if asked to be
+            sink = output_sink(arg) if arg.index or arg.archive else None
+
+            try:
+                Template.export_batch(
+                    arg.batch.name, catalog, EXPORTERS[arg.export](export_file, arg.currency), arg.shard, sink
+                )
+            finally:
+                if sink is not None:
+                    sink.close()
+
+            if PROFILER.enabled:
+                PROFILER.write_report(arg.profile or "profile.json")
+
+            sys.exit(0)
+
+        scheduler = None
+        if arg.concurrency:
+            from utils.scheduler import ConversionScheduler  # Only loads asyncio when it is used
+            scheduler = ConversionScheduler(OPTIONS, arg.concurrency, arg.timeout, arg.retries)
+
+        manifest_file = arg.manifest or shard_filename(MANIFEST_FILE, arg.shard)
+        manifest = RunManifest()
+        previous = RunManifest.load(manifest_file) if arg.incremental else None
+
+        sink = output_sink(arg)
+
+        try:
+            errors = Template.batch_from_file(
+                arg.batch.name,
+                catalog,
+                pdf=True,
+                workers=arg.workers,
+                chunk_size=arg.chunk_size,
+                merge_chunks=arg.merge_chunks,
+                keep_html=arg.keep_html,
+                cache=None if arg.no_cache else RenderCache(arg.cache_dir, arg.cache_size * 1024 ** 2),
+                manifest=manifest,
+                previous=previous,
+                shard=arg.shard,
+                scheduler=scheduler,
+                merged_file=arg.merge,
+                bookmarks=arg.bookmarks,
+                renderer=RENDERERS[arg.renderer](OPTIONS),
+                sink=sink
+            )
+        finally:
+            sink.close()
+
+        manifest.save(manifest_file)
+
+        if arg.incremental:
+            print(f"Regenerated {manifest.regenerated} of {len(manifest.invoices) + len(errors)} invoices.")
+
+        if PROFILER.enabled:
+            PROFILER.write_report(arg.profile or "profile.json")
+
+        if arg.profile_populate:
+            PROFILER.dump_stats(arg.profile_populate)
+
+        if arg.failure_report:
+            with open(arg.failure_report, "w") as file:
+                json.dump([{"invoice": number, "error": error} for number, error in errors.items()], file, indent=4)
+
+        # Report every invoice that failed to convert
+        for number, error in errors.items():
+            print(f"Invoice #{number} could not be converted to PDF. {error}", file=sys.stderr)
+
+        if errors:
+            sys.exit(1)
+
+    elif arg.command == "convert":
+        convert_batch(arg.source.name, arg.destination)
+
+    elif arg.command == "catalog":
+        CompiledCatalog.compile(Catalog.from_csv(arg.items.name, arg.clients.name), arg.destination)
+
+    elif arg.command == "merge-manifests":
+        RunManifest.merge([RunManifest.load(source.name) for source in arg.sources]).save(arg.destination)
+
+    elif arg.command == "serve":
+        from utils.server import InvoiceRenderer, serve  # Only loads the HTTP server when it is used
+
+        catalog = load_catalog(arg)
+        set_template(arg)
+        serve(InvoiceRenderer(catalog, RENDERERS[arg.renderer](OPTIONS), arg.workers), arg.host, arg.port, arg.socket)
+
+
+if __name__ == "__main__":
+    main()
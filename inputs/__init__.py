@@ -4,7 +4,13 @@ __author__ = "Matteo Golin"
 # Imports
 import argparse
 import re
-from utils import EMAIL_RE
+from utils import ARCHIVE_FILE, EMAIL_RE, EXPORT_ARCHIVE_FILE, EXPORT_FILE, EXPORT_INDEX_FILE, INDEX_FILE, MANIFEST_FILE
+from utils import MERGED_FILE, ROWS_PER_PAGE
+from utils.cache import CACHE_DIR, CACHE_SIZE
+from utils.export import CURRENCY, EXPORTERS
+from utils.manifest import shard_filename
+from utils.renderers import RENDERERS
+from utils.sinks import LAYOUTS
 
 # Constants
 DESCRIPTION = """Takes inputs for invoice generation."""
@@ -50,6 +56,151 @@ def Phone(number: str) -> int:
         raise ValueError("Phone number must be 10 digits long.")
 
 
+def PositiveInt(value: str) -> int:
+
+    """Positive integer validation type."""
+
+    value = int(value)
+
+    if value < 1:
+        raise ValueError(f"{value} is not a positive integer.")
+
+    return value
+
+
+def NonNegativeInt(value: str) -> int:
+
+    """Non-negative integer validation type."""
+
+    value = int(value)
+
+    if value < 0:
+        raise ValueError(f"{value} is not a non-negative integer.")
+
+    return value
+
+
+def PositiveFloat(value: str) -> float:
+
+    """Positive number validation type."""
+
+    value = float(value)
+
+    if not value > 0:
+        raise ValueError(f"{value} is not a positive number.")
+
+    return value
+
+
+def Shard(value: str) -> tuple[int, int]:
+
+    """Shard validation type, i/N for the i-th of N shards."""
+
+    index, count = map(int, value.split("/"))
+
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard {value} is not of the form i/N with 1 <= i <= N.")
+
+    return index, count
+
+
+# Shared arguments
+def add_issuer_arguments(subparser: argparse.ArgumentParser):
+
+    """Adds the issuer and terms and agreements arguments shared by the commands that render invoices."""
+
+    subparser.add_argument(
+        "-name", "-n",
+        required=True,
+        type=str,
+        help="The name of the issuer."
+    )
+
+    subparser.add_argument(
+        "-acc", "-a",
+        required=True,
+        metavar="ACCOUNT NAME",
+        type=str,
+        help="The account name of the issuer."
+    )
+
+    subparser.add_argument(
+        "-bank", "-b",
+        required=True,
+        type=str,
+        help="The bank of the issuer."
+    )
+
+    subparser.add_argument(
+        "-email", "-e",
+        metavar="example@domain.net",
+        required=True,
+        type=Email,
+        help="The email of the issuer."
+    )
+
+    subparser.add_argument(
+        "-phone", "-p",
+        metavar="5555555555",
+        required=True,
+        type=Phone,
+        help="The phone number of the issuer, with no spaces or hyphens."
+    )
+
+    # Terms and agreements should be mutually exclusive (either file or string)
+    terms_group = subparser.add_mutually_exclusive_group(required=True)
+
+    terms_group.add_argument(
+        "-terms", "-t",
+        type=str,
+        help="The terms and agreements as a string."
+    )
+
+    terms_group.add_argument(
+        "-terms-file", "-tf",
+        type=FILE_TYPE,
+        metavar=file_path_metavar("termsAndAgreements", "txt"),
+        help="The text file containing the terms and agreements."
+    )
+
+
+def add_rendering_arguments(subparser: argparse.ArgumentParser):
+
+    """Adds the choice of PDF rendering backend and the pagination of long invoices."""
+
+    subparser.add_argument(
+        "-renderer", "--renderer",
+        choices=list(RENDERERS),
+        default="pdfkit",
+        help="How PDFs are rendered: converting the invoice HTML with wkhtmltopdf through pdfkit (the default), or "
+             "drawing the invoice layout straight to PDF in-process with native."
+    )
+
+    subparser.add_argument(
+        "-rows-per-page", "--rows-per-page",
+        metavar="N",
+        type=PositiveInt,
+        default=ROWS_PER_PAGE,
+        help=f"The number of item rows on each page of invoices too long for one page (default {ROWS_PER_PAGE}). "
+             "Every page repeats the item table header and carries the running subtotal forward, and the totals and "
+             "terms are only on the last page."
+    )
+
+
+def add_output_arguments(subparser: argparse.ArgumentParser):
+
+    """Adds the layout of invoice files in the output directory."""
+
+    subparser.add_argument(
+        "-output-layout", "--output-layout",
+        choices=list(LAYOUTS),
+        default="flat",
+        help="How invoice files are laid out in the output directory: all in it (flat, the default), spread over 256 "
+             "subdirectories by a hash of the invoice number (hash), or in year/month/day subdirectories by due date "
+             "(date)."
+    )
+
+
 # Interface command
 parser.add_argument(
     "-i", "-interface",
@@ -63,74 +214,346 @@ load = subparsers.add_parser("batch", help="Performs batch invoicing using data
 load.add_argument(
     "clients",
     type=FILE_TYPE,
+    nargs="?",
     metavar=file_path_metavar("clientsFile", "csv"),
-    help="Filepath to client list CSV."
+    help="Filepath to client list CSV, unless a compiled catalog is given."
 )
 
 load.add_argument(
     "items",
     type=FILE_TYPE,
+    nargs="?",
     metavar=file_path_metavar("itemsFile", "csv"),
-    help="Filepath to item list CSV."
+    help="Filepath to item list CSV, unless a compiled catalog is given."
 )
 
 load.add_argument(
     "batch",
     type=FILE_TYPE,
     metavar=file_path_metavar("batchFile", "csv"),
-    help="Filepath to invoice batch CSV."
+    help="Filepath to invoice batch CSV or JSONL, in either the wide or the long format."
 )
 
+add_issuer_arguments(load)
+
 load.add_argument(
-    "-name", "-n",
-    required=True,
-    type=str,
-    help="The name of the issuer."
+    "-catalog", "--catalog",
+    type=FILE_TYPE,
+    metavar=file_path_metavar("catalog", "db"),
+    help="A catalog compiled with the catalog compile command, read instead of the client and item list CSVs."
 )
 
 load.add_argument(
-    "-acc", "-a",
-    required=True,
-    metavar="ACCOUNT NAME",
-    type=str,
-    help="The account name of the issuer."
+    "-validate-only", "--validate-only",
+    action="store_true",
+    help="Checks the whole batch file against the catalogs, reports every problem found and exits without rendering."
 )
 
 load.add_argument(
-    "-bank", "-b",
-    required=True,
-    type=str,
-    help="The bank of the issuer."
+    "-no-validate", "--no-validate",
+    action="store_true",
+    help="Skips checking the whole batch file before rendering, so problems are only found as invoices reach them."
+)
+
+load.add_argument(
+    "-workers", "--workers", "-w",
+    metavar="N",
+    type=PositiveInt,
+    default=1,
+    help="The number of processes rendering and converting invoices in parallel."
 )
 
 load.add_argument(
-    "-email", "-e",
-    metavar="example@domain.net",
-    required=True,
-    type=Email,
-    help="The email of the issuer."
+    "-chunk-size", "--chunk-size", "-c",
+    metavar="N",
+    type=PositiveInt,
+    default=1,
+    help="The number of invoices converted per wkhtmltopdf launch. Splitting chunks back into one PDF per invoice "
+         "requires pypdf."
 )
 
 load.add_argument(
-    "-phone", "-p",
-    metavar="5555555555",
-    required=True,
-    type=Phone,
-    help="The phone number of the issuer, with no spaces or hyphens."
+    "-merge-chunks", "--merge-chunks",
+    action="store_true",
+    help="Keeps each converted chunk as one PDF instead of splitting it into one PDF per invoice."
 )
 
-# Terms and agreements should be mutually exclusive (either file or string)
-terms_group = load.add_mutually_exclusive_group(required=True)
+load.add_argument(
+    "-merge", "--merge",
+    nargs="?",
+    const=MERGED_FILE,
+    metavar=file_path_metavar("invoices", "pdf"),
+    help=f"Converts the whole batch into one PDF for a print run ({MERGED_FILE} by default) with a single wkhtmltopdf "
+         "launch, each invoice starting on a new page. Cannot be combined with --workers, --chunk-size, "
+         "--merge-chunks, --concurrency or --incremental."
+)
 
-terms_group.add_argument(
-    "-terms", "-t",
+load.add_argument(
+    "-bookmarks", "--bookmarks",
+    action="store_true",
+    help="With --merge, adds a bookmark for every invoice to the merged PDF. Requires pypdf."
+)
+
+add_rendering_arguments(load)
+add_output_arguments(load)
+
+load.add_argument(
+    "-archive", "--archive",
+    choices=["zip", "tar"],
+    help=f"Moves every invoice's files into a single uncompressed archive, {ARCHIVE_FILE.format('zip')} or "
+         f"{ARCHIVE_FILE.format('tar')}, as soon as they are converted ({EXPORT_ARCHIVE_FILE.format('jsonl', 'zip')} "
+         "and so on for --export). Cannot be combined with --merge or --incremental."
+)
+
+load.add_argument(
+    "-index", "--index",
+    metavar=file_path_metavar("index", "csv"),
+    help=f"The CSV index mapping every invoice number to its files, and their archive members with --archive "
+         f"(default {INDEX_FILE}, or {shard_filename(INDEX_FILE, ('i', 'N'))} for shard i/N, and "
+         f"{EXPORT_INDEX_FILE.format('jsonl')} and so on for --export)."
+)
+
+load.add_argument(
+    "-keep-html", "--keep-html",
+    action="store_true",
+    help="Keeps each invoice's HTML file in the output directory alongside its PDF."
+)
+
+load.add_argument(
+    "-export", "--export",
+    choices=list(EXPORTERS),
+    help="Exports the invoices' data instead of rendering them, without HTML or PDF: as JSON lines (jsonl) or a "
+         f"ledger CSV with a row per line item and tax (csv), streamed to {EXPORT_FILE.format('jsonl')} or "
+         f"{EXPORT_FILE.format('csv')}, or as a UBL 2.1 XML document per invoice (ubl). Cannot be combined with "
+         "--workers, --chunk-size, --merge-chunks, --merge, --concurrency or --incremental."
+)
+
+load.add_argument(
+    "-export-file", "--export-file",
+    metavar=file_path_metavar("invoices", "jsonl"),
+    help="The file the jsonl or csv export is written to."
+)
+
+load.add_argument(
+    "-currency", "--currency",
+    metavar="CODE",
+    default=CURRENCY,
+    help=f"The ISO 4217 code of the currency of exported amounts (default {CURRENCY})."
+)
+
+load.add_argument(
+    "-profile", "--profile",
+    nargs="?",
+    const="profile.json",
+    metavar=file_path_metavar("profile", "json"),
+    help="Times each stage of the batch and writes a JSON report of counts, totals, latency percentiles and "
+         "throughput (profile.json by default)."
+)
+
+load.add_argument(
+    "-profile-populate", "--profile-populate",
+    metavar=file_path_metavar("populate", "prof"),
+    help="Runs invoice population under cProfile and dumps the stats for pstats. Implies --profile."
+)
+
+load.add_argument(
+    "-no-cache", "--no-cache",
+    action="store_true",
+    help="Converts every invoice instead of reusing PDFs of unchanged invoices from the render cache."
+)
+
+load.add_argument(
+    "-cache-dir", "--cache-dir",
+    metavar="path/to/cache",
+    default=CACHE_DIR,
+    help=f"Directory of the render cache (default {CACHE_DIR}). Invoices show their date of issue, so PDFs are only "
+         f"reused on the day they were converted."
+)
+
+load.add_argument(
+    "-cache-size", "--cache-size",
+    metavar="MiB",
+    type=PositiveInt,
+    default=CACHE_SIZE // 1024 ** 2,
+    help="Size of the render cache in MiB, past which the least recently used PDFs are evicted."
+)
+
+load.add_argument(
+    "-incremental", "--incremental",
+    action="store_true",
+    help="Only generates the invoices whose client, items, quantities or due date changed since the run recorded in "
+         "the manifest, or whose files are missing."
+)
+
+load.add_argument(
+    "-manifest", "--manifest",
+    metavar=file_path_metavar("manifest", "json"),
+    help=f"The run manifest recording what each invoice was generated from (default {MANIFEST_FILE}, or "
+         f"{shard_filename(MANIFEST_FILE, ('i', 'N'))} for shard i/N)."
+)
+
+load.add_argument(
+    "-shard", "--shard",
+    metavar="i/N",
+    type=Shard,
+    help="Only generates the i-th of N shards of the batch: every N-th invoice starting with the i-th. Invoice numbers "
+         "are positions in the batch file, so shards run on different machines never share a number."
+)
+
+load.add_argument(
+    "-concurrency", "--concurrency",
+    metavar="N",
+    type=PositiveInt,
+    help="Converts invoices with up to N concurrent wkhtmltopdf processes scheduled by asyncio, rendering invoices "
+         "while earlier ones convert. Cannot be combined with --workers, --chunk-size, --merge-chunks or the native "
+         "renderer."
+)
+
+load.add_argument(
+    "-timeout", "--timeout",
+    metavar="seconds",
+    type=PositiveFloat,
+    default=60.0,
+    help="With --concurrency, kills a wkhtmltopdf process converting one invoice for longer than this (default 60)."
+)
+
+load.add_argument(
+    "-retries", "--retries",
+    metavar="N",
+    type=NonNegativeInt,
+    default=2,
+    help="With --concurrency, the number of times a failed conversion is retried, backing off exponentially "
+         "(default 2)."
+)
+
+load.add_argument(
+    "-failure-report", "--failure-report",
+    metavar=file_path_metavar("failures", "json"),
+    help="Writes the number and error message of every invoice that failed to convert as JSON."
+)
+
+# Catalog commands
+catalog = subparsers.add_parser("catalog", help="Manages compiled catalogs of clients and items.")
+catalog_commands = catalog.add_subparsers(dest="catalog_command", required=True)
+
+compile_catalog = catalog_commands.add_parser(
+    "compile",
+    help="Compiles the client and item list CSVs into an indexed catalog file that batches read lazily."
+)
+
+compile_catalog.add_argument(
+    "clients",
+    type=FILE_TYPE,
+    metavar=file_path_metavar("clientsFile", "csv"),
+    help="Filepath to client list CSV."
+)
+
+compile_catalog.add_argument(
+    "items",
+    type=FILE_TYPE,
+    metavar=file_path_metavar("itemsFile", "csv"),
+    help="Filepath to item list CSV."
+)
+
+compile_catalog.add_argument(
+    "destination",
     type=str,
-    help="The terms and agreements as a string."
+    metavar=file_path_metavar("catalog", "db"),
+    help="Filepath of the compiled catalog to write."
+)
+
+# Manifest merging command
+merge_manifests = subparsers.add_parser("merge-manifests", help="Merges the run manifests of a sharded batch.")
+
+merge_manifests.add_argument(
+    "destination",
+    type=str,
+    metavar=file_path_metavar("manifest", "json"),
+    help="Filepath of the merged manifest to write."
+)
+
+merge_manifests.add_argument(
+    "sources",
+    type=FILE_TYPE,
+    nargs="+",
+    metavar=file_path_metavar("shardManifest", "json"),
+    help="Filepaths of the shard manifests to merge."
 )
 
-terms_group.add_argument(
-    "-terms-file", "-tf",
+# Batch format conversion command
+convert = subparsers.add_parser("convert", help="Converts a batch file into the streamable long format.")
+
+convert.add_argument(
+    "source",
     type=FILE_TYPE,
-    metavar=file_path_metavar("termsAndAgreements", "txt"),
-    help="The text file containing the terms and agreements."
+    metavar=file_path_metavar("batchFile", "csv"),
+    help="Filepath to the batch CSV or JSONL to convert."
+)
+
+convert.add_argument(
+    "destination",
+    type=str,
+    metavar=file_path_metavar("longBatchFile", "csv"),
+    help="Filepath of the long format batch to write, as JSONL if it ends in .jsonl and CSV otherwise."
+)
+
+# Render server command
+serve = subparsers.add_parser(
+    "serve",
+    help="Runs a local server that renders invoice requests with the catalog and template kept loaded."
+)
+
+serve.add_argument(
+    "clients",
+    type=FILE_TYPE,
+    nargs="?",
+    metavar=file_path_metavar("clientsFile", "csv"),
+    help="Filepath to client list CSV, unless a compiled catalog is given."
+)
+
+serve.add_argument(
+    "items",
+    type=FILE_TYPE,
+    nargs="?",
+    metavar=file_path_metavar("itemsFile", "csv"),
+    help="Filepath to item list CSV, unless a compiled catalog is given."
+)
+
+add_issuer_arguments(serve)
+
+serve.add_argument(
+    "-catalog", "--catalog",
+    type=FILE_TYPE,
+    metavar=file_path_metavar("catalog", "db"),
+    help="A catalog compiled with the catalog compile command, read instead of the client and item list CSVs."
+)
+
+add_rendering_arguments(serve)
+add_output_arguments(serve)
+
+serve.add_argument(
+    "-host", "--host",
+    default="127.0.0.1",
+    help="The address to serve on (default 127.0.0.1)."
+)
+
+serve.add_argument(
+    "-port", "--port",
+    type=NonNegativeInt,
+    default=8000,
+    help="The port to serve on, or 0 for any free port (default 8000)."
+)
+
+serve.add_argument(
+    "-socket", "--socket",
+    metavar="path/to/invoicer.sock",
+    help="Serves on a Unix socket at this path instead of on a port."
+)
+
+serve.add_argument(
+    "-workers", "--workers", "-w",
+    metavar="N",
+    type=PositiveInt,
+    default=4,
+    help="The number of invoices rendered and converted at once (default 4)."
 )
@@ -0,0 +1,127 @@
+# Tests of the batch file readers
+
+# Imports
+import os
+import tempfile
+import unittest
+from utils.batch import BatchInvoice, parse_quantity, read_batch, read_long_batch, read_wide_batch
+
+# Constants
+LONG_CSV = """invoice,client,due,item,quantity
+1,John Doe,2030-01-01,Garden Gnome,3
+1,John Doe,2030-01-01,USB stick,2
+
+2,"Jane & Co",2030-02-01,,
+3, John Doe, 2030-03-01, Widget, 7
+"""
+LONG_JSONL = """{"invoice": 0, "client": "John Doe", "due": "2030-01-01", "item": "Garden Gnome", "quantity": 3}
+
+{"invoice": 0, "client": "John Doe", "due": "2030-01-01", "item": "USB stick", "quantity": "2"}
+{"invoice": 1, "client": "Jane & Co", "due": "2030-02-01", "item": "", "quantity": ""}
+"""
+WIDE_CSV = """John Doe,Jane & Co,John Doe
+2030-01-01,2030-02-01,2030-03-01
+"Garden Gnome, 3","USB stick, 16","Widget, 7"
+"USB stick, 2",,
+"""
+
+
+# Classes
+class BatchFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def batch_file(self, name: str, content: str) -> str:
+
+        """Writes a batch file to the test's directory, returning its path."""
+
+        filename = os.path.join(self.directory.name, name)
+
+        with open(filename, "w", newline="") as file:
+            file.write(content)
+
+        return filename
+
+
+class LongBatchTest(BatchFileTest):
+
+    def test_groups_consecutive_rows_by_invoice(self):
+
+        invoices = list(read_long_batch(self.batch_file("batch.csv", LONG_CSV)))
+
+        self.assertEqual(invoices, [
+            BatchInvoice("1", "John Doe", "2030-01-01", [("Garden Gnome", 3), ("USB stick", 2)]),
+            BatchInvoice("2", "Jane & Co", "2030-02-01", []),
+            BatchInvoice("3", "John Doe", "2030-03-01", [("Widget", 7)]),
+        ])
+
+    def test_reads_json_lines(self):
+
+        invoices = list(read_long_batch(self.batch_file("batch.jsonl", LONG_JSONL)))
+
+        self.assertEqual(invoices, [
+            BatchInvoice("0", "John Doe", "2030-01-01", [("Garden Gnome", 3), ("USB stick", 2)]),
+            BatchInvoice("1", "Jane & Co", "2030-02-01", []),
+        ])
+
+    def test_names_the_line_of_a_missing_field(self):
+
+        filename = self.batch_file("batch.csv", LONG_CSV.replace("3, John Doe,", "3,,"))
+
+        with self.assertRaisesRegex(ValueError, r"Line 6 of .*: missing client\."):
+            list(read_long_batch(filename))
+
+    def test_names_the_line_of_an_invalid_quantity(self):
+
+        filename = self.batch_file("batch.csv", LONG_CSV.replace("USB stick,2", "USB stick,two"))
+
+        with self.assertRaisesRegex(ValueError, r"Line 3 of .*: quantity two is not a non-negative integer\."):
+            list(read_long_batch(filename))
+
+    def test_rejects_an_invoice_changing_client(self):
+
+        filename = self.batch_file("batch.csv", LONG_CSV.replace("1,John Doe,2030-01-01,USB", "1,Jane,2030-01-01,USB"))
+
+        with self.assertRaisesRegex(ValueError, r"Line 3 of .*: invoice 1 changes client or due date between rows\."):
+            list(read_long_batch(filename))
+
+
+class ParseQuantityTest(unittest.TestCase):
+
+    def test_reads_whole_numbers_as_written(self):
+        for value in [3, 3.0, "3", " 3 ", "+3", "3.0", "03"]:
+            self.assertEqual(parse_quantity(value, "Line 2"), 3, repr(value))
+
+    def test_rejects_anything_else(self):
+        for value in [3.5, -1, "-1", "3.5", "two", "", None, True, "3_000", "\u0663", "1e3"]:
+            with self.assertRaisesRegex(ValueError, "^Line 2: quantity .* is not a non-negative integer\\.$"):
+                parse_quantity(value, "Line 2")
+
+
+class WideBatchTest(BatchFileTest):
+
+    def test_reads_one_invoice_per_column(self):
+
+        invoices = list(read_wide_batch(self.batch_file("batch.csv", WIDE_CSV)))
+
+        self.assertEqual(invoices, [
+            BatchInvoice("1", "John Doe", "2030-01-01", [("Garden Gnome", 3), ("USB stick", 2)]),
+            BatchInvoice("2", "Jane & Co", "2030-02-01", [("USB stick", 16)]),
+            BatchInvoice("3", "John Doe", "2030-03-01", [("Widget", 7)]),
+        ])
+
+    def test_read_batch_tells_the_formats_apart(self):
+
+        wide = list(read_batch(self.batch_file("wide.csv", WIDE_CSV)))
+        long = list(read_batch(self.batch_file("long.csv", LONG_CSV)))
+
+        self.assertEqual([invoice.client for invoice in wide], ["John Doe", "Jane & Co", "John Doe"])
+        self.assertEqual([invoice.key for invoice in long], ["1", "2", "3"])
+
+    def test_rejects_other_files(self):
+        with self.assertRaisesRegex(ValueError, "must be a .csv or .jsonl file"):
+            read_batch(self.batch_file("batch.txt", LONG_CSV))
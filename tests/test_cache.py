@@ -0,0 +1,87 @@
+# Tests of the render cache
+
+# Imports
+import os
+import tempfile
+import unittest
+from utils.cache import RenderCache
+
+# Constants
+OPTIONS = {"page-size": "A5"}
+
+
+# Classes
+class RenderCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = RenderCache(os.path.join(self.directory.name, "cache"), max_bytes=250)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def pdf(self, name: str, size: int = 100) -> str:
+
+        """Writes a PDF of the given size, returning its path."""
+
+        filename = os.path.join(self.directory.name, f"{name}.pdf")
+
+        with open(filename, "wb") as file:
+            file.write(name.encode().ljust(size, b"."))
+
+        return filename
+
+    def age(self, key: str, mtime: float):
+
+        """Sets when the cached PDF was last used."""
+
+        os.utime(self.cache.path(key), (mtime, mtime))
+
+    def test_keys_depend_on_document_and_options(self):
+
+        key = RenderCache.key("<html></html>", OPTIONS)
+
+        self.assertEqual(key, RenderCache.key("<html></html>", dict(OPTIONS)))
+        self.assertNotEqual(key, RenderCache.key("<html> </html>", OPTIONS))
+        self.assertNotEqual(key, RenderCache.key("<html></html>", {"page-size": "A4"}))
+
+    def test_copies_cached_pdfs(self):
+
+        destination = os.path.join(self.directory.name, "copy.pdf")
+
+        self.assertFalse(self.cache.get("a" * 64, destination))
+
+        self.cache.put("a" * 64, self.pdf("first"))
+
+        self.assertTrue(self.cache.get("a" * 64, destination))
+        with open(destination, "rb") as file:
+            self.assertTrue(file.read().startswith(b"first"))
+
+    def test_evicts_least_recently_used(self):
+
+        first, second, third = "a" * 64, "b" * 64, "c" * 64
+
+        self.cache.put(first, self.pdf("first"))
+        self.cache.put(second, self.pdf("second"))
+        self.age(first, 1000)
+        self.age(second, 2000)
+
+        # Using the oldest PDF makes the other one the least recently used
+        self.assertTrue(self.cache.get(first, os.path.join(self.directory.name, "copy.pdf")))
+
+        self.cache.put(third, self.pdf("third"))
+
+        self.assertTrue(os.path.exists(self.cache.path(first)))
+        self.assertFalse(os.path.exists(self.cache.path(second)))
+        self.assertTrue(os.path.exists(self.cache.path(third)))
+        self.assertLessEqual(sum(size for path, mtime, size in self.cache.entries()), 250)
+
+    def test_evicts_until_under_size(self):
+
+        for position, key in enumerate(["a" * 64, "b" * 64, "c" * 64, "d" * 64]):
+            self.cache.put(key, self.pdf(key[0]))
+            self.age(key, 1000 + position)
+
+        self.cache.put("e" * 64, self.pdf("e", size=200))
+
+        self.assertEqual([os.path.basename(path)[0] for path, mtime, size in self.cache.entries()], ["e"])
@@ -0,0 +1,114 @@
+# Tests of the stylesheet, its minification and the compiled template's pagination
+
+# Imports
+import importlib.util
+import unittest
+from bs4 import BeautifulSoup
+from utils import ROWS_PER_PAGE, STYLE_FILE, Client, Issuer, Item, Template
+from utils.compiled import minify_css
+
+
+# Classes
+class MinifyCssTest(unittest.TestCase):
+
+    def test_removes_comments_and_whitespace(self):
+
+        css = """
+        /* Page */
+        body {
+            margin: 0;
+            padding: 0 1px;
+        }
+
+        a > b ,  c { color: red; }
+        """
+
+        self.assertEqual(minify_css(css), "body{margin:0;padding:0 1px}a>b,c{color:red}")
+
+    def test_keeps_descendant_selectors_apart(self):
+        self.assertEqual(minify_css(".page  .forward td { color: red }"), ".page .forward td{color:red}")
+
+    def test_leaves_quoted_strings_untouched(self):
+
+        css = """a { content: "/* kept */  ;  }"; font-family: 'Jetbrains  Mono'; }"""
+
+        self.assertEqual(minify_css(css), """a{content:"/* kept */  ;  }";font-family:'Jetbrains  Mono'}""")
+
+    def test_stylesheet_keeps_its_rules(self):
+
+        with open(STYLE_FILE) as file:
+            minified = minify_css(file.read())
+
+        self.assertNotIn("/*", minified)
+        self.assertNotIn("\n", minified)
+        self.assertIn(".page + .page{page-break-before:always}", minified)
+
+
+@unittest.skipUnless(importlib.util.find_spec("sass"), "libsass is not installed.")
+class StylesheetSourceTest(unittest.TestCase):
+
+    def test_stylesheet_is_compiled_from_its_source(self):
+
+        import sass
+
+        css, source_map = sass.compile(
+            filename=STYLE_FILE.replace(".css", ".scss"),
+            output_style="expanded",
+            source_map_filename=f"{STYLE_FILE}.map",
+            output_filename_hint=STYLE_FILE
+        )
+
+        with open(STYLE_FILE) as file:
+            self.assertEqual(file.read(), css, "Rebuild the stylesheet from its source.")
+
+        with open(f"{STYLE_FILE}.map") as file:
+            self.assertEqual(file.read(), source_map, "Rebuild the stylesheet from its source.")
+
+
+class PaginationTest(unittest.TestCase):
+
+    def setUp(self):
+
+        Template.set_issuer(Issuer("Brand & Co", "Brand account", "Bank", "billing@brand.com", 5555555555))
+        Template.set_terms("Payment is due within 30 days of the date of issue.")
+
+        client = Client("John Doe", "1344 Example Street", "City, State, Country")
+        items = [Item(f"Item {number}", "", 1.50, 2) for number in range(2 * ROWS_PER_PAGE + 5)]
+
+        self.pages = BeautifulSoup(Template(client, items, due="2030-01-01").render(), "html.parser").find_all(
+            class_="page"
+        )
+
+    @staticmethod
+    def rows(page) -> list[str]:
+
+        """Returns the item names and carried-forward rows of a page, in order."""
+
+        return [
+            row.h4.string if row.h4 else " ".join(cell.string for cell in row.find_all("td"))
+            for row in page.find_all("tr") if row.td
+        ]
+
+    def test_breaks_pages_every_rows_per_page_items(self):
+
+        self.assertEqual(len(self.pages), 3)
+
+        for page in self.pages:
+            self.assertIsNotNone(page.find("th"))  # Every page repeats the table header
+
+        names = [f"Item {number}" for number in range(2 * ROWS_PER_PAGE + 5)]
+
+        self.assertEqual(
+            [[row for row in self.rows(page) if row.startswith("Item")] for page in self.pages],
+            [names[:ROWS_PER_PAGE], names[ROWS_PER_PAGE:2 * ROWS_PER_PAGE], names[2 * ROWS_PER_PAGE:]]
+        )
+
+    def test_carries_subtotals_forward(self):
+
+        first, second, last = [self.rows(page) for page in self.pages]
+        one_page, two_pages = f"{ROWS_PER_PAGE * 3:.2f}", f"{2 * ROWS_PER_PAGE * 3:.2f}"  # Every item comes to 3.00
+
+        self.assertEqual(first[-1], f"Carried forward {one_page}")
+        self.assertEqual((second[0], second[-1]), (f"Brought forward {one_page}", f"Carried forward {two_pages}"))
+        self.assertEqual(last[0], f"Brought forward {two_pages}")
+        self.assertFalse(any(row.startswith("Carried forward") for row in last))
@@ -0,0 +1,93 @@
+# Tests of splitting batches into chunks and locating invoices in converted chunks
+
+# Imports
+import os
+import tempfile
+import unittest
+from utils import chunked
+from utils.converter import PAGE_BREAK, merged_document, start_pages
+
+# Constants
+OUTLINE = """<?xml version="1.0" encoding="UTF-8"?>
+<outline xmlns="http://wkhtmltopdf.org/outline">
+<item title="" page="0" link="" backLink="">
+{}
+</item>
+</outline>
+"""
+
+
+# Classes
+class ChunkedTest(unittest.TestCase):
+
+    def test_splits_into_consecutive_chunks(self):
+        self.assertEqual(list(chunked(range(7), 3)), [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(list(chunked(range(6), 3)), [[0, 1, 2], [3, 4, 5]])
+
+    def test_takes_elements_lazily(self):
+
+        taken = []
+
+        def elements():
+            for element in range(10):
+                taken.append(element)
+                yield element
+
+        chunks = chunked(elements(), 4)
+        next(chunks)
+
+        self.assertEqual(taken, [0, 1, 2, 3])
+
+    def test_empty(self):
+        self.assertEqual(list(chunked([], 3)), [])
+
+
+class MergedDocumentTest(unittest.TestCase):
+
+    def test_keeps_the_first_head_and_every_body(self):
+
+        documents = [f"<html><head><style>{number}</style></head><body>{number}</body></html>" for number in range(3)]
+
+        self.assertEqual(
+            "".join(merged_document(documents)),
+            f"<html><head><style>0</style></head><body>0{PAGE_BREAK}1{PAGE_BREAK}2</body></html>"
+        )
+
+    def test_empty(self):
+        self.assertEqual("".join(merged_document([])), "")
+
+
+class StartPagesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.outline_file = os.path.join(self.directory.name, "outline.xml")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def outline(self, *items: tuple[str, int]):
+
+        """Writes a wkhtmltopdf outline dump with an item of the title and page for each pair."""
+
+        with open(self.outline_file, "w") as file:
+            file.write(OUTLINE.format("\n".join(
+                f'<item title="{title}" page="{page}" link="" backLink=""/>' for title, page in items
+            )))
+
+    def test_pages_of_invoice_titles_from_zero(self):
+
+        self.outline(("Invoice", 1), ("Invoice", 2), ("Other heading", 3), ("Invoice", 4))
+
+        self.assertEqual(start_pages(self.outline_file), [0, 1, 3])
+
+    def test_unreadable_outlines(self):
+
+        self.assertIsNone(start_pages(self.outline_file))  # Missing
+
+        self.outline(("Other heading", 1))
+        self.assertIsNone(start_pages(self.outline_file))
+
+        with open(self.outline_file, "w") as file:
+            file.write("<outline")
+        self.assertIsNone(start_pages(self.outline_file))
@@ -0,0 +1,156 @@
+# Tests of structured exports of invoice data
+
+# Imports
+import csv
+import json
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as ElementTree
+from utils import Client, Issuer, Item, Template, format_cents, to_cents
+from utils.export import LEDGER_COLUMNS, JsonLinesExporter, LedgerExporter, UblExporter
+
+# Constants
+NAMESPACES = {
+    "": "urn:oasis:names:specification:ubl:schema:xsd:Invoice-2",
+    "cac": "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2",
+    "cbc": "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
+}
+UBL_REQUIRED = [  # Elements every UBL 2.1 invoice must have, besides its lines
+    "cbc:UBLVersionID",
+    "cbc:ID",
+    "cbc:IssueDate",
+    "cbc:InvoiceTypeCode",
+    "cbc:DocumentCurrencyCode",
+    "cac:AccountingSupplierParty/cac:Party/cac:PartyName/cbc:Name",
+    "cac:AccountingCustomerParty/cac:Party/cac:PartyName/cbc:Name",
+    "cac:TaxTotal/cbc:TaxAmount",
+    "cac:LegalMonetaryTotal/cbc:LineExtensionAmount",
+    "cac:LegalMonetaryTotal/cbc:TaxExclusiveAmount",
+    "cac:LegalMonetaryTotal/cbc:TaxInclusiveAmount",
+    "cac:LegalMonetaryTotal/cbc:PayableAmount",
+]
+
+
+# Classes
+class ExportTest(unittest.TestCase):
+
+    def setUp(self):
+
+        # Exports are written relative to the working directory
+        self.directory = tempfile.TemporaryDirectory()
+        self.working_directory = os.getcwd()
+        os.chdir(self.directory.name)
+
+        Template.set_issuer(Issuer("Brand & Co", "Brand account", "Bank", "billing@brand.com", 5555555555))
+        Template.set_terms("Payment is due within 30 days of the date of issue.")
+
+        self.templates = [
+            Template(
+                Client("Jane & Co", "1344 Example Street", "City, State, Country"),
+                [Item("Garden Gnome", "Porcelain <large>", 12.99, 3), Item("USB stick", "Storage", 5.005, 7)],
+                due="2030-01-01",
+                tax_percentage=13.0
+            ),
+            Template(
+                Client("John Doe", "1 Other Street", "Town, State, Country"),
+                [Item("Widget", "Gadget", 0.333, 1)],
+                due="2030-02-01",
+                tax_percentage=8.25
+            ),
+        ]
+
+    def tearDown(self):
+        os.chdir(self.working_directory)
+        self.directory.cleanup()
+
+    def export(self, exporter):
+
+        """Exports every invoice with the exporter, returning the files of their own they were written to."""
+
+        files = [exporter.write(template) for template in self.templates]
+        exporter.close()
+
+        return files
+
+    def test_json_lines(self):
+
+        self.assertEqual(self.export(JsonLinesExporter(os.path.join("output", "invoices.jsonl"))), [None, None])
+
+        with open(os.path.join("output", "invoices.jsonl"), encoding="utf-8") as file:
+            records = [json.loads(line) for line in file]
+
+        first = records[0]
+        self.assertEqual(first["invoice"], self.templates[0]._id)
+        self.assertEqual((first["due"], first["currency"], first["tax_percentage"]), ("2030-01-01", "CAD", "13"))
+        self.assertEqual(first["client"]["name"], "Jane & Co")
+        self.assertEqual(first["issuer"]["phone"], "555-555-5555")
+        self.assertEqual(first["lines"], [
+            {"item": "Garden Gnome", "description": "Porcelain <large>", "quantity": 3, "unit_price": "12.99",
+             "amount": "38.97"},
+            {"item": "USB stick", "description": "Storage", "quantity": 7, "unit_price": "5.01", "amount": "35.07"},
+        ])
+
+        # Amounts are exact to the cent and match the rendered totals
+        for template, record in zip(self.templates, records):
+            self.assertEqual(
+                [record["subtotal"], record["tax"], record["total"]], [format_cents(cents) for cents in template.totals]
+            )
+            self.assertEqual(sum(to_cents(line["amount"]) for line in record["lines"]), to_cents(record["subtotal"]))
+
+        self.assertEqual((records[0]["total"], records[1]["total"]), ("83.67", "0.36"))
+
+    def test_ledger_rows_add_up_to_totals(self):
+
+        self.assertEqual(self.export(LedgerExporter(os.path.join("output", "invoices.csv"))), [None, None])
+
+        with open(os.path.join("output", "invoices.csv"), newline="", encoding="utf-8") as file:
+            reader = csv.DictReader(file)
+            rows = list(reader)
+
+        self.assertEqual(reader.fieldnames, LEDGER_COLUMNS)
+
+        first, second = [str(template._id) for template in self.templates]
+
+        self.assertEqual([row["invoice"] for row in rows], [first] * 3 + [second] * 2)
+        self.assertEqual(rows[1], {
+            "invoice": first, "issued": self.templates[0]._created.isoformat(), "due": "2030-01-01",
+            "client": "Jane & Co", "line": "2", "item": "USB stick", "description": "Storage", "quantity": "7",
+            "unit_price": "5.01", "amount": "35.07",
+        })
+        self.assertEqual((rows[2]["line"], rows[2]["item"], rows[2]["amount"]), ("", "Tax 13%", "9.63"))
+
+        for template in self.templates:
+            amounts = [to_cents(row["amount"]) for row in rows if row["invoice"] == str(template._id)]
+            self.assertEqual(sum(amounts), template.totals[2])
+
+    def test_ubl_documents(self):
+
+        files = self.export(UblExporter())
+
+        self.assertEqual(files, [f"{template.filename}.xml" for template in self.templates])
+
+        for template, filename in zip(self.templates, files):
+
+            invoice = ElementTree.parse(filename).getroot()
+
+            self.assertEqual(invoice.tag, f"{{{NAMESPACES['']}}}Invoice")
+            for path in UBL_REQUIRED:
+                self.assertIsNotNone(invoice.find(path, NAMESPACES), path)
+
+            subtotal, tax, total = [format_cents(cents) for cents in template.totals]
+            payable = invoice.find("cac:LegalMonetaryTotal/cbc:PayableAmount", NAMESPACES)
+            self.assertEqual((payable.text, payable.get("currencyID")), (total, "CAD"))
+            self.assertEqual(invoice.find("cac:TaxTotal/cbc:TaxAmount", NAMESPACES).text, tax)
+            self.assertEqual(invoice.find("cac:LegalMonetaryTotal/cbc:LineExtensionAmount", NAMESPACES).text, subtotal)
+
+            lines = invoice.findall("cac:InvoiceLine", NAMESPACES)
+            self.assertEqual(
+                [line.find("cac:Item/cbc:Name", NAMESPACES).text for line in lines],
+                [item.name for item in template.items]
+            )
+
+        # Escaped on the way in, read back as they were
+        invoice = ElementTree.parse(files[0]).getroot()
+        self.assertEqual(invoice.find("cac:AccountingCustomerParty//cbc:Name", NAMESPACES).text, "Jane & Co")
+        self.assertEqual(invoice.find("cac:InvoiceLine/cac:Item/cbc:Description", NAMESPACES).text, "Porcelain <large>")
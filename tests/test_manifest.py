@@ -0,0 +1,124 @@
+# Tests of run manifests
+
+# Imports
+import os
+import tempfile
+import unittest
+from utils import Client, Item, Template
+from utils.manifest import RunManifest
+
+# Constants
+EXTENSIONS = [".pdf"]
+
+
+# Classes
+class RunManifestTest(unittest.TestCase):
+
+    def setUp(self):
+
+        # Invoice files are written relative to the working directory
+        self.directory = tempfile.TemporaryDirectory()
+        self.working_directory = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.working_directory)
+        self.directory.cleanup()
+
+    @staticmethod
+    def templates() -> list[Template]:
+
+        client = Client("John Doe", "1344 Example Street", "City, State, Country")
+        item = Item("Garden Gnome", "Porcelain", 12.99, 0)
+
+        return [Template(client, [item.with_quantity(quantity)], due="2030-01-01") for quantity in range(1, 4)]
+
+    @staticmethod
+    def generate(templates) -> list[int]:
+
+        """Writes the files of the templates passed through, returning their numbers."""
+
+        numbers = []
+
+        for template in templates:
+            os.makedirs(os.path.dirname(template.filename), exist_ok=True)
+            open(f"{template.filename}.pdf", "w").close()
+            numbers.append(template._id)
+
+        return numbers
+
+    def test_records_every_invoice(self):
+
+        templates = self.templates()
+        numbers = [template._id for template in templates]
+        manifest = RunManifest()
+
+        self.assertEqual(self.generate(manifest.record(templates, "inputs", EXTENSIONS)), numbers)
+        self.assertEqual(list(manifest.invoices), numbers)
+        self.assertEqual(manifest.invoices[numbers[1]]["files"], [f"{templates[1].filename}.pdf"])
+        self.assertEqual(manifest.regenerated, 3)
+
+    def test_only_changed_invoices_are_regenerated(self):
+
+        templates = self.templates()
+        numbers = [template._id for template in templates]
+
+        previous = RunManifest()
+        self.generate(previous.record(templates, "inputs", EXTENSIONS))
+
+        # Unchanged
+        manifest = RunManifest()
+        self.assertEqual(self.generate(manifest.record(templates, "inputs", EXTENSIONS, previous)), [])
+
+        # Changed items and missing files
+        templates[0].items = [templates[0].items[0].with_quantity(5)]
+        os.remove(f"{templates[2].filename}.pdf")
+
+        manifest = RunManifest()
+        self.assertEqual(
+            self.generate(manifest.record(templates, "inputs", EXTENSIONS, previous)), [numbers[0], numbers[2]]
+        )
+        self.assertEqual(manifest.regenerated, 2)
+        self.assertEqual(list(manifest.invoices), numbers)
+
+    def test_changed_inputs_regenerate_everything(self):
+
+        templates = self.templates()
+
+        previous = RunManifest()
+        self.generate(previous.record(templates, "inputs", EXTENSIONS))
+
+        manifest = RunManifest()
+        self.assertEqual(
+            self.generate(manifest.record(templates, "other", EXTENSIONS, previous)),
+            [template._id for template in templates]
+        )
+
+    def test_saved_manifests_load_the_same(self):
+
+        manifest = RunManifest()
+        self.generate(manifest.record(self.templates(), "inputs", EXTENSIONS))
+        manifest.save(os.path.join("output", "manifest.json"))
+
+        loaded = RunManifest.load(os.path.join("output", "manifest.json"))
+
+        self.assertEqual((loaded.inputs, loaded.invoices), (manifest.inputs, manifest.invoices))
+
+    def test_merge_combines_shards_in_order(self):
+
+        first = RunManifest("inputs", {3: {"client": "c"}, 1: {"client": "a"}})
+        second = RunManifest("inputs", {2: {"client": "b"}})
+
+        merged = RunManifest.merge([first, second])
+
+        self.assertEqual(merged.inputs, "inputs")
+        self.assertEqual(merged.invoices, {1: {"client": "a"}, 2: {"client": "b"}, 3: {"client": "c"}})
+        self.assertEqual(list(merged.invoices), [1, 2, 3])
+
+    def test_merge_rejects_duplicates_and_different_inputs(self):
+
+        with self.assertRaisesRegex(ValueError, "more than one manifest: 2"):
+            RunManifest.merge([RunManifest("inputs", {1: {}, 2: {}}), RunManifest("inputs", {2: {}})])
+
+        with self.assertRaisesRegex(ValueError, "different issuers"):
+            RunManifest.merge([RunManifest("inputs", {1: {}}), RunManifest("other", {2: {}})])
@@ -0,0 +1,107 @@
+# Tests of money held as integer cents
+
+# Imports
+import unittest
+from decimal import Decimal
+from utils import Client, Item, Template, cache_batch_totals, tax_cents, to_cents
+
+
+# Classes
+class ToCentsTest(unittest.TestCase):
+
+    def test_rounds_half_a_cent_up(self):
+        self.assertEqual(to_cents(5.005), 501)
+        self.assertEqual(to_cents(2.675), 268)
+        self.assertEqual(to_cents(0.125), 13)
+
+    def test_rounds_below_half_a_cent_down(self):
+        self.assertEqual(to_cents(5.004), 500)
+        self.assertEqual(to_cents("12.994999"), 1299)
+
+    def test_reads_strings_and_decimals_exactly(self):
+        self.assertEqual(to_cents("0.1"), 10)
+        self.assertEqual(to_cents(Decimal("1234567.89")), 123456789)
+        self.assertEqual(to_cents(0), 0)
+
+
+class TaxCentsTest(unittest.TestCase):
+
+    def test_rounds_half_a_cent_up(self):
+        self.assertEqual(tax_cents(5, Decimal("0.1")), 1)  # 0.5 cents
+        self.assertEqual(tax_cents(15, Decimal("0.13")), 2)  # 1.95 cents
+        self.assertEqual(tax_cents(250, Decimal("0.13")), 33)  # 32.5 cents
+
+    def test_rounds_below_half_a_cent_down(self):
+        self.assertEqual(tax_cents(4, Decimal("0.1")), 0)  # 0.4 cents
+        self.assertEqual(tax_cents(1001, Decimal("0.13")), 130)  # 130.13 cents
+
+    def test_exact_rates(self):
+        self.assertEqual(tax_cents(12345, Decimal("0")), 0)
+        self.assertEqual(tax_cents(12345, Decimal("1")), 12345)
+        self.assertEqual(tax_cents(10000, Decimal("0.0825")), 825)
+
+
+class BatchTotalsTest(unittest.TestCase):
+
+    @staticmethod
+    def templates() -> list[Template]:
+
+        """Returns invoices covering fractional prices, quantities of zero, no items and several tax rates."""
+
+        client = Client("John Doe", "1344 Example Street", "City, State, Country")
+        items = [
+            Item("Garden Gnome", "Porcelain", 12.99, 0),
+            Item("USB stick", "Storage", 5.005, 0),
+            Item("Widget", "Gadget", 0.333, 0),
+        ]
+
+        return [
+            Template(
+                client,
+                [item.with_quantity((number * (position + 3)) % 7) for position, item in enumerate(items)][:number % 4],
+                due="2030-01-01",
+                tax_percentage=rate
+            )
+            for number, rate in enumerate([13.0, 0.0, 5.0, 8.25, 15.5, 100.0, 13.0, 9.975] * 4, start=1)
+        ]
+
+    def test_matches_template_totals(self):
+
+        expected = [template.totals for template in self.templates()]
+
+        templates = self.templates()
+        cache_batch_totals(templates)
+
+        self.assertEqual([template.totals for template in templates], expected)
+
+    def test_total_adds_up(self):
+
+        templates = self.templates()
+        cache_batch_totals(templates)
+
+        for template in templates:
+            subtotal, tax, total = template.totals
+            self.assertEqual(subtotal + tax, total)
+
+    def test_amounts_too_large_for_64_bit_integers(self):
+
+        client = Client("John Doe", "1344 Example Street", "City, State, Country")
+
+        def templates():
+            return [
+                Template(client, [Item("Building", "", 1000000, 1)], due="2030-01-01", tax_percentage=13.3333333333),
+                Template(client, [Item("Widget", "", 0.333, 3)], due="2030-01-01", tax_percentage=13.0),
+                Template(client, [Item("Gnome", "", 12.99, 10 ** 20)], due="2030-01-01", tax_percentage=13.0),
+            ]
+
+        expected = [template.totals for template in templates()]
+        self.assertEqual(expected[0], (100000000, 13333333, 113333333))
+
+        # Separately, and in one block with the rest
+        for position, template in enumerate(templates()):
+            cache_batch_totals([template])
+            self.assertEqual(template.totals, expected[position])
+
+        block = templates()
+        cache_batch_totals(block)
+        self.assertEqual([template.totals for template in block], expected)
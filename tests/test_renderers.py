@@ -0,0 +1,113 @@
+# Tests of the native renderer drawing invoices straight to PDF
+
+# Imports
+import importlib.util
+import os
+import tempfile
+import unittest
+from utils import ROWS_PER_PAGE, Client, Issuer, Item, Template
+from utils.converter import ConversionJob
+from utils.native import PAGE_SIZES
+from utils.renderers import NativeRenderer
+
+# Constants
+ITEM_COUNTS = range(0, 4 * ROWS_PER_PAGE + 1, 5)
+
+
+# Classes
+@unittest.skipUnless(importlib.util.find_spec("pypdf"), "pypdf is not installed.")
+class NativeRendererTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+
+        Template.set_issuer(Issuer("Brand & Co", "Brand account", "Bank", "billing@brand.com", 5555555555))
+        Template.set_terms("Payment is due within 30 days of the date of issue.")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @staticmethod
+    def template(items: int, client: str = "John Doe") -> Template:
+
+        """Returns an invoice with the number of line items given."""
+
+        return Template(
+            Client(client, "1344 Example Street", "City, State, Country"),
+            [Item(f"Item {number}", "Porcelain", 12.99, 2) for number in range(items)],
+            due="2030-01-01"
+        )
+
+    def job(self, template: Template) -> ConversionJob:
+
+        pdf_file = os.path.join(self.directory.name, f"{template._id}.pdf")
+
+        return ConversionJob(template._id, "", pdf_file, layout=template.layout())
+
+    def convert(self, template: Template, page_size: str = "A4"):
+
+        """Converts the invoice on its own, returning the PDF read back."""
+
+        from pypdf import PdfReader
+
+        job = self.job(template)
+        self.assertEqual(NativeRenderer({"page-size": page_size}).convert([job]), {})
+
+        return PdfReader(job.pdf_file)
+
+    def test_pdfs_hold_the_invoice(self):
+
+        template = self.template(3)
+        reader = self.convert(template)
+
+        self.assertEqual(len(reader.pages), 1)
+        self.assertEqual([float(side) for side in reader.pages[0].mediabox[2:]], list(PAGE_SIZES["A4"]))
+
+        text = reader.pages[0].extract_text()
+        for expected in [f"Invoice #{template._id}", "JOHN DOE", "Item 2", "GRAND TOTAL 88.07"]:
+            self.assertIn(expected, text)
+
+    def test_page_count_follows_items_and_page_size(self):
+
+        counts = {
+            size: [len(self.convert(self.template(items), size).pages) for items in ITEM_COUNTS]
+            for size in PAGE_SIZES
+        }
+
+        for size, pages in counts.items():
+
+            self.assertEqual(pages, sorted(pages), size)
+            self.assertEqual(pages[0], 1, size)
+
+            # Every page of items starts a page of its own
+            for items, count in zip(ITEM_COUNTS, pages):
+                self.assertGreaterEqual(count, len(self.template(items).pages()), size)
+
+        # Pages are scaled to the page width, so a page of the same shape holds as much and a shorter one holds less
+        self.assertEqual(counts["A5"], counts["A4"])
+        self.assertTrue(all(letter >= a4 for letter, a4 in zip(counts["Letter"], counts["A4"])))
+        self.assertGreater(sum(counts["Letter"]), sum(counts["A4"]))
+
+    def test_merged_pdfs_are_bookmarked(self):
+
+        from pypdf import PdfReader
+
+        templates = [self.template(1), self.template(2 * ROWS_PER_PAGE), self.template(1)]
+        titles = {template._id: f"Invoice {template._id}" for template in templates}
+        filename = os.path.join(self.directory.name, "merged.pdf")
+
+        self.assertIsNone(NativeRenderer({}).merge([self.job(template) for template in templates], filename, titles))
+
+        reader = PdfReader(filename)
+        starts = [0, 1, len(reader.pages) - 1]
+
+        self.assertEqual([item.title for item in reader.outline], list(titles.values()))
+        self.assertEqual([reader.get_destination_page_number(item) for item in reader.outline], starts)
+
+    def test_characters_outside_windows_1252_are_replaced(self):
+
+        with self.assertWarnsRegex(UserWarning, "Characters Ω in 'ZOË ΩMEGA' cannot be shown"):
+            reader = self.convert(self.template(1, client="Zoë Ωmega"))
+
+        self.assertIn("ZOË ?MEGA", reader.pages[0].extract_text())
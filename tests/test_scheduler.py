@@ -0,0 +1,114 @@
+# Tests of the asyncio conversion scheduler, with a fake wkhtmltopdf on the PATH
+
+# Imports
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+from utils.converter import ConversionJob
+from utils.scheduler import ConversionScheduler
+
+# Constants
+FAKE_WKHTMLTOPDF = """#!{python}
+# Logs the time of every attempt next to the PDF, then hangs, fails its first attempts or writes the PDF by the HTML
+import sys
+import time
+
+html = sys.stdin.read()
+pdf_file = sys.argv[-1]
+
+with open(pdf_file + ".attempts", "a") as log:
+    log.write(f"{{time.time()}}\\n")
+
+with open(pdf_file + ".attempts") as log:
+    attempts = len(log.readlines())
+
+if html.startswith("hang"):
+    time.sleep(30)
+
+if html.startswith("fail") and attempts <= int(html.split()[1]):
+    sys.exit("Conversion failed.")
+
+with open(pdf_file, "wb") as file:
+    file.write(b"%PDF " + html.encode())
+"""
+
+
+# Classes
+class ConversionSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+
+        executable = os.path.join(self.directory.name, "wkhtmltopdf")
+        with open(executable, "w") as file:
+            file.write(FAKE_WKHTMLTOPDF.format(python=sys.executable))
+        os.chmod(executable, 0o755)
+
+        path = mock.patch.dict(os.environ, {"PATH": f"{self.directory.name}{os.pathsep}{os.environ['PATH']}"})
+        path.start()
+        self.addCleanup(path.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def job(self, number: int, html: str) -> ConversionJob:
+        return ConversionJob(number, html, os.path.join(self.directory.name, f"invoice_{number}.pdf"))
+
+    @staticmethod
+    def attempts(job: ConversionJob) -> list[float]:
+
+        """Returns the times wkhtmltopdf was started for the job."""
+
+        with open(f"{job.pdf_file}.attempts") as log:
+            return [float(line) for line in log]
+
+    def test_converts_every_job(self):
+
+        jobs = [self.job(number, f"invoice {number}") for number in range(1, 6)]
+
+        self.assertEqual(ConversionScheduler({}, concurrency=2).run(jobs), {})
+
+        for job in jobs:
+            with open(job.pdf_file, "rb") as file:
+                self.assertEqual(file.read(), f"%PDF invoice {job.number}".encode())
+
+    def test_kills_conversions_running_past_the_timeout(self):
+
+        hanging, other = self.job(1, "hang"), self.job(2, "invoice 2")
+
+        start = time.monotonic()
+        errors = ConversionScheduler({}, timeout=0.5, retries=0).run([hanging, other])
+
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(errors, {1: "wkhtmltopdf was killed after running for 0.5 seconds."})
+        self.assertFalse(os.path.exists(hanging.pdf_file))
+        self.assertTrue(os.path.exists(other.pdf_file))
+
+    def test_retries_with_exponential_backoff(self):
+
+        job = self.job(1, "fail 2")
+
+        self.assertEqual(ConversionScheduler({}, retries=2, backoff=0.2).run([job]), {})
+
+        attempts = self.attempts(job)
+        self.assertEqual(len(attempts), 3)
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.2)
+        self.assertGreaterEqual(attempts[2] - attempts[1], 0.4)
+
+    def test_gives_up_after_the_last_retry(self):
+
+        failing, once = self.job(1, "fail 5"), self.job(2, "fail 1")
+
+        errors = ConversionScheduler({}, retries=2, backoff=0.01).run([failing, once])
+
+        self.assertEqual(errors, {1: "Conversion failed. Gave up after 3 attempts."})
+        self.assertEqual(len(self.attempts(failing)), 3)
+        self.assertFalse(os.path.exists(failing.pdf_file))
+        self.assertTrue(os.path.exists(once.pdf_file))
+
+        # Without retries, the error is reported as it is
+        self.assertEqual(ConversionScheduler({}, retries=0).run([self.job(3, "fail 1")]), {3: "Conversion failed."})
@@ -0,0 +1,152 @@
+# Tests of the render server keeping invoices in the output directory
+
+# Imports
+import glob
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from utils import Catalog, Client, Issuer, Item, Template
+from utils.converter import discard
+from utils.renderers import Renderer
+from utils.server import INVOICES_PATH, InvoiceHTTPServer, InvoiceRenderer
+
+
+# Classes
+class FakeRenderer(Renderer):
+
+    """
+    Writes a placeholder PDF for every invoice once released, or fails every invoice if fail is set. Like the real
+    renderers, it first removes anything left at the paths it writes to.
+    """
+
+    name = "fake"
+
+    def __init__(self):
+
+        super().__init__({})
+
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self.released.set()
+        self.fail = False
+
+    def convert(self, jobs, merged_file=None):
+
+        for job in jobs:
+            discard(job.pdf_file)
+
+        self.started.set()
+        self.released.wait(10)
+
+        if self.fail:
+            return {job.number: "Conversion failed." for job in jobs}
+
+        for job in jobs:
+            with open(job.pdf_file, "wb") as file:
+                file.write(f"%PDF invoice {job.number}".encode())
+
+        return {}
+
+    def merge(self, jobs, filename, titles=None):
+        raise NotImplementedError
+
+
+class KeptInvoiceTest(unittest.TestCase):
+
+    def setUp(self):
+
+        Template.set_issuer(Issuer("Brand & Co", "Brand account", "Bank", "billing@brand.com", 5555555555))
+        Template.set_terms("Payment is due within 30 days of the date of issue.")
+
+        catalog = Catalog(
+            items=[Item("Garden Gnome", "Porcelain", 12.99, 0)],
+            clients=[Client("John Doe", "1344 Example Street", "City, State, Country")]
+        )
+
+        self.renderer = FakeRenderer()
+        self.server = InvoiceHTTPServer(("127.0.0.1", 0), InvoiceRenderer(catalog, self.renderer, workers=2))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        # Invoice files are written relative to the working directory, once the server has compiled the template
+        self.directory = tempfile.TemporaryDirectory()
+        self.working_directory = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.server.renderer.close()
+
+        os.chdir(self.working_directory)
+        self.directory.cleanup()
+
+    def post(self, number: int) -> tuple[int, dict]:
+
+        """Requests invoice number kept in the output directory, returning the response status and JSON body."""
+
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{self.server.server_address[1]}{INVOICES_PATH}",
+            data=json.dumps({
+                "client": "John Doe",
+                "due": "2030-01-01",
+                "items": [{"item": "Garden Gnome", "quantity": 2}],
+                "number": number,
+                "output": "path",
+            }).encode(),
+            method="POST"
+        )
+
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as error:
+            return error.code, json.load(error)
+
+    @staticmethod
+    def content(path: str) -> bytes:
+
+        with open(path, "rb") as file:
+            return file.read()
+
+    def test_existing_invoices_are_not_overwritten(self):
+
+        status, body = self.post(7)
+        self.assertEqual(status, 200)
+        self.assertEqual(self.content(body["path"]), b"%PDF invoice 7")
+
+        self.assertEqual(self.post(7), (409, {"invoice": 7, "error": "Invoice 7 already exists."}))
+        self.assertEqual(self.content(body["path"]), b"%PDF invoice 7")
+
+    def test_invoices_being_converted_are_not_requested_twice(self):
+
+        self.renderer.released.clear()
+
+        responses = []
+        first = threading.Thread(target=lambda: responses.append(self.post(7)))
+        first.start()
+        self.assertTrue(self.renderer.started.wait(10))
+
+        # The claim stays in place while the first request converts
+        self.assertEqual(self.post(7)[0], 409)
+
+        self.renderer.released.set()
+        first.join(10)
+
+        status, body = responses[0]
+        self.assertEqual(status, 200)
+        self.assertEqual(self.content(body["path"]), b"%PDF invoice 7")
+        self.assertEqual(glob.glob(os.path.join(os.path.dirname(body["path"]), "*.tmp")), [])
+
+    def test_failed_conversions_release_their_claim(self):
+
+        self.renderer.fail = True
+        self.assertEqual(self.post(7), (500, {"invoice": 7, "error": "Conversion failed."}))
+        self.assertEqual([path for path in glob.glob("output/**", recursive=True) if os.path.isfile(path)], [])
+
+        self.renderer.fail = False
+        self.assertEqual(self.post(7)[0], 200)
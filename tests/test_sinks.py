@@ -0,0 +1,145 @@
+# Tests of output layouts and the sinks indexing and archiving generated invoices
+
+# Imports
+import csv
+import datetime as dt
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from utils import Client, Item, Template
+from utils.sinks import INDEX_HEADER, LAYOUTS, ArchiveSink, OutputSink
+
+# Constants
+DUE = dt.date(2030, 1, 5)
+
+
+# Classes
+class LayoutTest(unittest.TestCase):
+
+    def tearDown(self):
+        Template.set_output_layout("flat")
+
+    def test_flat(self):
+        self.assertEqual(LAYOUTS["flat"](7, DUE), "")
+
+    def test_hash_spreads_invoices_over_256_directories(self):
+
+        directories = [LAYOUTS["hash"](number, DUE) for number in range(1, 10001)]
+
+        self.assertEqual(len(set(directories)), 256)
+        self.assertTrue(all(len(directory) == 2 and int(directory, 16) < 256 for directory in directories))
+        self.assertEqual(LAYOUTS["hash"](7, DUE), LAYOUTS["hash"](7, dt.date(2031, 2, 3)))  # Only the number counts
+
+    def test_date(self):
+        self.assertEqual(LAYOUTS["date"](7, DUE), os.path.join("2030", "01", "05"))
+
+    def test_invoice_filenames_follow_the_layout(self):
+
+        template = Template(
+            Client("John Doe", "1344 Example Street", "City, State, Country"),
+            [Item("Garden Gnome", "Porcelain", 12.99, 1)],
+            due=DUE.isoformat()
+        )
+
+        for layout in LAYOUTS:
+            Template.set_output_layout(layout)
+            self.assertEqual(
+                template.filename,
+                os.path.join("output", LAYOUTS[layout](template._id, DUE), f"invoice_{template._id}")
+            )
+
+
+class SinkTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.directory.name, "output")
+        self.index_file = os.path.join(self.output, "index.csv")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, *parts: str) -> str:
+
+        """Writes a file under the output directory holding its own relative path, returning its path."""
+
+        filename = os.path.join(self.output, *parts)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        with open(filename, "w") as file:
+            file.write("/".join(parts))
+
+        return filename
+
+    def index(self) -> list[list[str]]:
+
+        with open(self.index_file, newline="") as file:
+            return list(csv.reader(file))
+
+    def test_index_records_files_in_place(self):
+
+        first, second = self.write("invoice_1.pdf"), self.write("invoice_1.html")
+
+        sink = OutputSink(self.index_file)
+        sink.add(1, [first, second])
+        sink.close()
+
+        # Appending runs add rows under the same header
+        sink = OutputSink(self.index_file, append=True)
+        sink.add(1, [first])
+        sink.close()
+
+        self.assertEqual(self.index(), [INDEX_HEADER, ["1", first, ""], ["1", second, ""], ["1", first, ""]])
+        self.assertTrue(os.path.exists(first))
+
+    def test_archive_members_match_the_index(self):
+
+        for extension in ["zip", "tar"]:
+            with self.subTest(extension):
+
+                self.output = os.path.join(self.directory.name, extension)
+                self.index_file = os.path.join(self.output, "index.csv")
+                archive_file = os.path.join(self.output, f"invoices.{extension}")
+                sink = ArchiveSink(self.index_file, archive_file)
+
+                # A date layout, and a merged chunk shared by two invoices
+                chunk = self.write("chunk_1.pdf")
+                sink.add(1, [self.write("2030", "01", "05", "invoice_1.pdf")])
+                sink.add(2, [chunk])
+                sink.add(3, [chunk])
+                sink.add(4, [self.write("2030", "01", "06", "invoice_4.pdf")])
+                sink.close()
+
+                if extension == "zip":
+                    with zipfile.ZipFile(archive_file) as archive:
+                        members = {name: archive.read(name).decode() for name in archive.namelist()}
+                else:
+                    with tarfile.open(archive_file) as archive:
+                        members = {name: archive.extractfile(name).read().decode() for name in archive.getnames()}
+
+                rows = self.index()
+
+                self.assertEqual(rows[0], INDEX_HEADER)
+                self.assertEqual([row[0] for row in rows[1:]], ["1", "2", "3", "4"])
+                self.assertEqual(
+                    [row[2] for row in rows[1:]],
+                    ["2030/01/05/invoice_1.pdf", "chunk_1.pdf", "chunk_1.pdf", "2030/01/06/invoice_4.pdf"]
+                )
+
+                # Every row points at a member of the archive holding the file recorded
+                for number, filename, member in rows[1:]:
+                    self.assertEqual(filename, archive_file)
+                    self.assertEqual(members[member], member)
+
+                self.assertEqual(len(members), 3)  # The shared chunk is archived once
+
+                # Moved files and the directories they emptied are gone, the archive's directory is not
+                self.assertEqual(sorted(os.listdir(self.output)), sorted(["index.csv", f"invoices.{extension}"]))
+
+    def test_archives_are_zip_or_tar(self):
+
+        with self.assertRaisesRegex(ValueError, "neither a .zip nor a .tar file"):
+            ArchiveSink(self.index_file, os.path.join(self.output, "invoices.rar"))
@@ -0,0 +1,88 @@
+# Tests of whole-batch validation
+
+# Imports
+import json
+from utils import Catalog, Client, Item
+from utils.batch import LONG_COLUMNS, read_batch
+from utils.validation import validate_batch
+from tests.test_batch import LONG_CSV, WIDE_CSV, BatchFileTest
+
+
+# Classes
+class ValidateBatchTest(BatchFileTest):
+
+    def setUp(self):
+
+        super().setUp()
+
+        self.catalog = Catalog(
+            items=[Item(name, "", 1.0, 0) for name in ["Garden Gnome", "USB stick", "Widget"]],
+            clients=[Client(name, "", "") for name in ["John Doe", "Jane & Co"]]
+        )
+
+    def test_valid_batches(self):
+
+        for name, content in [("long.csv", LONG_CSV), ("wide.csv", WIDE_CSV)]:
+            self.assertEqual(validate_batch(self.batch_file(name, content), self.catalog), [])
+
+    def test_long_problems_are_located_at_their_lines(self):
+
+        filename = self.batch_file("batch.csv", (
+            "invoice,client,due,item,quantity\n"
+            "1,John Doe,2030-01-01,Garden Gnome,3\n"
+            "\n"
+            "1,John Doe,2030-01-01,Nope,2\n"
+            "\n"
+            "2,Ghost,2030-02-31,Widget,x\n"
+            "1,John Doe,2030-01-01,Widget,1\n"
+        ))
+
+        self.assertEqual(validate_batch(filename, self.catalog), [
+            f"Line 4 of {filename}: unknown item Nope.",
+            f"Line 6 of {filename}: unknown client Ghost.",
+            f"Line 6 of {filename}: due date 2030-02-31 is not a valid ISO date (yyyy-mm-dd).",
+            f"Line 6 of {filename}: quantity x of item Widget is not a non-negative integer.",
+            f"Line 7 of {filename}: rows of invoice 1 are not consecutive.",
+        ])
+
+    def test_wide_problems_are_located_at_their_lines(self):
+
+        filename = self.batch_file("batch.csv", (
+            "John Doe,Nobody,Jane & Co\n"
+            "2030-01-01,2030-13-01,\n"
+            "\n"
+            "\"Garden Gnome, 3\",\"Widget, 1\",\"USB stick, 2\"\n"
+            "\"Widget, x\",\"Nope, 2\",\n"
+        ))
+
+        self.assertEqual(validate_batch(filename, self.catalog), [
+            f"Column 1, line 5 of {filename}: quantity x of item Widget is not a non-negative integer.",
+            f"Column 2, line 1 of {filename}: unknown client Nobody.",
+            f"Column 2, line 2 of {filename}: due date 2030-13-01 is not a valid ISO date (yyyy-mm-dd).",
+            f"Column 2, line 5 of {filename}: unknown item Nope.",
+            f"Column 3, line 2 of {filename}: missing due.",
+        ])
+
+    def test_quantities_are_valid_exactly_when_they_can_be_read(self):
+
+        quantities = [3, 3.0, "3", " 3", "+3", "3.0", 3.5, -1, "-1", "two", True, "3_000", "\u0663"]
+
+        for quantity in quantities:
+
+            row = ["1", "John Doe", "2030-01-01", "Widget", quantity]
+
+            for name, content in [
+                ("batch.jsonl", json.dumps(dict(zip(LONG_COLUMNS, row)))),
+                ("batch.csv", f"{','.join(LONG_COLUMNS)}\n{','.join(str(value) for value in row)}\n"),
+            ]:
+                with self.subTest(name, quantity=quantity):
+
+                    filename = self.batch_file(name, content)
+
+                    try:
+                        list(read_batch(filename))
+                        readable = True
+                    except ValueError:
+                        readable = False
+
+                    self.assertEqual(validate_batch(filename, self.catalog) == [], readable)
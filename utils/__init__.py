@@ -1,19 +1,59 @@
 # Invoice creation utilities
 
 # Imports
+import collections
+import contextlib
+import copy
 import datetime as dt
-import bs4.element
-from bs4 import BeautifulSoup
-import pdfkit
+import html
+import itertools
 import os
 import re
-import pandas as pd
-from typing import Iterable
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable, Iterator, TYPE_CHECKING
+from utils.batch import read_batch
+from utils.cache import RenderCache
+from utils.compiled import CompiledTemplate, TITLE_SLOT, ITEMS_SLOT
+from utils.converter import ConversionJob
+from utils.export import Exporter
+from utils.manifest import RunManifest, fingerprint
+from utils.profiling import PROFILER
+from utils.renderers import PdfkitRenderer, Renderer
+from utils.sinks import LAYOUTS, OutputSink
+
+# Heavy dependencies are imported where they are used, so that the CLI only loads what a command needs
+if TYPE_CHECKING:
+    import bs4.element
+    from bs4 import BeautifulSoup
+    from utils.scheduler import ConversionScheduler
 
 # Constants
 EMAIL_RE = "^[a-zA-Z0-9.!#$%&'*+/=?^_`{|}~-]+@[a-zA-Z0-9-]+(?:\.[a-zA-Z0-9-]+)*$"
 ISO_DATE_RE = "^\d{4}-([0]\d|1[0-2])-([0-2]\d|3[01])$"
 
+TEMPLATE_FILE = "resources/invoice.html"
+STYLE_FILE = "resources/invoice.css"
+OUTPUT_DIR = "output"
+MANIFEST_FILE = os.path.join(OUTPUT_DIR, "manifest.json")
+MERGED_FILE = os.path.join(OUTPUT_DIR, "invoices.pdf")
+CHUNK_FILE = os.path.join(OUTPUT_DIR, "invoices_{}-{}.pdf")  # Merged chunk of the first to the last invoice
+INDEX_FILE = os.path.join(OUTPUT_DIR, "index.csv")
+ARCHIVE_FILE = os.path.join(OUTPUT_DIR, "invoices.{}")  # Archive of the given format
+EXPORT_FILE = os.path.join(OUTPUT_DIR, "invoices.{}")  # Structured export of the given format
+EXPORT_INDEX_FILE = os.path.join(OUTPUT_DIR, "index.{}.csv")  # Index of a structured export of the given format
+EXPORT_ARCHIVE_FILE = os.path.join(OUTPUT_DIR, "invoices.{}.{}")  # Archive of a structured export, by both formats
+
+CENT = Decimal("0.01")
+TOTALS_BLOCK_SIZE = 1024  # Invoices whose totals are computed together in batches
+ROWS_PER_PAGE = 10  # Item rows on each page of a long invoice
+
+CATALOG_VERSION = 1  # Format of compiled catalog files
+CATALOG_QUERY_SIZE = 500  # Names looked up per query in a compiled catalog
+CATALOG_SCHEMA = """
+CREATE TABLE items (name TEXT PRIMARY KEY, description TEXT, price_cents INTEGER NOT NULL) WITHOUT ROWID;
+CREATE TABLE clients (name TEXT PRIMARY KEY, address TEXT, location TEXT) WITHOUT ROWID;
+"""
+
 OPTIONS = {
     "dpi": 300,
     "page-size": "A5",
@@ -29,8 +69,6 @@ OPTIONS = {
 # Classes
 class Item:
 
-    _instances = []
-
     def __init__(self, name: str, description: str, price: float, quantity: int):
 
         # Validation
@@ -38,66 +76,94 @@ class Item:
         assert quantity >= 0, f"Quantity {quantity} is not greater than or equal to 0."
         assert type(quantity) is int, f"Quantity {quantity} is not an integer value."
 
-        self._instances.append(self)
-
         # Properties
         self.name = name
         self.description = description
-        self.price = round(price, 2)
+        self.price_cents = to_cents(price)
         self.__quantity = quantity
 
     # Class methods
 
     @classmethod
-    def from_csv(cls, filename: str):
+    def from_csv(cls, filename: str) -> list:
 
-        """Creates a bunch of item instances from a CSV file."""
-
-        for index, row in dataframe_from_csv(filename):
+        """Returns a bunch of item instances created from a CSV file."""
 
+        return [
             Item(
                 name=row["name"],
                 description=row["description"],
                 price=float(row["price"]),
                 quantity=0  # Quantity is 0 by default until set
             )
+            for index, row in dataframe_from_csv(filename)
+        ]
 
-    @classmethod
-    def find_items(cls, names: str | list[str]) -> list:
-
-        """Returns the Item object with the corresponding name."""
+    # Instance methods
 
-        names = [names] if type(names) is str else names  # Make sure names is iterable
+    def with_quantity(self, quantity: int):
 
-        return [item for item in cls._instances if item.name in names]
+        """Returns a copy of the item charged at the given quantity, leaving this item untouched."""
 
-    @classmethod
-    def all(cls) -> list:
-        return cls._instances
+        item = copy.copy(self)
+        item.quantity = quantity
 
-    # Instance methods
+        return item
 
     # Properties
+    @property
+    def price(self) -> float:
+        return self.price_cents / 100
+
+    @property
+    def subtotal_cents(self) -> int:
+        return self.price_cents * self.quantity
+
     @property
     def subtotal(self) -> float:
-        return round(self.price * self.quantity, 2)
+        return self.subtotal_cents / 100
 
     @property
-    def html(self) -> BeautifulSoup:
-
-        representation = f"""<tr>
-            <td>
-              <div class="product-desc">
-                <h4>{self.name}</h4>
-                <p>{self.description}</p>
-              </div>
-            </td>
-            <td>{format_price(self.price)}</td>
-            <td>{self.quantity}</td>
-            <td>{format_price(self.subtotal)}</td>
-          </tr>"""
-
-        return BeautifulSoup(representation, features='html.parser')
+    def row(self) -> str:
+
+        """
+        Returns the item's row of the invoice item table as markup, with its name and description escaped. The markup is
+        laid out exactly as BeautifulSoup serializes it, so parsing the row does not change it.
+        """
+
+        return (
+            "<tr>\n"
+            "<td>\n"
+            "<div class=\"product-desc\">\n"
+            f"<h4>{html.escape(str(self.name), quote=False)}</h4>\n"
+            f"<p>{html.escape(str(self.description), quote=False)}</p>\n"
+            "</div>\n"
+            "</td>\n"
+            f"<td>{format_cents(self.price_cents)}</td>\n"
+            f"<td>{self.quantity}</td>\n"
+            f"<td>{format_cents(self.subtotal_cents)}</td>\n"
+            "</tr>"
+        )
+
+    @property
+    def cells(self) -> tuple[str, str, str, str, str]:
+
+        """Returns the text of the item's cells in the item table: name, description, price, quantity and subtotal."""
+
+        return (
+            str(self.name),
+            str(self.description),
+            format_cents(self.price_cents),
+            str(self.quantity),
+            format_cents(self.subtotal_cents),
+        )
+
+    @property
+    def html(self) -> "BeautifulSoup":
+
+        from bs4 import BeautifulSoup
+
+        return BeautifulSoup(self.row, features='html.parser')
 
     @property
     def quantity(self):
@@ -142,39 +208,181 @@ class Issuer:
 
 class Client:
 
-    _instances = []
-
     def __init__(self, name: str, address: str, location: str):
 
-        self._instances.append(self)
-
         # Properties
         self.name = name
         self.address = address
         self.location = location
 
     @classmethod
-    def from_csv(cls, filename: str):
-        """Creates a bunch of item instances from a CSV file."""
+    def from_csv(cls, filename: str) -> list:
+        """Returns a bunch of client instances created from a CSV file."""
 
         # Create client instances
-        for index, row in dataframe_from_csv(filename):
-
+        return [
             Client(
                 name=row["name"],
                 address=row["address"],
                 location=row["location"]
             )
+            for index, row in dataframe_from_csv(filename)
+        ]
+
+    def __repr__(self):
+        return f"{self.name}"
+
+
+class Catalog:
+
+    """
+    The items and clients available to a run, indexed by name. Each run loads its own catalog, so nothing outlives the
+    run that loaded it.
+    """
+
+    def __init__(self, items: list[Item] | None = None, clients: list[Client] | None = None):
+
+        self.items = {}
+        self.clients = {}
+
+        add_to_index(self.items, items or [], "item")
+        add_to_index(self.clients, clients or [], "client")
 
     @classmethod
-    def find_client(cls, name: str):
+    def from_csv(cls, items_file: str, clients_file: str):
 
-        """Returns the Item object with the corresponding name."""
+        """Returns a catalog of the items and clients in the given CSV files."""
 
-        return [client for client in cls._instances if client.name == name][0]
+        return cls(items=Item.from_csv(items_file), clients=Client.from_csv(clients_file))
 
-    def __repr__(self):
-        return f"{self.name}"
+    def find_items(self, names: str | list[str]) -> list[Item]:
+
+        """Returns the catalog Item objects with the corresponding names, in the same order."""
+
+        names = [names] if type(names) is str else names  # Make sure names is iterable
+
+        return find_in_index(self.items, names, "item")
+
+    def find_client(self, name: str) -> Client:
+
+        """Returns the Client object with the corresponding name."""
+
+        return find_in_index(self.clients, [name], "client")[0]
+
+    def find_unknown(self, names: Iterable[str], kind: str) -> list[str]:
+
+        """Returns the given item or client names, depending on kind, that are not in the catalog."""
+
+        index = self.items if kind == "item" else self.clients
+
+        return [name for name in names if name not in index]
+
+
+class CompiledCatalog(Catalog):
+
+    """
+    A catalog read from a file compiled by CompiledCatalog.compile, an indexed SQLite database. Items and clients are
+    only read when they are first looked up, so opening the catalog takes the same time whatever its size.
+    """
+
+    def __init__(self, filename: str):
+
+        import sqlite3
+
+        if not os.path.exists(filename):
+            raise ValueError(f"Compiled catalog {filename} does not exist.")
+
+        super().__init__()  # Indexes hold what was read so far
+
+        self.filename = filename
+        # Read-only, so the render server can look names up from whichever thread serves a request
+        self.connection = sqlite3.connect(f"file:{filename}?mode=ro", uri=True, check_same_thread=False)
+
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != CATALOG_VERSION:
+            raise ValueError(f"Compiled catalog {filename} has format {version}, recompile it for {CATALOG_VERSION}.")
+
+    @staticmethod
+    def compile(catalog: Catalog, filename: str):
+
+        """Writes the items and clients of a catalog to a compiled catalog file, replacing any previous one."""
+
+        import sqlite3
+
+        temporary = f"{filename}.tmp"
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+        with contextlib.closing(sqlite3.connect(temporary)) as connection, connection:
+
+            connection.executescript(CATALOG_SCHEMA)
+            connection.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+
+            connection.executemany(
+                "INSERT INTO items VALUES (?, ?, ?)",
+                ((item.name, item.description, item.price_cents) for item in catalog.items.values())
+            )
+            connection.executemany(
+                "INSERT INTO clients VALUES (?, ?, ?)",
+                ((client.name, client.address, client.location) for client in catalog.clients.values())
+            )
+
+        os.replace(temporary, filename)
+
+    def find_items(self, names: str | list[str]) -> list[Item]:
+
+        """Returns the catalog Item objects with the corresponding names, in the same order."""
+
+        names = [names] if type(names) is str else names  # Make sure names is iterable
+
+        self.__load("items", names)
+
+        return super().find_items(names)
+
+    def find_client(self, name: str) -> Client:
+
+        """Returns the Client object with the corresponding name."""
+
+        self.__load("clients", [name])
+
+        return super().find_client(name)
+
+    def find_unknown(self, names: Iterable[str], kind: str) -> list[str]:
+
+        """Returns the given item or client names, depending on kind, that are not in the catalog."""
+
+        names = list(names)
+        self.__load("items" if kind == "item" else "clients", names)
+
+        return super().find_unknown(names, kind)
+
+    def __load(self, table: str, names: list[str]):
+
+        """Reads the items or clients with the given names into the indexes, unless they were read already."""
+
+        for row in self.__select(table, names):
+
+            if table == "items":
+                name, description, price_cents = row
+                self.items[name] = Item(name, description, Decimal(price_cents) / 100, 0)
+            else:
+                self.clients[row[0]] = Client(*row)
+
+    def __select(self, table: str, names: list[str]) -> list[tuple]:
+
+        """Returns the rows of a table with the given names that have not been read yet."""
+
+        index = self.items if table == "items" else self.clients
+        missing = list(dict.fromkeys(name for name in names if name not in index))
+        rows = []
+
+        # Stay under SQLite's limit on the number of query parameters
+        for start in range(0, len(missing), CATALOG_QUERY_SIZE):
+            batch = missing[start:start + CATALOG_QUERY_SIZE]
+            query = f"SELECT * FROM {table} WHERE name IN ({', '.join('?' * len(batch))})"
+            rows.extend(self.connection.execute(query, batch))
+
+        return rows
 
 
 class Template:
@@ -182,6 +390,9 @@ class Template:
     invoices_created = 0
     __terms_and_conditions = None
     __issuer = None
+    __rows_per_page = ROWS_PER_PAGE
+    __output_layout = "flat"
+    __style = None  # Style tag appended to every populated invoice
 
     def __init__(
             self,
@@ -189,7 +400,8 @@ class Template:
             items: list[Item] | Item,
             due: str | dt.date | None = None,
             offset: int = 0,
-            tax_percentage: float = 13.0
+            tax_percentage: float = 13.0,
+            number: int | None = None
     ):
 
         # Validation
@@ -206,19 +418,68 @@ class Template:
         Template.invoices_created += 1  # Track instances
 
         # Properties
-        self.invoice = self.__get_template()
+        self.invoice = None  # BeautifulSoup tree, only parsed if populate is called
         self.client = client
         self.items = items if type(items) is list else [items]
-        self._id = self.invoices_created + offset  # So numbering can start from specified number
+        # A given number (such as the invoice's position in a batch) takes precedence over the process-local count
+        self._id = (self.invoices_created if number is None else number) + offset
         self.tax_percentage = tax_percentage / 100
+        self.tax_rate = Decimal(str(tax_percentage)) / 100  # Exact rate used for money arithmetic
+        self.__cached_totals = None  # Subtotal and tax in cents, computed once
         self._created = dt.date.today()
 
     # Class functions
 
     @classmethod
-    def batch_from_file(cls, filename: str, pdf=False):
-
-        """Creates a batch of invoices from a batch CSV file."""
+    def batch_from_file(
+            cls,
+            filename: str,
+            catalog: Catalog,
+            pdf=False,
+            workers: int = 1,
+            chunk_size: int = 1,
+            merge_chunks=False,
+            keep_html=False,
+            cache: RenderCache | None = None,
+            manifest: RunManifest | None = None,
+            previous: RunManifest | None = None,
+            shard: tuple[int, int] | None = None,
+            scheduler: "ConversionScheduler | None" = None,
+            merged_file: str | None = None,
+            bookmarks=False,
+            renderer: Renderer | None = None,
+            sink: OutputSink | None = None
+    ) -> dict[int, str]:
+
+        """
+        Creates a batch of invoices from a batch file, looking up clients and items in the catalog. Invoices are
+        converted in chunks of chunk_size per wkhtmltopdf launch, and with more than one worker the chunks are
+        rendered and converted in a process pool. Invoices are numbered by their position in the batch file, so
+        numbering does not depend on the process or on sharding. HTML files are only kept alongside PDFs if keep_html
+        is set, and unchanged invoices are copied from the cache if given. Returns conversion error messages by invoice
+        number.
+
+        Every invoice is recorded in the manifest if given, except those that failed. With the manifest of a previous
+        run, only invoices whose inputs changed since that run, or whose files are missing, are generated again.
+
+        A shard (i, n) only generates every n-th invoice of the batch, starting with the i-th, so n runs with shards 1
+        to n generate the whole batch between them without any coordination.
+
+        With a scheduler, invoices are rendered in this process and converted by the scheduler's concurrent wkhtmltopdf
+        processes instead of in chunks, ignoring workers, chunk_size and merge_chunks.
+
+        With a merged_file, the whole batch is converted into that single PDF in one pass with save_merged, ignoring
+        workers, chunk_size, merge_chunks and the scheduler.
+
+        PDFs are converted by the renderer, with wkhtmltopdf through pdfkit by default. The scheduler always converts
+        with wkhtmltopdf.
+
+        With a sink, the files of every invoice that did not fail are handed to it as soon as its chunk is saved, or
+        once the whole batch is converted with a merged_file or a scheduler, so that it indexes or archives them.
+
+        The batch runs as a pipeline: templates are created as the batch file is read and each chunk is dropped once
+        it is saved, with at most two chunks per worker in flight, so memory does not grow with the batch size.
+        """
 
         if not cls.__issuer:
             raise ValueError("Please define an issuer first.")
@@ -226,44 +487,232 @@ class Template:
         if not cls.__terms_and_conditions:
             raise ValueError("Please define the terms and agreements first.")
 
-        batches = pd.read_csv(filename)  # Read batches
+        assert type(workers) is int and workers >= 1, f"Number of workers {workers} is not a positive integer."
+        assert type(chunk_size) is int and chunk_size >= 1, f"Chunk size {chunk_size} is not a positive integer."
+
+        renderer = renderer or PdfkitRenderer(OPTIONS)
+        templates = cls.templates_from_file(filename, catalog, shard)
 
-        # Create templates from batches
-        for client in batches:
-            column = batches[client]
+        # Extensions of the files written for each invoice, besides merged PDFs
+        extensions = []
+        if pdf and not (merge_chunks or merged_file):
+            extensions.append(".pdf")
+        if keep_html or not pdf:
+            extensions.append(".html")
 
-            current_items = []  # Items charged on current invoice
+        if manifest is not None:
+            inputs = cls.__inputs_fingerprint(pdf, merge_chunks or merged_file is not None, keep_html, renderer)
+            templates = manifest.record(templates, inputs, extensions, previous)
 
-            # Parse client header (duplicate headers get numbers added on and that prevents lookup)
-            client = client.split(".")[0]
+        templates = with_batch_totals(templates)
+        invoices = []  # Numbers and filenames of the invoices converted in a single pass, for the sink
+
+        def listed(templates: Iterable) -> Iterator:
+            for template in templates:
+                invoices.append((template._id, template.filename))
+                yield template
+
+        if merged_file and pdf:
+            errors = cls.save_merged(listed(templates), merged_file, keep_html, bookmarks, renderer)
+        elif scheduler is not None and pdf:
+            errors = scheduler.run(cls.__conversion_jobs(listed(templates), keep_html), cache)
+        else:
+            chunks = chunked(templates, chunk_size)
+            errors = cls.__save_chunks(
+                chunks, workers, pdf, merge_chunks, keep_html, cache, renderer, sink, extensions
+            )
 
-            # Getting client
-            client = Client.find_client(client)
+        if sink is not None and invoices:
+            cls.__index(sink, invoices, errors, extensions, merged_file if pdf else None)
 
-            for row in column.iteritems():
-                index, value = row  # Unpack
+        if manifest is not None:
+            manifest.discard(errors)
 
-                # As soon as NaN is reached, break (no more items)
-                if pd.isna(value):
-                    break
+        return errors
+
+    @classmethod
+    def __save_chunks(
+            cls,
+            chunks: Iterable,
+            workers: int,
+            pdf: bool,
+            merge_chunks: bool,
+            keep_html: bool,
+            cache: RenderCache | None,
+            renderer: Renderer,
+            sink: OutputSink | None = None,
+            extensions: list[str] | None = None
+    ) -> dict[int, str]:
+
+        """
+        Saves chunks of templates in this process, or in a process pool with more than one worker, handing the files of
+        every saved chunk to the sink if given.
+        """
+
+        errors = {}
+        submitted = collections.deque()  # Numbers and filenames of every chunk in flight, in order
+
+        def listed(chunks: Iterable) -> Iterator:
+            for chunk in chunks:
+                submitted.append([(template._id, template.filename) for template in chunk])
+                yield chunk
+
+        def saved(chunk_errors: dict[int, str]):
+            invoices = submitted.popleft()
+            if sink is not None:
+                merged_file = CHUNK_FILE.format(invoices[0][0], invoices[-1][0]) if pdf and merge_chunks else None
+                cls.__index(sink, invoices, chunk_errors, extensions, merged_file)
+
+        if workers == 1:
+            for chunk in listed(chunks):
+                chunk_errors = cls.save_chunk(chunk, pdf, merge_chunks, keep_html, cache, renderer)
+                saved(chunk_errors)
+                errors |= chunk_errors
+            return errors
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(
+                    cls.__issuer,
+                    cls.__terms_and_conditions,
+                    cls.__rows_per_page,
+                    cls.__output_layout,
+                    PROFILER.enabled,
+                    PROFILER.profiled_stage
+                )
+        ) as executor:
+
+            results = bounded_map(
+                executor, _save_chunk, listed(chunks), 2 * workers, pdf, merge_chunks, keep_html, cache, renderer
+            )
+
+            # Consuming the results re-raises any exception from a worker
+            for chunk_errors, profiled in results:
+                saved(chunk_errors)
+                errors |= chunk_errors
+                PROFILER.merge(profiled)
+
+        return errors
+
+    @staticmethod
+    def __index(
+            sink: OutputSink,
+            invoices: list[tuple[int, str]],
+            errors: dict[int, str],
+            extensions: list[str],
+            merged_file: str | None = None
+    ):
 
-                # Get date
-                if index == 0:
-                    due_date = value
+        """
+        Hands the sink the files of every invoice that did not fail, given invoice numbers and filenames without an
+        extension, along with the merged PDF holding the invoices if there is one.
+        """
 
-                # It's an item
+        shared = [merged_file] if merged_file else []
+
+        for number, filename in invoices:
+            if number not in errors:
+                sink.add(number, [f"{filename}{extension}" for extension in extensions] + shared)
+
+    @classmethod
+    def export_batch(
+            cls,
+            filename: str,
+            catalog: Catalog,
+            exporter: Exporter,
+            shard: tuple[int, int] | None = None,
+            sink: OutputSink | None = None
+    ) -> int:
+
+        """
+        Exports the invoices of a batch file as structured records with the exporter, built straight from their data,
+        so no invoice is rendered or converted. Invoices are numbered and sharded as by batch_from_file. With a sink,
+        the file of every invoice written to one of its own is handed to it right away, and the exporter's single file
+        once it is closed. Returns the number of invoices exported.
+        """
+
+        if not cls.__issuer:
+            raise ValueError("Please define an issuer first.")
+
+        count = 0
+        streamed = []  # Numbers of the invoices written to the exporter's single file
+        templates = with_batch_totals(cls.templates_from_file(filename, catalog, shard))
+
+        try:
+            for template in templates:
+
+                with PROFILER.stage("export"):
+                    file = exporter.write(template)
+
+                count += 1
+
+                if sink is None:
+                    continue
+                elif file:
+                    sink.add(template._id, [file])
                 else:
-                    name, quantity = value.split(",")
-                    quantity = int(quantity)
+                    streamed.append(template._id)
+        finally:
+            exporter.close()
+
+        for number in streamed:
+            sink.add(number, [exporter.filename])
+
+        return count
+
+    @classmethod
+    def templates_from_file(cls, filename: str, catalog: Catalog, shard: tuple[int, int] | None = None) -> Iterable:
+
+        """
+        Yields one template per invoice in a batch file, numbered by its position in the file. With a shard (i, n),
+        only the invoices at positions i, i + n, i + 2n and so on are yielded. Long format batch files are streamed, so
+        only the invoice being yielded is held in memory.
+        """
 
-                    item = Item.find_items(name)[0]
-                    item.quantity = quantity
+        index, count = shard or (1, 1)
 
-                    current_items.append(item)
+        for position, invoice in enumerate(PROFILER.iterate("batch_read", read_batch(filename)), start=1):
 
-            # Create the template and save it
-            template = Template(client, current_items, due=due_date)
-            template.save(pdf=pdf)
+            if (position - index) % count:
+                continue
+
+            with PROFILER.stage("catalog_lookup"):
+
+                # Getting client
+                client = catalog.find_client(invoice.client)
+
+                # Look up every item at once so all unknown names are reported together
+                items = catalog.find_items([name for name, quantity in invoice.lines])
+
+            # Copy so that invoices sharing an item do not overwrite each other's quantity
+            items = [item.with_quantity(quantity) for item, (name, quantity) in zip(items, invoice.lines)]
+
+            yield Template(client, items, due=invoice.due, number=position)
+
+    @classmethod
+    def __inputs_fingerprint(cls, pdf: bool, merge: bool, keep_html: bool, renderer: Renderer) -> str:
+
+        """
+        Returns a hash of everything shared by the invoices of a run: the issuer, terms, template, stylesheet,
+        pagination, renderer settings and output settings.
+        """
+
+        with open(TEMPLATE_FILE) as template, open(STYLE_FILE) as style:
+            files = [template.read(), style.read()]
+
+        return fingerprint(
+            vars(cls.__issuer),
+            cls.__terms_and_conditions,
+            files,
+            cls.__rows_per_page,
+            renderer.settings,
+            pdf,
+            merge,
+            keep_html
+        )
 
     @classmethod
     def terms_from_file(cls, filename: str):
@@ -286,6 +735,24 @@ class Template:
     def set_issuer(cls, issuer: Issuer):
         cls.__issuer = issuer
 
+    @classmethod
+    def set_rows_per_page(cls, rows: int):
+
+        """Sets the number of item rows on each page of invoices too long for one page."""
+
+        assert type(rows) is int and rows >= 1, f"Number of rows per page {rows} is not a positive integer."
+
+        cls.__rows_per_page = rows
+
+    @classmethod
+    def set_output_layout(cls, layout: str):
+
+        """Sets how invoice files are laid out in subdirectories of the output directory."""
+
+        assert layout in LAYOUTS, f"Output layout {layout} is not one of {', '.join(LAYOUTS)}."
+
+        cls.__output_layout = layout
+
     # Properties
 
     @property
@@ -315,45 +782,77 @@ class Template:
         else:
             raise ValueError("Due date must be an ISO date string or a datetime.date object.")
 
+    @property
+    def fingerprint(self) -> str:
+
+        """
+        Returns a hash of everything specific to this invoice that its document is generated from. The issue date is
+        left out, so an unchanged invoice is not generated again on a later day.
+        """
+
+        items = [(item.name, item.description, item.price_cents, item.quantity) for item in self.items]
+
+        return fingerprint(vars(self.client), items, self.due, str(self.tax_rate))
+
+    @property
+    def totals(self) -> tuple[int, int, int]:
+
+        """
+        Returns the pre-tax subtotal, tax and grand total in cents. They are computed on first access, or set for a
+        whole batch at once by cache_batch_totals, and cached from then on.
+        """
+
+        if self.__cached_totals is None:
+            subtotal = sum(item.subtotal_cents for item in self.items)
+            self.__cached_totals = (subtotal, tax_cents(subtotal, self.tax_rate))
+
+        subtotal, tax = self.__cached_totals
+
+        return subtotal, tax, subtotal + tax
+
+    def cache_totals(self, subtotal: int, tax: int):
+
+        """Caches totals in cents that were computed outside of the template."""
+
+        self.__cached_totals = (subtotal, tax)
+
     @property
     def subtotal(self) -> float:
 
         """Returns pre-tax subtotal as a float."""
 
-        subtotal = 0
-        for item in self.items:
-            subtotal += item.subtotal
-
-        return subtotal
+        return self.totals[0] / 100
 
     @property
     def tax(self) -> float:
 
         """Returns tax total as a float."""
 
-        return self.subtotal * self.tax_percentage
+        return self.totals[1] / 100
 
     @property
     def grand_total(self) -> float:
 
         """Returns sum of subtotal and tax as a float."""
 
-        return self.subtotal + self.tax
+        return self.totals[2] / 100
 
     # Utility functions
 
     @staticmethod
-    def __get_template() -> BeautifulSoup:
+    def __get_template() -> "BeautifulSoup":
 
         """Returns the invoice template."""
 
-        with open("resources/invoice.html") as file:
+        from bs4 import BeautifulSoup
+
+        with open(TEMPLATE_FILE) as file:
             raw_text = file.read()
             template = BeautifulSoup(raw_text, features='html.parser')
 
         return template
 
-    def __get_element(self, class_name: str) -> bs4.element.Tag:
+    def __get_element(self, class_name: str) -> "bs4.element.Tag":
 
         """Returns an element of the template given its class name."""
 
@@ -367,12 +866,15 @@ class Template:
 
     # Functions for filling out template
 
-    def __invoice_details(self):
+    def __invoice_details(self) -> dict[str, str]:
+
+        """Returns invoice details."""
 
-        """Updates invoice details."""
-        self.__replace_text("invoice-date", f"Date of issue: {str(self._created)}")
-        self.__replace_text("payment-date", f"Due by: {str(self.due)}")
-        self.__replace_text("invoice-number", f"Invoice #{str(self._id)}")
+        return {
+            "invoice-date": f"Date of issue: {str(self._created)}",
+            "payment-date": f"Due by: {str(self.due)}",
+            "invoice-number": f"Invoice #{str(self._id)}",
+        }
 
     def __add_items(self):
 
@@ -384,59 +886,67 @@ class Template:
         for item in self.items:
             table.append(item.html)
 
-    def __totals(self):
+    def __totals(self) -> dict[str, str]:
 
-        """Update totals."""
+        """Returns totals."""
 
-        # Replacing
-        self.__replace_text("actual-subtotal", format_price(self.subtotal))
-        self.__replace_text("grandtotal", format_price(self.grand_total))
-        self.__replace_text("tax", format_price(self.tax))
-        self.__replace_text("tax-percentage", f"Tax {int(self.tax_percentage * 100)}%")
+        subtotal, tax, grand_total = self.totals
 
-    def __brand_name(self):
+        return {
+            "actual-subtotal": format_cents(subtotal),
+            "grandtotal": format_cents(grand_total),
+            "tax": format_cents(tax),
+            "tax-percentage": f"Tax {int(self.tax_rate * 100)}%",
+        }
 
-        """Fills in brand name."""
+    def __brand_name(self) -> dict[str, str]:
 
-        self.__replace_text("brand-name", self.__issuer.name)
+        """Returns brand name."""
 
-    def __payment_info(self):
+        return {"brand-name": self.__issuer.name}
 
-        """Updates payment information."""
+    def __payment_info(self) -> dict[str, str]:
 
-        self.__replace_text("pay-to", f"Pay to: {self.__issuer.name}")
-        self.__replace_text("account", f"Account: {self.__issuer.account_name}")
-        self.__replace_text("bank", self.__issuer.bank)
-        self.__replace_text("email", self.__issuer.email)
-        self.__replace_text("phone", format_phone(self.__issuer.phone))
+        """Returns payment information."""
 
-    def __billing_details(self):
-        """Updates billing information."""
+        return {
+            "pay-to": f"Pay to: {self.__issuer.name}",
+            "account": f"Account: {self.__issuer.account_name}",
+            "bank": self.__issuer.bank,
+            "email": self.__issuer.email,
+            "phone": format_phone(self.__issuer.phone),
+        }
 
-        self.__replace_text("company-name", self.client.name)
-        self.__replace_text("address", self.client.address)
-        self.__replace_text("location", self.client.location)
+    def __billing_details(self) -> dict[str, str]:
 
-    def __fill_terms_and_conditions(self):
+        """Returns billing information."""
 
-        """Updates terms and conditions."""
+        return {
+            "company-name": self.client.name,
+            "address": self.client.address,
+            "location": self.client.location,
+        }
 
-        self.__replace_text("terms-and-conditions", self.__terms_and_conditions)
+    def __fill_terms_and_conditions(self) -> dict[str, str]:
+
+        """Returns terms and conditions."""
+
+        return {"terms-and-conditions": self.__terms_and_conditions}
 
     def __add_styling(self):
 
-        """Adds the CSS styling inline in the invoice."""
+        """Adds the minified CSS styling inline in the invoice, parsing it only for the first invoice."""
 
-        with open("resources/invoice.css") as file:
-            style = f"<style>{file.read()}</style>"
+        from bs4 import BeautifulSoup
 
-        style_tag = BeautifulSoup(style, features='html.parser')
+        if Template.__style is None:
+            Template.__style = BeautifulSoup(CompiledTemplate.stylesheet(STYLE_FILE), features='html.parser').style
 
-        self.invoice.find("html").append(style_tag)
+        self.invoice.find("html").append(copy.copy(Template.__style))
 
-    def populate(self):
+    def __check_populatable(self):
 
-        """Fills out the invoice in its entirety."""
+        """Raises an error if the invoice is missing information required to fill it out."""
 
         if not self.__terms_and_conditions:
             raise ValueError("Please define the terms and conditions of the invoice.")
@@ -444,60 +954,457 @@ class Template:
         if not self.due:
             raise ValueError("Please define the due date of the invoice.")
 
-        self.__invoice_details()
+    def fields(self) -> dict[str, str]:
+
+        """Returns the text of every template field, keyed by the class name of the element holding it."""
+
+        return {
+            **self.__invoice_details(),
+            **self.__totals(),
+            **self.__brand_name(),
+            **self.__payment_info(),
+            **self.__billing_details(),
+            **self.__fill_terms_and_conditions(),
+        }
+
+    def populate(self):
+
+        """Fills out the invoice's BeautifulSoup tree in its entirety, with every item on one page."""
+
+        self.__check_populatable()
+
+        if self.invoice is None:
+            self.invoice = self.__get_template()
+
+        for class_name, text in self.fields().items():
+            self.__replace_text(class_name, text)
+
         self.__add_items()
-        self.__totals()
-        self.__brand_name()
-        self.__payment_info()
-        self.__billing_details()
-        self.__fill_terms_and_conditions()
         self.__add_styling()
 
         self.invoice.find("title").string.replace_with(f"Invoice {self._id}")
 
-    def save(self, pdf=False):
+    def pages(self) -> list[list[Item]]:
 
-        """Saves the template as an HTML file."""
+        """Returns the items split into the pages of the invoice, rows_per_page items to a page."""
 
-        # Make output directory
-        try:
-            os.mkdir("output")
-        except FileExistsError:
-            pass
+        size = self.__rows_per_page
+
+        return [self.items[start:start + size] for start in range(0, len(self.items), size)] or [[]]
 
-        # Ensure population of field
-        self.populate()
+    @staticmethod
+    def carried_forward(pages: list[list[Item]]) -> list[str]:
 
-        with open(f"output/invoice_{self._id}.html", "w") as file:
-            file.write(str(self.invoice))
+        """Returns the running subtotal carried forward from each page but the last."""
 
-        if pdf:
-            self.__save_pdf()
+        subtotals = itertools.accumulate(sum(item.subtotal_cents for item in page) for page in pages[:-1])
 
-    def __save_pdf(self):
+        return [format_cents(subtotal) for subtotal in subtotals]
 
-        """Saves the template as a PDF file."""
+    def layout(self) -> dict:
 
-        project_dir = os.getcwd() + "\\output\\"  # Requires absolute path for some reason
+        """
+        Returns the text of every template field, the cells of every item row by page and the subtotals carried
+        forward between pages, for renderers drawing the invoice themselves instead of converting its HTML.
+        """
 
-        filepath = f"{project_dir}invoice_{self._id}"
+        self.__check_populatable()
 
-        try:
-            pdfkit.from_file(f"{filepath}.html", f"{filepath}.pdf", options=OPTIONS)
-        except OSError:  # For some reason this is always thrown, but PDF is successfully made anyway
+        pages = self.pages()
+
+        values = self.fields()
+        values[ITEMS_SLOT] = [[item.cells for item in page] for page in pages]
+        values["carried-forward"] = self.carried_forward(pages)
+
+        return values
+
+    def record(self) -> dict:
+
+        """
+        Returns the invoice's data as plain values for structured export: its number, dates, client, issuer, line items
+        and totals. Amounts are strings with two decimal places, so that no rounding creeps in on the way to JSON.
+        """
+
+        self.__check_populatable()
+
+        subtotal, tax, grand_total = self.totals
+
+        return {
+            "invoice": self._id,
+            "issued": self._created.isoformat(),
+            "due": self.due.isoformat(),
+            "client": vars(self.client).copy(),
+            "issuer": {**vars(self.__issuer), "phone": format_phone(self.__issuer.phone)},
+            "lines": [
+                {
+                    "item": item.name,
+                    "description": item.description,
+                    "quantity": item.quantity,
+                    "unit_price": format_cents(item.price_cents),
+                    "amount": format_cents(item.subtotal_cents),
+                }
+                for item in self.items
+            ],
+            "subtotal": format_cents(subtotal),
+            "tax_percentage": f"{(self.tax_rate * 100).normalize():f}",
+            "tax": format_cents(tax),
+            "total": format_cents(grand_total),
+        }
+
+    def render(self) -> str:
+
+        """Returns the filled out invoice HTML, rendered from the compiled template without building a tree."""
+
+        self.__check_populatable()
+
+        compiled = CompiledTemplate.compile(TEMPLATE_FILE, STYLE_FILE)
+        pages = self.pages()
+
+        values = self.fields()
+        values[TITLE_SLOT] = f"Invoice {self._id}"
+
+        # Long invoices get a table per page, which also keeps wkhtmltopdf from laying out one huge table
+        if len(pages) == 1:
+            values[ITEMS_SLOT] = "".join([item.row for item in self.items])
+        else:
+            rows = ["".join([item.row for item in page]) for page in pages]
+            values[ITEMS_SLOT] = compiled.paginate(rows, self.carried_forward(pages))
+
+        return compiled.render(values)
+
+    def save(self, pdf=False, keep_html=False, cache: RenderCache | None = None, renderer: Renderer | None = None):
+
+        """
+        Saves the template as a PDF file if asked, otherwise as an HTML file. The HTML file is only kept alongside the
+        PDF if keep_html is set, and the PDF is reused from the cache if given. The PDF is converted by the renderer,
+        with wkhtmltopdf through pdfkit by default. Raises an OSError if conversion fails.
+        """
+
+        errors = self.save_chunk([self], pdf=pdf, keep_html=keep_html, cache=cache, renderer=renderer)
+
+        if errors:
+            raise OSError(f"Invoice #{self._id} could not be converted to PDF. {errors[self._id]}")
+
+    @staticmethod
+    def save_chunk(
+            templates: list,
+            pdf=False,
+            merge=False,
+            keep_html=False,
+            cache: RenderCache | None = None,
+            renderer: Renderer | None = None
+    ) -> dict[int, str]:
+
+        """
+        Saves templates as HTML files, or converts them to PDF with the renderer (pdfkit by default, with a single
+        wkhtmltopdf launch), either as one PDF per invoice or merged into one PDF for the whole chunk. HTML files are
+        only written alongside PDFs if keep_html is set. With a cache, invoices whose HTML was converted before are
+        copied from it instead of being converted again (merged chunks are always converted). Returns conversion error
+        messages by invoice number.
+        """
+
+        keep_html = keep_html or not pdf  # Without a PDF the HTML file is the only output
+        renderer = renderer or PdfkitRenderer(OPTIONS)
+        jobs = list(Template.__conversion_jobs(templates, keep_html, pdf and renderer.layout))
+
+        if not pdf:
+            return {}
+
+        merged_file = None
+        if merge:
+            merged_file = os.path.abspath(CHUNK_FILE.format(jobs[0].number, jobs[-1].number))
+            cache = None
+
+        if cache:
+            with PROFILER.stage("cache_lookup"):
+                keys = {job.number: cache.key(job.html, renderer.settings) for job in jobs}
+                jobs = [job for job in jobs if not cache.get(keys[job.number], job.pdf_file)]
+
+            if not jobs:
+                return {}
+
+        with PROFILER.stage("pdf_conversion"):
+            errors = renderer.convert(jobs, merged_file)
+
+        if cache:
+            with PROFILER.stage("cache_store"):
+                for job in jobs:
+                    if job.number not in errors:
+                        cache.put(keys[job.number], job.pdf_file)
+
+        return errors
+
+    @staticmethod
+    def save_merged(
+            templates: Iterable,
+            filename: str,
+            keep_html=False,
+            bookmarks=False,
+            renderer: Renderer | None = None
+    ) -> dict[int, str]:
+
+        """
+        Converts templates into a single PDF in one pass of the renderer (pdfkit by default, with one wkhtmltopdf
+        launch), each invoice starting on a new page and, if bookmarks is set, with a bookmark per invoice (which
+        requires pypdf with pdfkit). Invoices are rendered as the renderer reads them, so only one is held in memory at
+        a time and no file is written per invoice unless keep_html is set. If conversion fails, every invoice is
+        reported as failed, including those the renderer never read. Returns error messages by invoice number.
+        """
+
+        templates = iter(templates)
+        first = next(templates, None)
+
+        if first is None:
+            return {}
+
+        renderer = renderer or PdfkitRenderer(OPTIONS)
+        titles = {}  # Bookmark titles by invoice number, filled in as invoices are rendered
+
+        def titled(templates: Iterable) -> Iterator:
+            for template in templates:
+                titles[template._id] = f"Invoice #{template._id} - {template.client.name}"
+                yield template
+
+        named = titled(itertools.chain([first], templates))
+        jobs = Template.__conversion_jobs(named, keep_html, renderer.layout)
+
+        with PROFILER.stage("pdf_conversion"):
+            error = renderer.merge(jobs, filename, titles if bookmarks else None)
+
+        if not error:
+            return {}
+
+        # Invoices left unread when the renderer quit are numbered without being rendered
+        for template in named:
             pass
 
+        return {number: error for number in titles}
+
+    @staticmethod
+    def __conversion_jobs(templates: Iterable, keep_html: bool, layout=False) -> Iterator[ConversionJob]:
+
+        """
+        Renders templates one at a time as they are needed, saving their HTML files if keep_html is set and including
+        their layouts if layout is set.
+        """
+
+        directories = set()  # Output directories already made
+
+        for template in templates:
+
+            directory = os.path.dirname(template.filename)
+            if directory not in directories:
+                os.makedirs(directory, exist_ok=True)
+                directories.add(directory)
+
+            with PROFILER.stage("populate"):
+                document = template.render()
+
+            html_file = None
+
+            if keep_html:
+                html_file = os.path.abspath(f"{template.filename}.html")
+                with PROFILER.stage("html_write"), open(html_file, "w") as file:
+                    file.write(document)
+
+            yield ConversionJob(
+                number=template._id,
+                html=document,
+                pdf_file=os.path.abspath(f"{template.filename}.pdf"),
+                html_file=html_file,
+                layout=template.layout() if layout else None
+            )
+
+    @property
+    def filename(self) -> str:
+
+        """Returns the output path of the invoice, without an extension."""
+
+        directory = LAYOUTS[self.__output_layout](self._id, self.due)
+
+        return os.path.join(OUTPUT_DIR, directory, f"invoice_{self._id}")
+
     # Built in methods
     def __repr__(self):
         return f"Issued by: {self.__issuer}\nIssued to: {self.client}\nTotal: {self.grand_total}\nDue: {self.due}"
 
 
 # Functions
+def _init_worker(
+        issuer: Issuer,
+        terms: str,
+        rows_per_page: int,
+        output_layout: str,
+        profile: bool,
+        profiled_stage: str | None
+):
+
+    """Sets up the class state of Template and the profiler in a batch worker process."""
+
+    Template.set_issuer(issuer)
+    Template.set_terms(terms)
+    Template.set_rows_per_page(rows_per_page)
+    Template.set_output_layout(output_layout)
+
+    if profile:
+        PROFILER.enable(profiled_stage)
+
+
+def _save_chunk(
+        templates: list[Template],
+        pdf: bool,
+        merge: bool,
+        keep_html: bool,
+        cache: RenderCache | None,
+        renderer: Renderer
+) -> tuple[dict[int, str], dict]:
+
+    """Saves a chunk of templates from within a batch worker process, returning what the profiler recorded."""
+
+    errors = Template.save_chunk(templates, pdf, merge, keep_html, cache, renderer)
+
+    return errors, PROFILER.collect()
+
+
+def add_to_index(index: dict, instances: list, kind: str):
+
+    """
+    Adds instances to a name index. Raises a ValueError listing every duplicated name, both within the instances and
+    against names already in the index, without modifying the index.
+    """
+
+    seen = set()
+    duplicates = []
+
+    for instance in instances:
+        if instance.name in index or instance.name in seen:
+            duplicates.append(instance.name)
+        seen.add(instance.name)
+
+    if duplicates:
+        raise ValueError(f"Duplicate {kind} names: {', '.join(map(str, dict.fromkeys(duplicates)))}.")
+
+    index.update((instance.name, instance) for instance in instances)
+
+
+def find_in_index(index: dict, names: list[str], kind: str) -> list:
+
+    """Returns the instances with the given names. Raises a ValueError listing every name missing from the index."""
+
+    missing = [name for name in names if name not in index]
+
+    if missing:
+        raise ValueError(f"Unknown {kind} names: {', '.join(map(str, dict.fromkeys(missing)))}.")
+
+    return [index[name] for name in names]
+
+
+def bounded_map(executor, function, iterable: Iterable, limit: int, *args) -> Iterable:
+
+    """
+    Yields function(element, *args) for every element of the iterable, computed in the executor and in order. Unlike
+    executor.map, the iterable is consumed lazily, with no more than limit calls submitted but not yet yielded.
+    """
+
+    pending = collections.deque()
+
+    for element in iterable:
+
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+
+        pending.append(executor.submit(function, element, *args))
+
+    while pending:
+        yield pending.popleft().result()
+
+
+def chunked(iterable: Iterable, size: int) -> Iterable:
+
+    """Yields lists of up to size consecutive elements of the iterable."""
+
+    iterator = iter(iterable)
+
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def to_cents(amount: float | str | Decimal) -> int:
+
+    """Returns a dollar amount as integer cents, rounding half a cent up."""
+
+    # Going through the shortest string representation keeps floats like 5.005 from rounding down
+    return int(Decimal(str(amount)).quantize(CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+def tax_cents(subtotal: int, rate: Decimal) -> int:
+
+    """Returns the tax in cents on a subtotal in cents, rounding half a cent up."""
+
+    numerator, denominator = rate.as_integer_ratio()
+
+    return (2 * subtotal * numerator + denominator) // (2 * denominator)
+
+
+def cache_batch_totals(templates: list[Template]):
+
+    """
+    Computes the totals of every template in one vectorized pass over all of their line items, with the same
+    rounding as Template.totals, and caches them on the templates. Totals too large for 64-bit integers are left for
+    Template.totals to compute with Python integers.
+    """
+
+    import numpy as np
+
+    counts = [len(template.items) for template in templates]
+
+    try:
+        prices = np.fromiter((item.price_cents for t in templates for item in t.items), np.int64, count=sum(counts))
+        quantities = np.fromiter((item.quantity for t in templates for item in t.items), np.int64, count=sum(counts))
+        rates = np.array([template.tax_rate.as_integer_ratio() for template in templates], np.int64).reshape(-1, 2)
+    except OverflowError:  # Leaves the whole block to Template.totals
+        return
+
+    # Sum every line item's subtotal into the invoice it belongs to
+    invoices = np.repeat(np.arange(len(templates)), counts)
+    subtotals = np.zeros(len(templates), dtype=np.int64)
+    np.add.at(subtotals, invoices, prices * quantities)
+
+    numerators, denominators = rates[:, 0], rates[:, 1]
+    taxes = (2 * subtotals * numerators + denominators) // (2 * denominators)
+
+    # Bounds the largest intermediate value of each invoice in floating point, with room to spare for its rounding
+    magnitudes = np.zeros(len(templates))
+    np.add.at(magnitudes, invoices, np.abs(prices.astype(np.float64)) * quantities)
+    exact = 2 * magnitudes * np.abs(numerators) + denominators < 2.0 ** 62
+
+    for template, subtotal, tax, fits in zip(templates, subtotals.tolist(), taxes.tolist(), exact.tolist()):
+        if fits:
+            template.cache_totals(subtotal, tax)
+
+
+def with_batch_totals(templates: Iterable, block_size: int = TOTALS_BLOCK_SIZE) -> Iterable:
+
+    """Yields the templates after caching their totals in vectorized blocks of block_size."""
+
+    for block in chunked(templates, block_size):
+        with PROFILER.stage("totals"):
+            cache_batch_totals(block)
+        yield from block
+
+
+def format_cents(cents: int) -> str:
+
+    """Returns an amount in cents as a string formatted to two decimal places."""
+
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
 def format_price(price: float) -> str:
 
     """Returns price as a string formatted to two decimal places."""
 
-    return f"{round(price, 2):.2f}"
+    return format_cents(to_cents(price))
 
 
 def format_phone(phone: int) -> str:
@@ -513,10 +1420,13 @@ def dataframe_from_csv(filename: str) -> Iterable:
 
     """Returns the CSV as a Pandas dataframe with lowercase headers."""
 
+    import pandas as pd
+
     if ".csv" not in filename:
         raise ValueError("File must be a .csv file.")
 
-    data = pd.read_csv(filename)  # Read in data
+    with PROFILER.stage("csv_load"):
+        data = pd.read_csv(filename)  # Read in data
     data.columns = map(str.lower, data.columns)
 
     return data.iterrows()
@@ -0,0 +1,186 @@
+# Batch file readers and writers
+
+# Imports
+import csv
+import json
+import re
+from typing import Iterable, Iterator, NamedTuple
+
+# Constants
+LONG_COLUMNS = ["invoice", "client", "due", "item", "quantity"]
+QUANTITY_RE = re.compile(r"\s*\+?([0-9]+)(?:\.0+)?\s*")  # A non-negative whole number, as text, e.g. " 3" or "3.0"
+
+
+# Classes
+class BatchInvoice(NamedTuple):
+
+    """One invoice of a batch file, before its client and items are looked up in the catalogs."""
+
+    key: str  # Identifies the invoice within the batch file
+    client: str
+    due: str
+    lines: list[tuple[str, int]]  # Item names and quantities
+
+
+# Functions
+def read_batch(filename: str) -> Iterator[BatchInvoice]:
+
+    """
+    Yields the invoices of a batch file one at a time. JSONL files and CSV files with the long format headers are
+    streamed row by row, while any other CSV file is read as the original wide format with one invoice per column.
+    """
+
+    if filename.endswith(".jsonl"):
+        return read_long_batch(filename)
+
+    if ".csv" not in filename:
+        raise ValueError("Batch file must be a .csv or .jsonl file.")
+
+    if is_long_csv(filename):
+        return read_long_batch(filename)
+
+    return read_wide_batch(filename)
+
+
+def is_long_csv(filename: str) -> bool:
+
+    """Returns whether the CSV file's header is that of the long batch format."""
+
+    with open(filename, newline="") as file:
+        header = next(csv.reader(file, skipinitialspace=True), [])
+
+    return [column.strip().lower() for column in header] == LONG_COLUMNS
+
+
+def read_long_batch(filename: str) -> Iterator[BatchInvoice]:
+
+    """
+    Yields invoices from a long format batch file, where each CSV row or JSON line is one line item keyed by its
+    invoice. The rows of an invoice must be consecutive, and only one invoice is held in memory at a time. A row with
+    an empty item creates an invoice without line items.
+    """
+
+    invoice = None
+
+    for line, row in long_rows(filename):
+
+        missing = [column for column in ["invoice", "client", "due"] if row.get(column) in [None, ""]]
+        if missing:
+            raise ValueError(f"Line {line} of {filename}: missing {', '.join(missing)}.")
+
+        key, client, due = str(row["invoice"]), row["client"], row["due"]
+
+        if invoice is None or key != invoice.key:
+
+            if invoice is not None:
+                yield invoice
+
+            invoice = BatchInvoice(key=key, client=client, due=due, lines=[])
+
+        elif (client, due) != (invoice.client, invoice.due):
+            raise ValueError(f"Line {line} of {filename}: invoice {key} changes client or due date between rows.")
+
+        if row.get("item"):
+            invoice.lines.append((row["item"], parse_quantity(row.get("quantity"), f"Line {line} of {filename}")))
+
+    if invoice is not None:
+        yield invoice
+
+
+def long_rows(filename: str) -> Iterator[tuple[int, dict]]:
+
+    """Yields the line number and fields of every row of a long format CSV or JSONL batch file."""
+
+    with open(filename, newline="") as file:
+
+        if filename.endswith(".jsonl"):
+            for line, text in enumerate(file, start=1):
+                if text.strip():
+                    yield line, json.loads(text)
+            return
+
+        reader = csv.reader(file, skipinitialspace=True)
+        next(reader)  # Header
+
+        for row in reader:
+            if row:
+                yield reader.line_num, dict(zip(LONG_COLUMNS, row))
+
+
+def read_wide_batch(filename: str) -> Iterator[BatchInvoice]:
+
+    """
+    Yields invoices from a wide format batch CSV, where each column is one invoice: the client name as its header, the
+    due date in its first row and one "name, quantity" item per following row. The whole file is read at once.
+    """
+
+    import pandas as pd
+
+    batches = pd.read_csv(filename)  # Read batches
+
+    for position, client in enumerate(batches, start=1):
+        column = batches[client]
+
+        current_items = []  # Names and quantities charged on current invoice
+        due_date = None
+
+        for row in column.items():
+            index, value = row  # Unpack
+
+            # As soon as NaN is reached, break (no more items)
+            if pd.isna(value):
+                break
+
+            # Get date
+            if index == 0:
+                due_date = value
+
+            # It's an item
+            else:
+                name, quantity = value.rsplit(",", 1)
+                current_items.append((name, parse_quantity(quantity, f"Column {position} of {filename}")))
+
+        # Parse client header (duplicate headers get numbers added on and that prevents lookup)
+        yield BatchInvoice(key=str(position), client=client.split(".")[0], due=due_date, lines=current_items)
+
+
+def parse_quantity(value, location: str) -> int:
+
+    """
+    Returns the quantity as an integer, raising a ValueError that names where it was read from. Quantities are read as
+    the text they were written as, whether a CSV cell or a JSON number, so that validation reads them the same way.
+    """
+
+    match = QUANTITY_RE.fullmatch(str(value))
+    if match is None:
+        raise ValueError(f"{location}: quantity {value} is not a non-negative integer.")
+
+    return int(match.group(1))
+
+
+def write_long_batch(invoices: Iterable[BatchInvoice], filename: str):
+
+    """Writes invoices as a long format batch file, as JSONL if the filename ends in .jsonl and as CSV otherwise."""
+
+    with open(filename, "w", newline="") as file:
+
+        if filename.endswith(".jsonl"):
+            for invoice in invoices:
+                for name, quantity in invoice.lines or [("", "")]:
+                    row = dict(zip(LONG_COLUMNS, [invoice.key, invoice.client, invoice.due, name, quantity]))
+                    file.write(json.dumps(row) + "\n")
+            return
+
+        writer = csv.writer(file)
+        writer.writerow(LONG_COLUMNS)
+
+        for invoice in invoices:
+            for name, quantity in invoice.lines or [("", "")]:
+                writer.writerow([invoice.key, invoice.client, invoice.due, name, quantity])
+
+
+def convert_batch(source: str, destination: str):
+
+    """Converts any batch file into the long format, e.g. to make a wide format batch appendable."""
+
+    write_long_batch(read_batch(source), destination)
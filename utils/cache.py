@@ -0,0 +1,123 @@
+# Content-addressed cache of converted PDFs
+
+# Imports
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+# Constants
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "invoicer")
+CACHE_SIZE = 1024 * 1024 * 1024  # 1 GiB
+
+
+# Classes
+class RenderCache:
+
+    """
+    PDFs stored under a hash of the HTML they were converted from and the converter options, so an invoice whose
+    document has not changed is copied from the cache instead of being converted again. Once the cache grows over
+    max_bytes, the least recently used PDFs are evicted. Several processes can share one cache directory.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_SIZE):
+
+        assert max_bytes > 0, f"Cache size {max_bytes} is not a positive number of bytes."
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.__size = None  # Estimated bytes in the cache, measured on first write
+
+    @staticmethod
+    def key(html: str, options: dict) -> str:
+
+        """Returns the cache key of a document converted with the given options."""
+
+        digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode())
+        digest.update(html.encode())
+
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+
+        """Returns where the PDF with the given key is stored."""
+
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def get(self, key: str, destination: str) -> bool:
+
+        """Copies the cached PDF to destination and marks it as recently used. Returns whether it was cached."""
+
+        path = self.path(key)
+
+        try:
+            shutil.copyfile(path, destination)
+            os.utime(path)  # Modification time orders eviction
+        except FileNotFoundError:
+            return False
+
+        return True
+
+    def put(self, key: str, source: str):
+
+        """Adds a converted PDF to the cache, evicting old entries if the cache is over its size."""
+
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Copy then rename, so other processes never read a partially written PDF
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(descriptor)
+        shutil.copyfile(source, temporary)
+        os.replace(temporary, path)
+
+        if self.__size is None:
+            self.__size = sum(size for entry, mtime, size in self.entries())
+        else:
+            self.__size += os.path.getsize(path)
+
+        if self.__size > self.max_bytes:
+            self.evict()
+
+    def entries(self) -> list[tuple[str, float, int]]:
+
+        """Returns the path, modification time and size of every cached PDF."""
+
+        entries = []
+
+        for directory, subdirectories, files in os.walk(self.directory):
+            for name in files:
+
+                if not name.endswith(".pdf"):
+                    continue
+
+                path = os.path.join(directory, name)
+
+                try:
+                    status = os.stat(path)
+                except FileNotFoundError:  # Evicted by another process meanwhile
+                    continue
+
+                entries.append((path, status.st_mtime, status.st_size))
+
+        return entries
+
+    def evict(self):
+
+        """Deletes the least recently used PDFs until the cache fits in max_bytes."""
+
+        entries = sorted(self.entries(), key=lambda entry: entry[1])
+        self.__size = sum(size for path, mtime, size in entries)
+
+        for path, mtime, size in entries:
+
+            if self.__size <= self.max_bytes:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # Already evicted by another process
+                pass
+
+            self.__size -= size
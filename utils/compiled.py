@@ -0,0 +1,175 @@
+# Compiled invoice template
+
+# Imports
+import html
+import re
+
+# Constants
+TEXT_SLOTS = [
+    "invoice-date",
+    "payment-date",
+    "invoice-number",
+    "actual-subtotal",
+    "grandtotal",
+    "tax",
+    "tax-percentage",
+    "brand-name",
+    "pay-to",
+    "account",
+    "bank",
+    "email",
+    "phone",
+    "company-name",
+    "address",
+    "location",
+    "terms-and-conditions",
+]
+TITLE_SLOT = "title"
+ITEMS_SLOT = "items"
+
+FORWARD_ROW = (  # Subtotal carried from one page of a long invoice to the next
+    "<tr class=\"forward\">\n"
+    "<td colspan=\"3\">{}</td>\n"
+    "<td>{}</td>\n"
+    "</tr>"
+)
+
+# Quoted strings are matched first so that nothing inside them is touched
+CSS_COMMENT_RE = re.compile(r"""("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')|/\*.*?\*/""", re.DOTALL)
+CSS_SPACE_RE = re.compile(r"""("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')|\s*;?\s*(})\s*|\s*([{;,>])\s*|(?<=:)\s+|(\s+)""")
+
+MARKER = "\x00{}\x00"  # Never present in the template, survives serialization untouched
+MARKER_RE = re.compile("\x00([a-z-]+)\x00")
+
+
+# Classes
+class CompiledTemplate:
+
+    """
+    The invoice template parsed once and serialized into literal segments with fixed slots between them.
+    Rendering fills the slots in order, producing the same markup as populating a fresh BeautifulSoup tree for
+    invoices that fit on one page. The markup closing a page at the end of its item rows and opening the next one up to
+    its first row is kept for paginating long invoices.
+    """
+
+    _compiled = {}  # Compiled templates by (template, style) filename
+    _stylesheets = {}  # Minified style tags by style filename
+
+    def __init__(self, segments: list[str], slots: list[str], page_break: str = ""):
+
+        assert len(segments) == len(slots) + 1, "There must be one more literal segment than slots."
+
+        self.segments = segments
+        self.slots = slots
+        self.page_break = page_break
+
+    @classmethod
+    def compile(cls, template_file: str, style_file: str):
+
+        """Returns the compiled template for the given files, parsing them only on the first call."""
+
+        key = (template_file, style_file)
+
+        if key not in cls._compiled:
+            cls._compiled[key] = cls.__build(template_file, style_file)
+
+        return cls._compiled[key]
+
+    @classmethod
+    def stylesheet(cls, style_file: str) -> str:
+
+        """Returns the minified stylesheet in a style tag, reading and minifying it only on the first call."""
+
+        if style_file not in cls._stylesheets:
+            with open(style_file) as file:
+                cls._stylesheets[style_file] = f"<style>{minify_css(file.read())}</style>"
+
+        return cls._stylesheets[style_file]
+
+    @classmethod
+    def __build(cls, template_file: str, style_file: str):
+
+        """Parses the template, swaps every slot for a marker and splits the serialized result on them."""
+
+        from bs4 import BeautifulSoup  # Only needed to compile, rendering is plain string work
+
+        with open(template_file) as file:
+            template = BeautifulSoup(file.read(), features='html.parser')
+
+        for class_name in TEXT_SLOTS:
+            template.find(class_=class_name).string.replace_with(MARKER.format(class_name))
+
+        template.find("title").string.replace_with(MARKER.format(TITLE_SLOT))
+        template.find(class_="item-table").append(MARKER.format(ITEMS_SLOT))
+
+        # Every page of a long invoice repeats the page and the item table with its header around its rows
+        page = template.find(class_="page")
+        empty_page = template.new_tag(page.name, attrs=page.attrs)
+        empty_page.string = MARKER.format(ITEMS_SLOT)
+
+        page_open, page_close = str(empty_page).split(MARKER.format(ITEMS_SLOT))
+        table_open, table_close = str(template.find(class_="item-list")).split(MARKER.format(ITEMS_SLOT))
+        page_break = f"{table_close}\n{page_close}\n{page_open}\n{table_open}"
+
+        # Styling is the same for every invoice, so it is baked into the literal segments
+        template.find("html").append(BeautifulSoup(cls.stylesheet(style_file), features='html.parser'))
+
+        parts = MARKER_RE.split(str(template))
+
+        return cls(segments=parts[0::2], slots=parts[1::2], page_break=page_break)
+
+    def paginate(self, pages: list[str], carried: list[str]) -> str:
+
+        """
+        Returns the items slot markup of rows split over pages, given the row markup of each page and the subtotal
+        carried forward from every page but the last. Each page after the first repeats the item table header and
+        opens with the subtotal brought forward, so only the last page runs on into the totals and terms.
+        """
+
+        markup = [pages[0]]
+
+        for rows, subtotal in zip(pages[1:], carried):
+            markup.append(FORWARD_ROW.format("Carried forward", subtotal))
+            markup.append(self.page_break)
+            markup.append(FORWARD_ROW.format("Brought forward", subtotal))
+            markup.append(rows)
+
+        return "".join(markup)
+
+    def render(self, values: dict[str, str]) -> str:
+
+        """
+        Returns the template with every slot filled from values. Text slots are escaped the same way
+        BeautifulSoup escapes strings on output (only &, < and >), while the items slot is inserted as markup.
+        """
+
+        output = [self.segments[0]]
+
+        for slot, segment in zip(self.slots, self.segments[1:]):
+
+            if slot == ITEMS_SLOT:
+                output.append(values[slot])
+            else:
+                output.append(html.escape(values[slot], quote=False))
+
+            output.append(segment)
+
+        return "".join(output)
+
+
+# Functions
+def minify_css(css: str) -> str:
+
+    """
+    Returns the stylesheet without comments, line breaks and the whitespace around punctuation, leaving quoted strings
+    untouched.
+    """
+
+    def uncomment(match: re.Match) -> str:
+        return match.group(1) or ""
+
+    def squeeze(match: re.Match) -> str:
+        string, close, punctuation, space = match.groups()
+        return string or close or punctuation or (" " if space else "")
+
+    return CSS_SPACE_RE.sub(squeeze, CSS_COMMENT_RE.sub(uncomment, css)).strip()
@@ -0,0 +1,343 @@
+# HTML to PDF conversion with wkhtmltopdf
+
+# Imports
+import os
+import shutil
+import tempfile
+from typing import Iterable, Iterator, NamedTuple
+from xml.etree import ElementTree
+
+# Constants
+OUTLINE_TITLE = "Invoice"  # Text of the single <h1> opening every invoice
+PAGE_BREAK = '<div style="page-break-before: always"></div>'
+
+
+# Classes
+class ConversionJob(NamedTuple):
+
+    """
+    An invoice's HTML, the PDF file it should be converted to, the HTML file it was saved as, if any, and its fields
+    and item rows for renderers drawing the invoice themselves, if asked for.
+    """
+
+    number: int
+    html: str
+    pdf_file: str
+    html_file: str | None = None
+    layout: dict | None = None
+
+
+# Functions
+def convert(job: ConversionJob, options: dict) -> dict[int, str]:
+
+    """
+    Converts a single invoice, piping its HTML to wkhtmltopdf so no HTML file is needed. Returns its error message by
+    invoice number if conversion failed.
+    """
+
+    error = run_wkhtmltopdf(job.html, job.pdf_file, options)
+
+    return {job.number: error} if error else {}
+
+
+def convert_chunk(jobs: list[ConversionJob], options: dict, merged_file: str | None = None) -> dict[int, str]:
+
+    """
+    Converts a chunk of invoices with a single wkhtmltopdf launch, as one HTML document holding the stylesheet once.
+    The resulting document is either kept whole as merged_file or split back into one PDF per invoice. If the chunk
+    fails, each invoice is converted on its own so that errors are reported per invoice. Returns error messages by
+    invoice number.
+    """
+
+    if len(jobs) == 1 and not merged_file:
+        return convert(jobs[0], options)
+
+    if merged_file:
+        return _convert_merged(jobs, options, merged_file)
+
+    return _convert_split(jobs, options)
+
+
+def _convert_merged(jobs: list[ConversionJob], options: dict, merged_file: str) -> dict[int, str]:
+
+    """Converts a chunk into one PDF, leaving out any invoice that fails to convert on its own."""
+
+    error = run_wkhtmltopdf("".join(merged_document(job.html for job in jobs)), merged_file, options)
+
+    if not error:
+        return {}
+
+    # Find the culprits by converting each invoice alone, then merge whatever is left
+    errors = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for job in jobs:
+            errors |= convert(job._replace(pdf_file=os.path.join(directory, "single.pdf")), options)
+
+    remaining = [job for job in jobs if job.number not in errors]
+
+    if remaining and len(remaining) < len(jobs):
+        error = run_wkhtmltopdf("".join(merged_document(job.html for job in remaining)), merged_file, options)
+
+    # The chunk still failing as a whole is blamed on every invoice left in it
+    if error:
+        errors |= {job.number: error for job in remaining}
+
+    return errors
+
+
+def _convert_split(jobs: list[ConversionJob], options: dict) -> dict[int, str]:
+
+    """Converts a chunk into one PDF and splits it into a PDF per invoice at the pages the outline reports."""
+
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        raise ImportError("Splitting converted chunks into one PDF per invoice requires pypdf (pip install pypdf).")
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        chunk_file = os.path.join(directory, "chunk.pdf")
+        outline_file = os.path.join(directory, "outline.xml")
+
+        # The outline is only dumped to locate invoices, the split PDFs do not keep it
+        chunk_options = {key: value for key, value in options.items() if key != "no-outline"}
+        chunk_options["dump-outline"] = outline_file
+
+        error = run_wkhtmltopdf("".join(merged_document(job.html for job in jobs)), chunk_file, chunk_options)
+
+        starts = None if error else start_pages(outline_file)
+
+        if starts is None:
+            return _convert_each(jobs, options)
+
+        reader = PdfReader(chunk_file)
+        ends = starts[1:] + [len(reader.pages)]
+
+        if len(starts) != len(jobs) or starts[0] != 0 or any(start >= end for start, end in zip(starts, ends)):
+            return _convert_each(jobs, options)
+
+        for job, start, end in zip(jobs, starts, ends):
+
+            writer = PdfWriter()
+            for page in reader.pages[start:end]:
+                writer.add_page(page)
+
+            with open(job.pdf_file, "wb") as file:
+                writer.write(file)
+
+    return {}
+
+
+def _convert_each(jobs: list[ConversionJob], options: dict) -> dict[int, str]:
+
+    """Converts every invoice of a chunk with its own wkhtmltopdf launch."""
+
+    errors = {}
+    for job in jobs:
+        errors |= convert(job, options)
+
+    return errors
+
+
+def merged_document(documents: Iterable[str]) -> Iterator[str]:
+
+    """
+    Yields, piece by piece, one HTML document holding the bodies of every invoice document, each starting on a new
+    page. Everything outside the body, such as the stylesheet, is the same for every invoice and taken from the first.
+    """
+
+    tail = None
+
+    for document in documents:
+
+        start = document.index("<body>") + len("<body>")
+        end = document.rindex("</body>")
+
+        if tail is None:
+            yield document[:start]
+            tail = document[end:]
+        else:
+            yield PAGE_BREAK
+
+        yield document[start:end]
+
+    if tail is not None:
+        yield tail
+
+
+def add_bookmarks(pdf_file: str, outline_file: str, titles: list[str]) -> bool:
+
+    """
+    Replaces the outline of a merged PDF with one bookmark per invoice, placed at the pages the wkhtmltopdf outline dump
+    reports. Returns whether the invoices could be located.
+    """
+
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        raise ImportError("Bookmarking merged invoices requires pypdf (pip install pypdf).")
+
+    starts = start_pages(outline_file)
+
+    if starts is None or len(starts) != len(titles) or any(a >= b for a, b in zip(starts, starts[1:])):
+        return False
+
+    writer = PdfWriter()
+    writer.append(PdfReader(pdf_file), import_outline=False)
+
+    for title, page in zip(titles, starts):
+        writer.add_outline_item(title, page)
+
+    # Write next to the PDF and swap it in, so a failure never leaves a truncated PDF
+    temporary = f"{pdf_file}.tmp"
+    with open(temporary, "wb") as file:
+        writer.write(file)
+
+    os.replace(temporary, pdf_file)
+
+    return True
+
+
+def start_pages(outline_file: str) -> list[int] | None:
+
+    """
+    Returns the zero-based page on which each invoice starts, read from a wkhtmltopdf outline dump, or None if the
+    outline could not be read.
+    """
+
+    try:
+        outline = ElementTree.parse(outline_file)
+    except (OSError, ElementTree.ParseError):
+        return None
+
+    pages = [
+        int(item.get("page"))
+        for item in outline.iter()
+        if item.tag.endswith("item") and item.get("title") == OUTLINE_TITLE
+    ]
+
+    if not pages:
+        return None
+
+    return [page - pages[0] for page in pages]
+
+
+def run_wkhtmltopdf(html: str, pdf_file: str, options: dict) -> str | None:
+
+    """Converts an HTML document piped to wkhtmltopdf into one PDF. Returns an error message if no PDF was written."""
+
+    import pdfkit
+
+    discard(pdf_file)
+
+    try:
+        pdfkit.from_string(html, pdf_file, options=options)
+    except OSError as error:
+        return conversion_error(pdf_file, str(error))
+
+    return conversion_error(pdf_file, "wkhtmltopdf did not write a PDF.")
+
+
+def run_wkhtmltopdf_stream(pieces: Iterable[str], pdf_file: str, options: dict) -> str | None:
+
+    """
+    Converts an HTML document into one PDF, writing it to wkhtmltopdf's stdin piece by piece as the pieces are
+    produced, so the whole document is never held in memory. Returns an error message if no PDF was written, or if
+    wkhtmltopdf quit before reading the whole document, in which case the pieces not yet produced never are and any
+    PDF it wrote is discarded.
+    """
+
+    import subprocess
+
+    command = wkhtmltopdf_command(pdf_file, options)
+
+    with tempfile.TemporaryFile() as stderr:
+
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr  # A file rather than a pipe, so wkhtmltopdf never blocks on a full pipe
+        )
+
+        read = True
+
+        try:
+            for piece in pieces:
+                process.stdin.write(piece.encode())
+            process.stdin.close()
+        except BrokenPipeError:
+            read = False  # wkhtmltopdf quit early, its exit status and output tell why
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+
+        status = process.wait()
+        stderr.seek(0)
+        message = stderr.read().decode(errors="replace").strip()
+
+        if not read:
+            discard(pdf_file)
+            return message or f"wkhtmltopdf quit with status {status} before reading the whole document."
+
+        return conversion_error(pdf_file, message, status)
+
+
+def wkhtmltopdf_command(pdf_file: str, options: dict) -> list[str]:
+
+    """
+    Returns the wkhtmltopdf command converting HTML read from its stdin into the PDF file, after discarding any PDF
+    already there. Raises an OSError if there is no wkhtmltopdf executable.
+    """
+
+    executable = shutil.which("wkhtmltopdf")
+    if executable is None:
+        raise OSError("No wkhtmltopdf executable found on the PATH.")
+
+    discard(pdf_file)
+
+    return [executable, *arguments(options), "-", pdf_file]
+
+
+def conversion_error(pdf_file: str, message: str, status: int | None = None) -> str | None:
+
+    """
+    Returns the error of a finished wkhtmltopdf run, given its error output and exit status, or None if it wrote the
+    PDF. wkhtmltopdf exits with an error on missing page resources even though the PDF is written, so only the PDF is
+    trusted.
+    """
+
+    if written(pdf_file):
+        return None
+
+    return message or f"wkhtmltopdf exited with status {status}."
+
+
+def discard(pdf_file: str):
+
+    """Removes a PDF left over from an earlier run or attempt, so that it cannot pass for the one being written."""
+
+    if os.path.exists(pdf_file):
+        os.remove(pdf_file)
+
+
+def arguments(options: dict) -> list[str]:
+
+    """Returns wkhtmltopdf command line arguments for the options, in the form pdfkit passes them."""
+
+    result = ["--quiet"]
+
+    for key, value in options.items():
+        result.append(f"--{key}")
+        if value is not None:
+            result.append(str(value))
+
+    return result
+
+
+def written(filename: str) -> bool:
+
+    """Returns whether the file exists and is not empty."""
+
+    return os.path.isfile(filename) and os.path.getsize(filename) > 0
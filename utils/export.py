@@ -0,0 +1,218 @@
+# Structured export of invoice data, with no HTML rendering and no PDF conversion
+
+# Imports
+import csv
+import html
+import json
+import os
+from abc import ABC, abstractmethod
+
+# Constants
+LEDGER_COLUMNS = [
+    "invoice", "issued", "due", "client", "line", "item", "description", "quantity", "unit_price", "amount"
+]
+CURRENCY = "CAD"  # ISO 4217 code of every amount
+EXPORT_BUFFER = 1024 ** 2  # Bytes of export output buffered between writes to disk
+
+UBL_INVOICE = """<?xml version="1.0" encoding="UTF-8"?>
+<Invoice xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2" \
+xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2" \
+xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2">
+<cbc:UBLVersionID>2.1</cbc:UBLVersionID>
+<cbc:ID>{invoice}</cbc:ID>
+<cbc:IssueDate>{issued}</cbc:IssueDate>
+<cbc:DueDate>{due}</cbc:DueDate>
+<cbc:InvoiceTypeCode>380</cbc:InvoiceTypeCode>
+<cbc:DocumentCurrencyCode>{currency}</cbc:DocumentCurrencyCode>
+<cac:AccountingSupplierParty><cac:Party>
+<cac:PartyName><cbc:Name>{issuer}</cbc:Name></cac:PartyName>
+<cac:Contact><cbc:Telephone>{phone}</cbc:Telephone><cbc:ElectronicMail>{email}</cbc:ElectronicMail></cac:Contact>
+</cac:Party></cac:AccountingSupplierParty>
+<cac:AccountingCustomerParty><cac:Party>
+<cac:PartyName><cbc:Name>{client}</cbc:Name></cac:PartyName>
+<cac:PostalAddress>\
+<cac:AddressLine><cbc:Line>{address}</cbc:Line></cac:AddressLine>\
+<cac:AddressLine><cbc:Line>{location}</cbc:Line></cac:AddressLine>\
+</cac:PostalAddress>
+</cac:Party></cac:AccountingCustomerParty>
+<cac:PaymentMeans>
+<cbc:PaymentMeansCode>30</cbc:PaymentMeansCode>
+<cbc:PaymentDueDate>{due}</cbc:PaymentDueDate>
+<cac:PayeeFinancialAccount><cbc:Name>{account}</cbc:Name>\
+<cac:FinancialInstitutionBranch><cbc:Name>{bank}</cbc:Name></cac:FinancialInstitutionBranch>\
+</cac:PayeeFinancialAccount>
+</cac:PaymentMeans>
+<cac:TaxTotal>
+<cbc:TaxAmount currencyID="{currency}">{tax}</cbc:TaxAmount>
+<cac:TaxSubtotal>
+<cbc:TaxableAmount currencyID="{currency}">{subtotal}</cbc:TaxableAmount>
+<cbc:TaxAmount currencyID="{currency}">{tax}</cbc:TaxAmount>
+<cac:TaxCategory><cbc:Percent>{tax_percentage}</cbc:Percent><cac:TaxScheme><cbc:Name>Tax</cbc:Name></cac:TaxScheme>\
+</cac:TaxCategory>
+</cac:TaxSubtotal>
+</cac:TaxTotal>
+<cac:LegalMonetaryTotal>
+<cbc:LineExtensionAmount currencyID="{currency}">{subtotal}</cbc:LineExtensionAmount>
+<cbc:TaxExclusiveAmount currencyID="{currency}">{subtotal}</cbc:TaxExclusiveAmount>
+<cbc:TaxInclusiveAmount currencyID="{currency}">{total}</cbc:TaxInclusiveAmount>
+<cbc:PayableAmount currencyID="{currency}">{total}</cbc:PayableAmount>
+</cac:LegalMonetaryTotal>
+{lines}</Invoice>
+"""
+UBL_LINE = """<cac:InvoiceLine>
+<cbc:ID>{line}</cbc:ID>
+<cbc:InvoicedQuantity>{quantity}</cbc:InvoicedQuantity>
+<cbc:LineExtensionAmount currencyID="{currency}">{amount}</cbc:LineExtensionAmount>
+<cac:Item><cbc:Description>{description}</cbc:Description><cbc:Name>{item}</cbc:Name></cac:Item>
+<cac:Price><cbc:PriceAmount currencyID="{currency}">{unit_price}</cbc:PriceAmount></cac:Price>
+</cac:InvoiceLine>
+"""
+
+
+# Classes
+class Exporter(ABC):
+
+    """
+    Writes the records of invoices as they are given, either all to one file or each to a file of its own. The records
+    are built from the invoice data alone, so nothing is rendered to HTML or converted to PDF.
+    """
+
+    name = None
+
+    def __init__(self, filename: str | None = None, currency: str = CURRENCY):
+        self.filename = filename
+        self.currency = currency
+
+    @abstractmethod
+    def write(self, template) -> str | None:
+
+        """Exports an invoice, returning the file of its own it was written to, if any."""
+
+    def close(self):
+        pass
+
+
+class JsonLinesExporter(Exporter):
+
+    """Writes one JSON record per invoice to a JSON lines file."""
+
+    name = "jsonl"
+
+    def __init__(self, filename: str, currency: str = CURRENCY):
+
+        super().__init__(filename, currency)
+
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        self.file = open(filename, "w", encoding="utf-8", buffering=EXPORT_BUFFER)
+
+    def write(self, template) -> None:
+        self.file.write(json.dumps({**template.record(), "currency": self.currency}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class LedgerExporter(Exporter):
+
+    """
+    Writes a flat ledger CSV with a row per line item, repeating the invoice's number, dates and client, followed by a
+    row for its tax, so that the amounts of an invoice's rows add up to its total.
+    """
+
+    name = "csv"
+
+    def __init__(self, filename: str, currency: str = CURRENCY):
+
+        super().__init__(filename, currency)
+
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        self.file = open(filename, "w", encoding="utf-8", newline="", buffering=EXPORT_BUFFER)
+        self.writer = csv.writer(self.file)
+
+        self.writer.writerow(LEDGER_COLUMNS)
+
+    def write(self, template) -> None:
+
+        record = template.record()
+        invoice = [record["invoice"], record["issued"], record["due"], record["client"]["name"]]
+
+        self.writer.writerows(
+            invoice + [number, line["item"], line["description"], line["quantity"], line["unit_price"], line["amount"]]
+            for number, line in enumerate(record["lines"], start=1)
+        )
+        self.writer.writerow(invoice + ["", f"Tax {record['tax_percentage']}%", "", "", "", record["tax"]])
+
+    def close(self):
+        self.file.close()
+
+
+class UblExporter(Exporter):
+
+    """
+    Writes every invoice as a UBL 2.1 invoice document of its own, next to where its PDF would be. The standard has no
+    document holding several invoices, so there is no single file to stream them to.
+    """
+
+    name = "ubl"
+
+    def __init__(self, filename: str | None = None, currency: str = CURRENCY):
+        super().__init__(filename, currency)
+        self.directories = set()  # Output directories already made
+
+    def write(self, template) -> str:
+
+        record = template.record()
+        client, issuer = record["client"], record["issuer"]
+
+        lines = "".join(
+            UBL_LINE.format(
+                line=number,
+                currency=self.currency,
+                **{key: xml_text(value) for key, value in line.items()}
+            )
+            for number, line in enumerate(record["lines"], start=1)
+        )
+
+        document = UBL_INVOICE.format(
+            invoice=record["invoice"],
+            issued=record["issued"],
+            due=record["due"],
+            currency=self.currency,
+            issuer=xml_text(issuer["name"]),
+            phone=xml_text(issuer["phone"]),
+            email=xml_text(issuer["email"]),
+            client=xml_text(client["name"]),
+            address=xml_text(client["address"]),
+            location=xml_text(client["location"]),
+            account=xml_text(issuer["account_name"]),
+            bank=xml_text(issuer["bank"]),
+            tax_percentage=record["tax_percentage"],
+            subtotal=record["subtotal"],
+            tax=record["tax"],
+            total=record["total"],
+            lines=lines
+        )
+
+        filename = f"{template.filename}.xml"
+
+        directory = os.path.dirname(filename)
+        if directory not in self.directories:
+            os.makedirs(directory, exist_ok=True)
+            self.directories.add(directory)
+
+        with open(filename, "w", encoding="utf-8") as file:
+            file.write(document)
+
+        return filename
+
+
+# Functions
+def xml_text(value) -> str:
+
+    """Returns a value as XML element text."""
+
+    return html.escape(str(value), quote=False)
+
+
+# Formats by name
+EXPORTERS = {exporter.name: exporter for exporter in [JsonLinesExporter, LedgerExporter, UblExporter]}
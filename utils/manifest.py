@@ -0,0 +1,129 @@
+# Run manifests recording what each generated invoice was made from
+
+# Imports
+import hashlib
+import json
+import os
+from typing import Iterable, Iterator
+
+
+# Classes
+class RunManifest:
+
+    """
+    The client, items and input fingerprint of every invoice a batch run generated, along with the files it wrote. An
+    incremental run compares its invoices against the previous run's manifest and only regenerates those whose
+    fingerprint changed or whose files are missing.
+    """
+
+    def __init__(self, inputs: str | None = None, invoices: dict[int, dict] | None = None):
+
+        self.inputs = inputs  # Fingerprint of everything shared by all invoices of the run
+        self.invoices = invoices or {}  # Entries by invoice number
+        self.regenerated = 0
+
+    @classmethod
+    def load(cls, filename: str):
+
+        """Returns the manifest saved in a file, or an empty manifest if there is none."""
+
+        if not os.path.exists(filename):
+            return cls()
+
+        with open(filename) as file:
+            manifest = json.load(file)
+
+        invoices = {int(number): entry for number, entry in manifest["invoices"].items()}
+
+        return cls(inputs=manifest["inputs"], invoices=invoices)
+
+    def save(self, filename: str):
+
+        """Writes the manifest as JSON, replacing the previous one only once it is completely written."""
+
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        temporary = f"{filename}.tmp"
+
+        with open(temporary, "w") as file:
+            json.dump({"inputs": self.inputs, "invoices": self.invoices}, file)
+
+        os.replace(temporary, filename)
+
+    def record(self, templates: Iterable, inputs: str, extensions: list[str], previous=None) -> Iterator:
+
+        """
+        Records every template in the manifest as it passes through, along with its output files of the given
+        extensions, yielding only the templates that have to be generated: all of them without a previous manifest,
+        otherwise only those that changed since it.
+        """
+
+        self.inputs = inputs
+        reusable = previous is not None and previous.inputs == inputs
+
+        for template in templates:
+
+            entry = {
+                "client": template.client.name,
+                "items": [item.name for item in template.items],
+                "fingerprint": template.fingerprint,
+                "files": [f"{template.filename}{extension}" for extension in extensions],
+            }
+            self.invoices[template._id] = entry
+
+            if reusable and previous.invoices.get(template._id) == entry and all(map(os.path.exists, entry["files"])):
+                continue
+
+            self.regenerated += 1
+            yield template
+
+    @classmethod
+    def merge(cls, manifests: list):
+
+        """
+        Returns one manifest of every invoice in the given manifests, such as those written by the shards of a batch.
+        Raises a ValueError if they come from runs with different inputs or record the same invoice twice.
+        """
+
+        merged = cls(inputs=manifests[0].inputs if manifests else None)
+
+        for manifest in manifests:
+
+            if manifest.inputs != merged.inputs:
+                raise ValueError("Manifests come from runs with different issuers, terms, templates or options.")
+
+            duplicates = sorted(merged.invoices.keys() & manifest.invoices.keys())
+            if duplicates:
+                raise ValueError(f"Invoices recorded by more than one manifest: {', '.join(map(str, duplicates))}")
+
+            merged.invoices |= manifest.invoices
+
+        merged.invoices = dict(sorted(merged.invoices.items()))
+
+        return merged
+
+    def discard(self, numbers: Iterable[int]):
+
+        """Removes invoices from the manifest, e.g. those that failed, so that the next run generates them again."""
+
+        for number in numbers:
+            self.invoices.pop(number, None)
+
+
+# Functions
+def shard_filename(filename: str, shard: tuple[int, int] | None) -> str:
+
+    """Returns the filename with the shard added before its extension, e.g. manifest.2-of-4.json for shard (2, 4)."""
+
+    if shard is None:
+        return filename
+
+    root, extension = os.path.splitext(filename)
+
+    return f"{root}.{shard[0]}-of-{shard[1]}{extension}"
+
+
+def fingerprint(*parts) -> str:
+
+    """Returns a hash of JSON serializable parts, with anything else such as dates hashed as its string."""
+
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
@@ -0,0 +1,474 @@
+# Invoice layout drawn straight to PDF, without HTML or wkhtmltopdf
+
+# Imports
+import warnings
+import zlib
+from typing import BinaryIO
+
+# Constants
+NATIVE_VERSION = 2  # Layout of the drawn invoices, part of their cache keys
+PAGE_SIZES = {  # Points
+    "A4": (595.28, 841.89),
+    "A5": (419.53, 595.28),
+    "Letter": (612.0, 792.0),
+}
+
+# The layout is measured in CSS pixels of resources/invoice.html, whose 8.5in wide body is scaled to the page width
+LAYOUT_WIDTH = 816
+PADDING_X = 96
+PADDING_Y = 72
+CONTENT_WIDTH = LAYOUT_WIDTH - 2 * PADDING_X
+LINE_HEIGHT = 1.2  # Line height relative to the font size
+CHAR_WIDTH = 0.6  # Width of every Courier character relative to the font size
+
+INK = (0.149, 0.149, 0.161)  # #262629
+HIGHLIGHT = (0.847, 0.882, 0.914)  # #d8e1e9
+WHITE = (1.0, 1.0, 1.0)
+
+FONTS = {False: "F1", True: "F2"}  # Courier by boldness, monospaced like the template's Jetbrains Mono
+ITEM_COLUMNS = [0.45, 0.55 / 3, 0.55 / 3, 0.55 / 3]  # Fractions of the table width
+ITEM_HEADERS = ["Item", "Price", "Quantity", "Subtotal"]
+TOTALS_TITLE_WIDTH = 150
+
+
+# Classes
+class PdfDocument:
+
+    """
+    A PDF written to a binary file as it is drawn: each page is written out as soon as it is added, and only the
+    page references and bookmarks are kept until close writes the page tree, outline and cross-reference table.
+    """
+
+    def __init__(self, file: BinaryIO, page_size: tuple[float, float]):
+
+        self.file = file
+        self.width, self.height = page_size
+        self.offsets = {}  # File offsets by object number
+        self.pages = []  # Page object numbers
+        self.bookmarks = []  # Titles and page indexes
+
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+        self.pages_number = self.reserve()
+        self.fonts = {
+            FONTS[False]: self.add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>"),
+            FONTS[True]: self.add(
+                b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>"
+            ),
+        }
+
+    def reserve(self) -> int:
+
+        """Returns a new object number, whose object is written later."""
+
+        number = len(self.offsets) + 1
+        self.offsets[number] = None
+
+        return number
+
+    def add(self, body: bytes, number: int | None = None) -> int:
+
+        """Writes an object, under a reserved number if given, and returns its number."""
+
+        number = number or self.reserve()
+        self.offsets[number] = self.file.tell()
+        self.file.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+
+        return number
+
+    def add_page(self, content: str):
+
+        """Writes a page drawn by the content stream operators, which work in points from the bottom left corner."""
+
+        stream = zlib.compress(content.encode("ascii"))
+        content_number = self.add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (
+            len(stream), stream
+        ))
+
+        fonts = b" ".join(b"/%s %d 0 R" % (name.encode(), number) for name, number in self.fonts.items())
+        self.pages.append(self.add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] /Resources << /Font << %s >> >> /Contents %d 0 R >>"
+            % (self.pages_number, number_bytes(self.width), number_bytes(self.height), fonts, content_number)
+        ))
+
+    def bookmark(self, title: str):
+
+        """Adds a bookmark to the next page added."""
+
+        self.bookmarks.append((title, len(self.pages)))
+
+    def close(self):
+
+        """Writes the page tree, outline, catalog and cross-reference table, completing the file."""
+
+        kids = b" ".join(b"%d 0 R" % number for number in self.pages)
+        self.add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.pages)), self.pages_number)
+
+        outline = b""
+        if self.bookmarks:
+            outline = b" /Outlines %d 0 R /PageMode /UseOutlines" % self.__add_outline()
+
+        catalog = self.add(b"<< /Type /Catalog /Pages %d 0 R%s >>" % (self.pages_number, outline))
+
+        xref = self.file.tell()
+        self.file.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(self.offsets) + 1))
+        self.file.write(b"".join(b"%010d 00000 n \n" % self.offsets[number] for number in sorted(self.offsets)))
+        self.file.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(self.offsets) + 1, catalog, xref
+        ))
+
+    def __add_outline(self) -> int:
+
+        """Writes the outline with one entry per bookmark and returns its object number."""
+
+        outline = self.reserve()
+        items = [self.reserve() for _ in self.bookmarks]
+
+        for position, ((title, page), number) in enumerate(zip(self.bookmarks, items)):
+
+            links = b""
+            if position:
+                links += b" /Prev %d 0 R" % items[position - 1]
+            if position < len(items) - 1:
+                links += b" /Next %d 0 R" % items[position + 1]
+
+            self.add(
+                b"<< /Title <%s> /Parent %d 0 R%s /Dest [%d 0 R /XYZ null null null] >>"
+                % (("\ufeff" + title).encode("utf-16-be").hex().encode(), outline, links, self.pages[page]),
+                number
+            )
+
+        return self.add(
+            b"<< /Type /Outlines /First %d 0 R /Last %d 0 R /Count %d >>" % (items[0], items[-1], len(items)),
+            outline
+        )
+
+
+class Canvas:
+
+    """
+    Draws one invoice from top to bottom onto pages of a document, in CSS pixels from the top left corner of the
+    template layout. Anything that does not fit below y moves onto a new page.
+    """
+
+    def __init__(self, document: PdfDocument):
+
+        self.document = document
+        self.scale = document.width / LAYOUT_WIDTH
+        self.height = document.height / self.scale  # Page height in pixels
+        self.operators = []
+        self.y = PADDING_Y
+
+    def ensure(self, height: float):
+
+        """Starts a new page unless height more pixels fit below y."""
+
+        if self.y + height > self.height - PADDING_Y and self.y > PADDING_Y:
+            self.new_page()
+
+    def new_page(self):
+
+        """Adds the page drawn so far to the document and starts drawing on a new one."""
+
+        self.document.add_page(f"q {self.scale:.6f} 0 0 {self.scale:.6f} 0 0 cm\n" + "\n".join(self.operators) + "\nQ")
+        self.operators = []
+        self.y = PADDING_Y
+
+    def finish(self):
+        self.new_page()
+
+    def text(self, x: float, baseline: float, text: str, size: float, bold=False, color=INK):
+
+        """Draws a line of text starting at x, with its baseline at the given pixels from the top of the page."""
+
+        self.operators.append(
+            f"{color_operator(color)} BT /{FONTS[bold]} {size:g} Tf {x:.2f} {self.height - baseline:.2f} Td "
+            f"<{pdf_text(text)}> Tj ET"
+        )
+
+    def rectangle(self, x: float, y: float, width: float, height: float, color=INK):
+
+        """Fills a rectangle whose top left corner is at x and y."""
+
+        self.operators.append(
+            f"{color_operator(color)} {x:.2f} {self.height - y - height:.2f} {width:.2f} {height:.2f} re f"
+        )
+
+
+# Functions
+def draw_invoice(document: PdfDocument, layout: dict):
+
+    """
+    Draws an invoice onto new pages of the document, following resources/invoice.html: the header with the issuer,
+    client and invoice details, the item table, the totals, payment info, terms and conditions and a signature line.
+    The items of long invoices are split over pages, and only the last page runs on into the totals. The layout holds
+    the text of every template field and the item rows by page, as returned by Template.layout.
+    """
+
+    canvas = Canvas(document)
+    right = PADDING_X + CONTENT_WIDTH
+
+    # Title and brand name, sharing a baseline
+    canvas.text(PADDING_X, canvas.y + 50, "INVOICE", 50, bold=True)
+    brand = layout["brand-name"].upper()
+    canvas.text(right - text_width(brand, 30), canvas.y + 50, brand, 30, bold=True)
+    canvas.y += 50 * LINE_HEIGHT + 16
+
+    # Billing details on the left and invoice details on the right, with their first lines sharing a baseline
+    billing = [
+        ("BILL TO:", False),
+        (layout["company-name"].upper(), True),
+        (layout["address"], False),
+        (layout["location"], False),
+    ]
+    details = [layout["invoice-date"], layout["payment-date"], layout["invoice-number"]]
+    details_x = right - max(text_width(line, 12) for line in details + ["Invoice Details"])
+
+    for line, (text, bold) in enumerate(billing):
+        canvas.text(PADDING_X, canvas.y + 12 + line * 12 * LINE_HEIGHT, text, 12, bold=bold)
+
+    canvas.text(details_x, canvas.y + 12, "Invoice Details", 16, bold=True)
+    for line, text in enumerate(details):
+        canvas.text(details_x, canvas.y + 12 + 21 + (line + 1) * 12 * LINE_HEIGHT, text, 12)
+
+    canvas.y += 12 + 21 + 4 * 12 * LINE_HEIGHT + 32
+
+    draw_items(canvas, layout["items"], layout["carried-forward"])
+    canvas.y += 16
+
+    draw_totals(canvas, layout)
+    canvas.y += 32
+
+    # Payment info
+    lines = [layout[name] for name in ["pay-to", "account", "bank", "email", "phone"]]
+    draw_heading(canvas, "Payment Info", len(lines) * 14 * LINE_HEIGHT)
+    for text in lines:
+        canvas.text(PADDING_X, canvas.y + 14, text, 14)
+        canvas.y += 14 * LINE_HEIGHT
+
+    canvas.y += 32
+
+    # Terms and conditions, wrapped like the collapsed whitespace of the template's paragraph
+    lines = wrap(layout["terms-and-conditions"], CONTENT_WIDTH, 14)
+    draw_heading(canvas, "Terms and Conditions", 14 * LINE_HEIGHT)
+    for text in lines:
+        canvas.ensure(14 * LINE_HEIGHT)
+        canvas.text(PADDING_X, canvas.y + 14, text, 14)
+        canvas.y += 14 * LINE_HEIGHT
+
+    canvas.y += 80
+
+    # Signature line
+    canvas.ensure(18 * LINE_HEIGHT)
+    canvas.text(PADDING_X, canvas.y + 18, "SIGNATURE:", 18, bold=True)
+    start = PADDING_X + text_width("SIGNATURE:", 18) + 20
+    canvas.rectangle(start, canvas.y + 18, min(515, right - start), 2)
+
+    canvas.finish()
+
+
+def draw_heading(canvas: Canvas, text: str, following: float):
+
+    """Draws a section heading, kept on the same page as the given pixels of what follows it."""
+
+    canvas.ensure(18.72 * LINE_HEIGHT + 10 + following)
+    canvas.text(PADDING_X, canvas.y + 18.72, text, 18.72, bold=True)
+    canvas.y += 18.72 * LINE_HEIGHT + 10
+
+
+def draw_items(canvas: Canvas, pages: list[list[tuple[str, str, str, str, str]]], carried: list[str]):
+
+    """
+    Draws the item table, one table with a header row per page of items. Every page but the last ends with the subtotal
+    carried forward, which the next page starts with.
+    """
+
+    widths = [fraction * CONTENT_WIDTH for fraction in ITEM_COLUMNS]
+    starts = [PADDING_X + sum(widths[:column]) for column in range(len(widths))]
+
+    for page, rows in enumerate(pages):
+
+        if page:
+            canvas.new_page()
+
+        draw_item_header(canvas, starts, widths)
+
+        if page:
+            draw_forward_row(canvas, "Brought forward", carried[page - 1], starts)
+
+        for row in rows:
+            draw_item_row(canvas, row, starts, widths)
+
+        if page < len(pages) - 1:
+            draw_forward_row(canvas, "Carried forward", carried[page], starts)
+
+
+def draw_item_header(canvas: Canvas, starts: list[float], widths: list[float]):
+
+    """Draws the header row of the item table."""
+
+    height = 16 * LINE_HEIGHT + 20
+
+    canvas.ensure(height)
+    canvas.rectangle(PADDING_X, canvas.y, CONTENT_WIDTH, height)
+    for text, start, width in zip(ITEM_HEADERS, starts, widths):
+        canvas.text(start + (width - text_width(text, 16)) / 2, canvas.y + 10 + 16, text, 16, bold=True, color=WHITE)
+
+    canvas.y += height
+
+
+def draw_item_row(canvas: Canvas, row: tuple[str, str, str, str, str], starts: list[float], widths: list[float]):
+
+    """Draws an item's row of the item table, with its name and description wrapped to the first column."""
+
+    name, description, price, quantity, subtotal = row
+
+    names = wrap(name, widths[0] - 10, 16)
+    descriptions = wrap(description, widths[0] - 10, 12)
+    height = 21 + len(names) * 16 * LINE_HEIGHT + 5 + len(descriptions) * 12 * LINE_HEIGHT + 6
+
+    canvas.ensure(height)
+    canvas.rectangle(PADDING_X, canvas.y, CONTENT_WIDTH, height, HIGHLIGHT)
+
+    y = canvas.y + 21
+    for text in names:
+        canvas.text(starts[0] + 5, y + 16, text, 16, bold=True)
+        y += 16 * LINE_HEIGHT
+
+    y += 5
+    for text in descriptions:
+        canvas.text(starts[0] + 5, y + 12, text, 12)
+        y += 12 * LINE_HEIGHT
+
+    # The other cells are vertically centered
+    for text, start in zip([price, quantity, subtotal], starts[1:]):
+        canvas.text(start + 5, canvas.y + (height + 16) / 2 - 2, text, 16)
+
+    canvas.y += height
+
+
+def draw_forward_row(canvas: Canvas, title: str, subtotal: str, starts: list[float]):
+
+    """Draws a row of the item table with the subtotal carried from one page to the next."""
+
+    height = 16 * LINE_HEIGHT + 20
+
+    canvas.ensure(height)
+    canvas.rectangle(PADDING_X, canvas.y, CONTENT_WIDTH, height, HIGHLIGHT)
+    canvas.text(starts[0] + 5, canvas.y + 10 + 16, title, 16, bold=True)
+    canvas.text(starts[3] + 5, canvas.y + 10 + 16, subtotal, 16, bold=True)
+
+    canvas.y += height
+
+
+def draw_totals(canvas: Canvas, layout: dict):
+
+    """Draws the subtotal, tax and grand total, right-aligned under the item table."""
+
+    rows = [
+        ("Subtotal", layout["actual-subtotal"], False),
+        (layout["tax-percentage"], layout["tax"], False),
+        ("GRAND TOTAL", layout["grandtotal"], True),
+    ]
+
+    row_height = 16 * LINE_HEIGHT + 2
+    width = TOTALS_TITLE_WIDTH + max(text_width(amount, 16) for title, amount, highlight in rows) + 2
+    x = PADDING_X + CONTENT_WIDTH - width
+
+    canvas.ensure(len(rows) * row_height)
+
+    for title, amount, highlight in rows:
+
+        if highlight:
+            canvas.rectangle(x, canvas.y, width, row_height, HIGHLIGHT)
+
+        canvas.text(x + 1, canvas.y + 1 + 16, title, 16, bold=highlight)
+        canvas.text(x + TOTALS_TITLE_WIDTH + 1, canvas.y + 1 + 16, amount, 16)
+        canvas.y += row_height
+
+
+def wrap(text: str, width: float, size: float) -> list[str]:
+
+    """
+    Returns the text broken into lines that fit the width in pixels at the font size, breaking between words where
+    possible. Runs of whitespace are collapsed as HTML does.
+    """
+
+    columns = max(1, int(width / (size * CHAR_WIDTH)))
+    lines = []
+    line = ""
+
+    for word in str(text).split():
+
+        while len(word) > columns:  # Words longer than a line are broken wherever they reach its end
+            if line:
+                lines.append(line)
+                line = ""
+            lines.append(word[:columns])
+            word = word[columns:]
+
+        if not line:
+            line = word
+        elif len(line) + 1 + len(word) <= columns:
+            line += " " + word
+        else:
+            lines.append(line)
+            line = word
+
+    if line or not lines:
+        lines.append(line)
+
+    return lines
+
+
+def text_width(text: str, size: float) -> float:
+
+    """Returns the width of the text in pixels at the font size."""
+
+    return len(text) * size * CHAR_WIDTH
+
+
+def pdf_text(text: str) -> str:
+
+    """
+    Returns the text as a hexadecimal PDF string. The standard fonts only show Windows-1252, so any other character is
+    replaced with a question mark, with a warning naming it.
+    """
+
+    text = str(text)
+
+    try:
+        return text.encode("cp1252").hex()
+    except UnicodeEncodeError:
+        missing = "".join(sorted({character for character in text if not encodable(character)}))
+        warnings.warn(
+            f"Characters {missing} in {text!r} cannot be shown by the native renderer and are drawn as question marks."
+        )
+
+    return text.encode("cp1252", errors="replace").hex()
+
+
+def encodable(character: str) -> bool:
+
+    """Returns whether the character is in Windows-1252."""
+
+    try:
+        character.encode("cp1252")
+    except UnicodeEncodeError:
+        return False
+
+    return True
+
+
+def color_operator(color: tuple[float, float, float]) -> str:
+
+    """Returns the operator setting the fill color."""
+
+    return "%g %g %g rg" % color
+
+
+def number_bytes(number: float) -> bytes:
+
+    """Returns a number as PDF source."""
+
+    return b"%g" % number
@@ -0,0 +1,174 @@
+# Per-stage timing of the batch pipeline
+
+# Imports
+import collections
+import contextlib
+import json
+import time
+from typing import Iterable, Iterator
+
+# Constants
+PERCENTILES = [50, 95, 99]
+
+
+# Classes
+class Profiler:
+
+    """
+    Collects wall-clock durations for each stage of the batch pipeline. Stages are timed by wrapping them in
+    PROFILER.stage(name), which does nothing until the profiler is enabled. One stage can also be run under cProfile.
+    """
+
+    def __init__(self):
+
+        self.enabled = False
+        self.samples = collections.defaultdict(list)  # Durations in seconds by stage name
+        self.profiled_stage = None  # Stage run under cProfile, if any
+        self.profile = None
+        self.stats = []  # cProfile stats collected from worker processes
+        self.started = None
+
+    def enable(self, profiled_stage: str | None = None):
+
+        """
+        Starts timing stages, running profiled_stage under cProfile if given. Anything recorded before is dropped, such
+        as the samples a forked worker process inherits.
+        """
+
+        self.enabled = True
+        self.started = time.perf_counter()
+        self.samples.clear()
+        self.stats.clear()
+
+        if profiled_stage:
+            import cProfile
+
+            self.profiled_stage = profiled_stage
+            self.profile = cProfile.Profile()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator:
+
+        """Times the code run within the context as one sample of the named stage."""
+
+        if not self.enabled:
+            yield
+            return
+
+        profiling = name == self.profiled_stage
+        if profiling:
+            self.profile.enable()
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.samples[name].append(time.perf_counter() - start)
+
+            if profiling:
+                self.profile.disable()
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterator:
+
+        """Yields from the iterable, timing the production of each element as one sample of the named stage."""
+
+        iterator = iter(iterable)
+
+        while True:
+            with self.stage(name):
+                element = next(iterator, StopIteration)
+
+            if element is StopIteration:
+                return
+
+            yield element
+
+    def collect(self) -> dict:
+
+        """Returns and clears everything recorded so far, so a worker process can send it to the main process."""
+
+        stats = None
+        if self.profile:
+            self.profile.create_stats()
+            stats = self.profile.stats
+            self.profile.clear()
+
+        samples = dict(self.samples)
+        self.samples.clear()
+
+        return {"samples": samples, "stats": stats}
+
+    def merge(self, collected: dict):
+
+        """Adds what a worker process collected to this profiler."""
+
+        for name, durations in collected["samples"].items():
+            self.samples[name].extend(durations)
+
+        if collected["stats"]:
+            self.stats.append(collected["stats"])
+
+    def report(self) -> dict:
+
+        """Returns the count, total and latency percentiles of every stage, and the overall invoice throughput."""
+
+        elapsed = time.perf_counter() - self.started
+        invoices = len(self.samples.get("populate", [])) or len(self.samples.get("export", []))
+
+        stages = {}
+        for name, durations in self.samples.items():
+
+            durations = sorted(durations)
+            stages[name] = {"count": len(durations), "total_seconds": round(sum(durations), 6)}
+
+            for percentile in PERCENTILES:
+                stages[name][f"p{percentile}_ms"] = round(nearest_rank(durations, percentile) * 1000, 3)
+
+        return {
+            "invoices": invoices,
+            "elapsed_seconds": round(elapsed, 6),
+            "invoices_per_second": round(invoices / elapsed, 3) if elapsed else None,
+            "stages": stages,
+        }
+
+    def write_report(self, filename: str):
+
+        """Writes the report as JSON."""
+
+        with open(filename, "w") as file:
+            json.dump(self.report(), file, indent=4)
+
+    def dump_stats(self, filename: str):
+
+        """Writes the cProfile stats of the profiled stage from this process and every worker, for use with pstats."""
+
+        import pstats
+
+        self.merge(self.collect())
+        stats = pstats.Stats(*[CollectedStats(collected) for collected in self.stats])
+        stats.dump_stats(filename)
+
+
+class CollectedStats:
+
+    """cProfile stats sent from a worker, in the shape pstats.Stats loads profiles from."""
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+# Functions
+def nearest_rank(ordered: list[float], percentile: float) -> float:
+
+    """Returns the nearest-rank percentile of an ordered, non-empty list."""
+
+    rank = max(1, -(-percentile * len(ordered) // 100))  # Ceiling of percentile * n / 100
+
+    return ordered[int(rank) - 1]
+
+
+PROFILER = Profiler()  # Shared by every stage hook in this process
@@ -0,0 +1,147 @@
+# PDF rendering backends, selected per run
+
+# Imports
+import os
+import tempfile
+import warnings
+from abc import ABC, abstractmethod
+from typing import Iterable
+from utils.converter import ConversionJob, add_bookmarks, convert_chunk, merged_document, run_wkhtmltopdf_stream
+from utils.native import NATIVE_VERSION, PAGE_SIZES, PdfDocument, draw_invoice
+
+
+# Classes
+class Renderer(ABC):
+
+    """
+    Converts rendered invoices to PDF. Backends implement convert, which converts a chunk of invoices, and merge, which
+    converts a stream of invoices into a single PDF. Backends drawing the invoice themselves set layout, so that
+    conversion jobs carry the invoice's fields and item rows alongside its HTML.
+    """
+
+    name = None
+    layout = False
+
+    def __init__(self, options: dict):
+        self.options = options
+
+    @property
+    def settings(self) -> dict:
+
+        """Returns everything the PDFs depend on besides the invoices, for cache keys and run fingerprints."""
+
+        return self.options
+
+    @abstractmethod
+    def convert(self, jobs: list[ConversionJob], merged_file: str | None = None) -> dict[int, str]:
+
+        """
+        Converts a chunk of invoices, either to one PDF per invoice or merged into one PDF. Returns error messages by
+        invoice number.
+        """
+
+    @abstractmethod
+    def merge(self, jobs: Iterable[ConversionJob], filename: str, titles: dict[int, str] | None = None) -> str | None:
+
+        """
+        Converts invoices into a single PDF as they are rendered, each starting on a new page, with a bookmark per
+        invoice if given titles by invoice number. Returns an error message if no PDF was written.
+        """
+
+
+class PdfkitRenderer(Renderer):
+
+    """Converts the invoice HTML with wkhtmltopdf, using the options as its command line options."""
+
+    name = "pdfkit"
+
+    def convert(self, jobs: list[ConversionJob], merged_file: str | None = None) -> dict[int, str]:
+        return convert_chunk(jobs, self.options, merged_file)
+
+    def merge(self, jobs: Iterable[ConversionJob], filename: str, titles: dict[int, str] | None = None) -> str | None:
+
+        options = self.options
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            outline_file = os.path.join(directory, "outline.xml")
+
+            # The outline is only dumped to locate invoices, the bookmarks replace it
+            if titles is not None:
+                options = {key: value for key, value in self.options.items() if key != "no-outline"}
+                options["dump-outline"] = outline_file
+
+            error = run_wkhtmltopdf_stream(merged_document(job.html for job in jobs), filename, options)
+
+            if not error and titles is not None and not add_bookmarks(filename, outline_file, list(titles.values())):
+                warnings.warn(f"{filename} has no bookmarks, since its invoices could not be located in its outline.")
+
+        return error
+
+
+class NativeRenderer(Renderer):
+
+    """
+    Draws the invoice layout straight to PDF in this process, with no HTML parsing and no wkhtmltopdf. Only the
+    page-size option is used. Text is set in the standard Courier fonts, so nothing is embedded, and characters
+    outside Windows-1252 are shown as question marks, with a warning.
+    """
+
+    name = "native"
+    layout = True
+
+    def __init__(self, options: dict):
+
+        super().__init__(options)
+
+        if options.get("page-size", "A4") not in PAGE_SIZES:
+            raise ValueError(f"Page size {options['page-size']} is not one of {', '.join(PAGE_SIZES)}.")
+
+        self.page_size = PAGE_SIZES[options.get("page-size", "A4")]
+
+    @property
+    def settings(self) -> dict:
+        return {"renderer": self.name, "version": NATIVE_VERSION, "page-size": self.page_size}
+
+    def convert(self, jobs: list[ConversionJob], merged_file: str | None = None) -> dict[int, str]:
+
+        if merged_file:
+            error = self.merge(jobs, merged_file)
+            return {job.number: error for job in jobs} if error else {}
+
+        errors = {}
+
+        for job in jobs:
+            error = self.merge([job], job.pdf_file)
+            if error:
+                errors[job.number] = error
+
+        return errors
+
+    def merge(self, jobs: Iterable[ConversionJob], filename: str, titles: dict[int, str] | None = None) -> str | None:
+
+        try:
+            with open(filename, "wb") as file:
+
+                document = PdfDocument(file, self.page_size)
+
+                for job in jobs:
+                    if titles is not None:
+                        document.bookmark(titles[job.number])
+                    draw_invoice(document, job.layout)
+
+                document.close()
+
+        except OSError as error:
+
+            # A partly written PDF must not pass for a converted one
+            if os.path.exists(filename):
+                os.remove(filename)
+
+            return str(error)
+
+        return None
+
+
+# Backends by name
+RENDERERS = {renderer.name: renderer for renderer in [PdfkitRenderer, NativeRenderer]}
@@ -0,0 +1,135 @@
+# Concurrent wkhtmltopdf conversion on an asyncio event loop
+
+# Imports
+import asyncio
+from typing import Iterable
+from utils.cache import RenderCache
+from utils.converter import ConversionJob, conversion_error, discard, wkhtmltopdf_command
+from utils.profiling import PROFILER
+
+
+# Classes
+class ConversionScheduler:
+
+    """
+    Converts invoices with wkhtmltopdf processes run concurrently from an asyncio event loop. At most concurrency
+    processes run at once, a process still running after timeout seconds is killed, and a failed conversion is retried
+    up to retries times, waiting backoff seconds before the first retry and twice as long before each following one.
+
+    Jobs are only taken from their iterable once a process is free, so invoices are rendered while earlier ones are
+    still converting and no more than concurrency + 1 rendered invoices are held in memory.
+    """
+
+    def __init__(self, options: dict, concurrency: int = 4, timeout: float = 60.0, retries: int = 2, backoff=0.5):
+
+        assert type(concurrency) is int and concurrency >= 1, f"Concurrency {concurrency} is not a positive integer."
+        assert timeout > 0, f"Timeout of {timeout} seconds is not positive."
+        assert type(retries) is int and retries >= 0, f"Number of retries {retries} is not a non-negative integer."
+
+        self.options = options
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    def run(self, jobs: Iterable[ConversionJob], cache: RenderCache | None = None) -> dict[int, str]:
+
+        """
+        Converts every job, copying those whose HTML was converted before from the cache if given. Returns error
+        messages by invoice number.
+        """
+
+        return asyncio.run(self.__run(jobs, cache))
+
+    async def __run(self, jobs: Iterable[ConversionJob], cache: RenderCache | None) -> dict[int, str]:
+
+        slots = asyncio.Semaphore(self.concurrency)
+        pending = set()
+        exceptions = []
+        errors = {}
+
+        def finished(task: asyncio.Task):
+            pending.discard(task)
+            if not task.cancelled() and task.exception():
+                exceptions.append(task.exception())
+
+        for job in jobs:
+
+            if exceptions:
+                break
+
+            key = None
+            if cache:
+                with PROFILER.stage("cache_lookup"):
+                    key = cache.key(job.html, self.options)
+                    if cache.get(key, job.pdf_file):
+                        continue
+
+            await slots.acquire()
+
+            task = asyncio.create_task(self.__convert(job, cache, key, slots, errors))
+            pending.add(task)
+            task.add_done_callback(finished)
+
+            await asyncio.sleep(0)  # Let running conversions progress before rendering the next invoice
+
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        if exceptions:
+            raise exceptions[0]
+
+        return errors
+
+    async def __convert(
+            self,
+            job: ConversionJob,
+            cache: RenderCache | None,
+            key: str | None,
+            slots: asyncio.Semaphore,
+            errors: dict[int, str]
+    ):
+
+        """Converts one invoice, retrying with backoff, and records its error if every attempt failed."""
+
+        try:
+            with PROFILER.stage("pdf_conversion"):
+
+                for attempt in range(self.retries + 1):
+
+                    if attempt:
+                        await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+
+                    error = await self.__attempt(job)
+                    if error is None:
+                        break
+
+            if error:
+                errors[job.number] = f"{error} Gave up after {attempt + 1} attempts." if attempt else error
+            elif cache:
+                with PROFILER.stage("cache_store"):
+                    cache.put(key, job.pdf_file)
+
+        finally:
+            slots.release()
+
+    async def __attempt(self, job: ConversionJob) -> str | None:
+
+        """Runs wkhtmltopdf once, piping it the invoice's HTML. Returns an error message if no PDF was written."""
+
+        process = await asyncio.create_subprocess_exec(
+            *wkhtmltopdf_command(job.pdf_file, self.options),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+        try:
+            output, stderr = await asyncio.wait_for(process.communicate(job.html.encode()), self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            discard(job.pdf_file)
+
+            return f"wkhtmltopdf was killed after running for {self.timeout:g} seconds."
+
+        return conversion_error(job.pdf_file, stderr.decode(errors="replace").strip(), process.returncode)
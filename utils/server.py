@@ -0,0 +1,289 @@
+# Long-lived local render server keeping the catalog and compiled template loaded between invoices
+
+# Imports
+import contextlib
+import http.server
+import importlib
+import json
+import os
+import socketserver
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import STYLE_FILE, TEMPLATE_FILE, Catalog, Template
+from utils.compiled import CompiledTemplate
+from utils.converter import ConversionJob
+from utils.renderers import Renderer
+
+# Constants
+INVOICES_PATH = "/invoices"
+HEALTH_PATH = "/health"
+MAX_REQUEST_SIZE = 1024 ** 2  # Bytes of JSON accepted per invoice request
+
+
+# Classes
+class InvoiceRenderer:
+
+    """
+    Renders invoice requests with a catalog and the compiled template that stay loaded for the life of the server.
+    Templates are built one at a time, since the catalog and the invoice count are shared, while rendering and
+    conversion by the renderer run on a pool of worker threads.
+    """
+
+    def __init__(self, catalog: Catalog, renderer: Renderer, workers: int = 4):
+
+        assert type(workers) is int and workers >= 1, f"Number of workers {workers} is not a positive integer."
+
+        self.catalog = catalog
+        self.renderer = renderer
+        self.pool = ThreadPoolExecutor(workers)
+        self.lock = threading.Lock()
+
+        # Everything a first request would otherwise load is loaded now
+        CompiledTemplate.compile(TEMPLATE_FILE, STYLE_FILE)
+        if renderer.name == "pdfkit":
+            importlib.import_module("pdfkit")
+
+    def template(self, request: dict) -> Template:
+
+        """
+        Returns the template for a JSON invoice request of the form
+        {"client": name, "due": "yyyy-mm-dd", "items": [{"item": name, "quantity": n}, ...]} with an optional
+        "number" and "tax_percentage". A request kept in the output directory with "output": "path" must give its
+        number, since the count of a server starts over and would name the files of invoices created before. Raises a
+        ValueError describing anything wrong with the request.
+        """
+
+        if type(request) is not dict:
+            raise ValueError("Invoice request must be a JSON object.")
+
+        number = request.get("number")
+        if number is not None and type(number) is not int:
+            raise ValueError(f"Invoice number {number!r} is not an integer.")
+        if number is None and request.get("output") == "path":
+            raise ValueError('Invoice requests with "output": "path" must give their invoice "number".')
+
+        try:
+            lines = [(line["item"], line["quantity"]) for line in request["items"]]
+        except (KeyError, TypeError) as error:
+            raise ValueError(f"Invoice request must have a client, a due date and items, missing {error}.")
+
+        with self.lock:
+
+            try:
+                client = self.catalog.find_client(request["client"])
+                items = self.catalog.find_items([name for name, quantity in lines])
+
+                return Template(
+                    client,
+                    [item.with_quantity(quantity) for item, (name, quantity) in zip(items, lines)],
+                    due=request["due"],
+                    tax_percentage=request.get("tax_percentage", 13.0),
+                    number=number
+                )
+
+            except KeyError as error:
+                raise ValueError(f"Invoice request must have a client, a due date and items, missing {error}.")
+            except (AssertionError, TypeError) as error:
+                raise ValueError(str(error) or "Invoice request has a value of the wrong type.")
+
+    def render(self, template: Template, keep: bool) -> tuple[str | None, bytes | str]:
+
+        """
+        Converts the invoice to PDF on the worker pool. Returns an error message, or None and either the path of the
+        PDF kept in the output directory if keep is set or the PDF itself. Raises a FileExistsError rather than
+        replacing a PDF already kept in the output directory.
+        """
+
+        return self.pool.submit(self.__render, template, keep).result()
+
+    def __render(self, template: Template, keep: bool) -> tuple[str | None, bytes | str]:
+
+        if not keep:
+            return self.__answer(template, None)
+
+        pdf_file = os.path.abspath(f"{template.filename}.pdf")
+        os.makedirs(os.path.dirname(pdf_file), exist_ok=True)
+
+        # Held until the PDF replaces it, so neither an earlier invoice nor a concurrent request for it is overwritten
+        open(pdf_file, "x").close()
+
+        # Renderers remove whatever is at the path they write to, so they write next to the claim instead
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(pdf_file), suffix=".tmp")
+        os.close(descriptor)
+
+        error, result = self.__answer(template, temporary)
+
+        if not error:
+            try:
+                os.replace(temporary, pdf_file)
+                return None, pdf_file
+            except OSError as replace_error:
+                error = f"Invoice {template._id} could not be kept: {replace_error}"
+
+        for path in [temporary, pdf_file]:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+        return error, result
+
+    def __answer(self, template: Template, pdf_file: str | None) -> tuple[str | None, bytes | str]:
+
+        """Converts the invoice to the PDF file if given, otherwise returns the PDF, answering any failure."""
+
+        try:
+            return self.__convert(template, pdf_file)
+        except Exception as error:  # Answered like a failed conversion rather than dropping the connection
+            return f"Invoice {template._id} could not be rendered: {error}", b""
+
+    def __convert(self, template: Template, pdf_file: str | None) -> tuple[str | None, bytes | str]:
+
+        html = template.render()
+        layout = template.layout() if self.renderer.layout else None
+
+        if pdf_file:
+            errors = self.renderer.convert([ConversionJob(template._id, html, pdf_file, layout=layout)])
+
+            return errors.get(template._id), pdf_file
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            pdf_file = os.path.join(directory, "invoice.pdf")
+            errors = self.renderer.convert([ConversionJob(template._id, html, pdf_file, layout=layout)])
+
+            if errors:
+                return errors[template._id], b""
+
+            with open(pdf_file, "rb") as file:
+                return None, file.read()
+
+    def close(self):
+        self.pool.shutdown()
+
+
+class InvoiceRequestHandler(http.server.BaseHTTPRequestHandler):
+
+    """
+    Answers POST /invoices with the invoice's PDF, or with {"invoice": number, "path": path} if the request asks for
+    "output": "path", and GET /health with {"status": "ok"}. Problems are answered with {"error": message}.
+    """
+
+    protocol_version = "HTTP/1.1"  # Keeps connections open between requests
+
+    def setup(self):
+
+        # Responses are written as headers then body, which Nagle's algorithm would hold back on TCP connections
+        self.disable_nagle_algorithm = type(self.client_address) is tuple
+
+        super().setup()
+
+    def do_GET(self):
+
+        if self.path != HEALTH_PATH:
+            return self.send_json(404, {"error": f"No such path {self.path}."})
+
+        self.send_json(200, {"status": "ok"})
+
+    def do_POST(self):
+
+        if self.path != INVOICES_PATH:
+            return self.send_json(404, {"error": f"No such path {self.path}."})
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_SIZE:
+            self.close_connection = True
+            return self.send_json(413, {"error": f"Invoice requests are limited to {MAX_REQUEST_SIZE} bytes."})
+
+        try:
+            request = json.loads(self.rfile.read(length))
+            template = self.server.renderer.template(request)
+        except ValueError as error:  # Including invalid JSON
+            return self.send_json(400, {"error": str(error)})
+
+        keep = request.get("output", "pdf") == "path"
+
+        try:
+            error, result = self.server.renderer.render(template, keep)
+        except FileExistsError:
+            return self.send_json(409, {"invoice": template._id, "error": f"Invoice {template._id} already exists."})
+        except OSError as error:  # The output directory could not be written
+            return self.send_json(500, {"invoice": template._id, "error": str(error)})
+
+        if error:
+            return self.send_json(500, {"invoice": template._id, "error": error})
+
+        if keep:
+            return self.send_json(200, {"invoice": template._id, "path": result})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(result)))
+        self.send_header("X-Invoice-Number", str(template._id))
+        self.end_headers()
+        self.wfile.write(result)
+
+    def send_json(self, status: int, body: dict):
+
+        """Sends a JSON response."""
+
+        content = json.dumps(body).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def address_string(self) -> str:
+
+        # Clients of a Unix socket have no address
+        return self.client_address[0] if type(self.client_address) is tuple else "local"
+
+
+class InvoiceHTTPServer(http.server.ThreadingHTTPServer):
+
+    """Serves invoice requests over TCP."""
+
+    def __init__(self, address: tuple[str, int], renderer: InvoiceRenderer):
+        super().__init__(address, InvoiceRequestHandler)
+        self.renderer = renderer
+
+
+class InvoiceUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    """Serves invoice requests over a Unix socket, replacing any socket file left behind at its path."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, renderer: InvoiceRenderer):
+
+        if os.path.exists(path):
+            os.remove(path)
+
+        super().__init__(path, InvoiceRequestHandler)
+        self.renderer = renderer
+
+    def server_close(self):
+        super().server_close()
+        os.remove(self.server_address)
+
+
+# Functions
+def serve(renderer: InvoiceRenderer, host: str = "127.0.0.1", port: int = 8000, socket_path: str | None = None):
+
+    """Serves invoice requests on the socket path if given, otherwise on the host and port, until interrupted."""
+
+    if socket_path:
+        server = InvoiceUnixServer(socket_path, renderer)
+        print(f"Serving invoices on {socket_path}.")
+    else:
+        server = InvoiceHTTPServer((host, port), renderer)
+        print(f"Serving invoices on http://{host}:{server.server_address[1]}.")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        renderer.close()
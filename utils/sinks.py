@@ -0,0 +1,144 @@
+# Output layouts and sinks placing the files of a batch and indexing where every invoice went
+
+# Imports
+import csv
+import datetime as dt
+import hashlib
+import os
+
+# Constants
+INDEX_HEADER = ["invoice", "file", "member"]
+ARCHIVE_BUFFER = 1024 ** 2  # Bytes of archive output buffered between writes to disk
+
+
+# Classes
+class OutputSink:
+
+    """
+    Records where the files of every generated invoice were put in a CSV index with an invoice, file and archive member
+    column, so an invoice is found without scanning the output directory. Files stay where they were written. An
+    appending sink, e.g. for an incremental run, adds rows for the invoices generated again to the index of an earlier
+    run, and the last row of an invoice wins.
+    """
+
+    def __init__(self, index_file: str, append=False):
+
+        os.makedirs(os.path.dirname(os.path.abspath(index_file)), exist_ok=True)
+
+        write_header = not (append and os.path.exists(index_file))
+
+        self.index = open(index_file, "a" if append else "w", newline="")
+        self.writer = csv.writer(self.index)
+
+        if write_header:
+            self.writer.writerow(INDEX_HEADER)
+
+    def add(self, number: int, files: list[str]):
+
+        """Records the files written for an invoice."""
+
+        self.writer.writerows([number, filename, ""] for filename in files)
+
+    def close(self):
+        self.index.close()
+
+
+class ArchiveSink(OutputSink):
+
+    """
+    Moves the files of every generated invoice into a zip or tar archive as they are recorded, named by their path
+    relative to the archive's directory, so the output directory only holds the invoices still being converted. The
+    archive is written through a large buffer and left uncompressed, since PDFs are compressed already. Files shared
+    by several invoices, such as merged chunks, are archived once.
+    """
+
+    def __init__(self, index_file: str, archive_file: str):
+
+        import tarfile
+        import zipfile
+
+        super().__init__(index_file)
+
+        self.archive_file = archive_file
+        self.directory = os.path.dirname(os.path.abspath(archive_file))
+        self.archived = {}  # Members by the filename they were moved from
+        self.emptied = set()  # Directories files were moved out of
+
+        self.file = open(archive_file, "wb", buffering=ARCHIVE_BUFFER)
+
+        self.tar = archive_file.endswith(".tar")
+
+        if archive_file.endswith(".zip"):
+            self.archive = zipfile.ZipFile(self.file, "w", zipfile.ZIP_STORED)
+        elif self.tar:
+            self.archive = tarfile.open(fileobj=self.file, mode="w")
+        else:
+            self.file.close()
+            raise ValueError(f"Archive {archive_file} is neither a .zip nor a .tar file.")
+
+    def add(self, number: int, files: list[str]):
+
+        for filename in files:
+
+            if filename not in self.archived:
+                self.archived[filename] = self.__move(filename)
+
+            self.writer.writerow([number, self.archive_file, self.archived[filename]])
+
+    def __move(self, filename: str) -> str:
+
+        """Moves a file into the archive, returning its member name."""
+
+        member = os.path.relpath(os.path.abspath(filename), self.directory).replace(os.sep, "/")
+
+        if self.tar:  # Written strictly sequentially, so nothing is ever rewritten in place
+            with open(filename, "rb") as file:
+                self.archive.addfile(self.archive.gettarinfo(filename, member), file)
+        else:
+            self.archive.write(filename, member)
+
+        os.remove(filename)
+        self.emptied.add(os.path.dirname(os.path.abspath(filename)))
+
+        return member
+
+    def close(self):
+
+        self.archive.close()
+        self.file.close()
+        super().close()
+
+        # Remove the layout's directories once everything in them is archived, never going above the archive's
+        for directory in sorted(self.emptied, reverse=True):
+            while directory.startswith(self.directory + os.sep):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break  # Still holds other files
+                directory = os.path.dirname(directory)
+
+
+# Functions
+def flat_directory(number: int, due: dt.date) -> str:
+
+    """Puts every invoice straight in the output directory."""
+
+    return ""
+
+
+def hash_directory(number: int, due: dt.date) -> str:
+
+    """Spreads invoices evenly over 256 directories named by the first byte of a hash of their number."""
+
+    return hashlib.md5(str(number).encode()).hexdigest()[:2]
+
+
+def date_directory(number: int, due: dt.date) -> str:
+
+    """Groups invoices in year, month and day directories by their due date, which stays the same between runs."""
+
+    return os.path.join(f"{due.year:04d}", f"{due.month:02d}", f"{due.day:02d}")
+
+
+# Layouts by name
+LAYOUTS = {"flat": flat_directory, "hash": hash_directory, "date": date_directory}
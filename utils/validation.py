@@ -0,0 +1,189 @@
+# Whole-batch validation before anything is rendered
+
+# Imports
+import csv
+import json
+from utils import ISO_DATE_RE, Catalog
+from utils.batch import LONG_COLUMNS, QUANTITY_RE, is_long_csv
+from utils.profiling import PROFILER
+
+
+# Functions
+def validate_batch(filename: str, catalog: Catalog) -> list[str]:
+
+    """
+    Checks a whole batch file against the catalog before any invoice is rendered: that every client and item exists,
+    every quantity is a non-negative integer, every due date is a real ISO date and that the rows of each invoice are
+    consecutive and agree on client and due date. Returns every problem found, in file order, each naming where in the
+    file it is. The checks run on whole columns at once, so the whole batch is held in memory while they do.
+    """
+
+    import pandas as pd
+
+    with PROFILER.stage("validation"):
+
+        rows = batch_frame(filename)
+        problems = []  # Row positions and messages
+
+        def report(mask: "pd.Series", message, field="line"):
+            """
+            Adds a problem for every row in the mask, only building messages for those rows, located at the line the
+            field was read from.
+            """
+            reported = rows.loc[mask[mask].index]
+            if len(reported):
+                problems.extend(zip(reported.index, locations(reported, filename, field) + ": " + message(reported)))
+
+        # Rows opening an invoice, which the client and due date checks are made on
+        starts = rows.invoice != rows.invoice.shift()
+        firsts = rows[starts]
+
+        for column in ["invoice", "client", "due"]:
+            checked = rows if column == "invoice" else firsts
+            report(checked[column] == "", lambda reported: f"missing {column}.", column)
+
+        report(
+            firsts.invoice.duplicated() & (firsts.invoice != ""),
+            lambda reported: "rows of invoice " + reported.invoice + " are not consecutive."
+        )
+
+        report(
+            ~starts & ((rows.client != rows.client.shift()) | (rows.due != rows.due.shift())),
+            lambda reported: "invoice " + reported.invoice + " changes client or due date between rows."
+        )
+
+        unknown = catalog.find_unknown(firsts.client[firsts.client != ""].unique(), "client")
+        report(firsts.client.isin(unknown), lambda reported: "unknown client " + reported.client + ".", "client")
+
+        # Each distinct due date is checked once, and the pattern alone lets through dates such as February 31st
+        dues = pd.Series(firsts.due.unique())
+        real = pd.to_datetime(dues, format="%Y-%m-%d", errors="coerce").notna()
+        invalid = dues[(dues != "") & ~(dues.str.match(ISO_DATE_RE).astype(bool) & real)]
+        report(
+            firsts.due.isin(invalid),
+            lambda reported: "due date " + reported.due + " is not a valid ISO date (yyyy-mm-dd).",
+            "due"
+        )
+
+        lines = rows[rows.item != ""]
+
+        unknown = catalog.find_unknown(lines.item.unique(), "item")
+        report(lines.item.isin(unknown), lambda reported: "unknown item " + reported.item + ".")
+
+        quantities = pd.Series(lines.quantity.unique())
+        invalid = quantities[~quantities.str.fullmatch(QUANTITY_RE).astype(bool)]
+        report(
+            lines.quantity.isin(invalid),
+            lambda reported: "quantity " + reported.quantity.where(reported.quantity != "", "(missing)") + " of item "
+            + reported.item + " is not a non-negative integer."
+        )
+
+    return [message for position, message in sorted(problems, key=lambda problem: problem[0])]
+
+
+def locations(rows: "pd.DataFrame", filename: str, field="line") -> "pd.Series":
+
+    """
+    Returns where in the batch file the field of each row was read from, by line for the long format and by column
+    and line for the wide format, whose client and due date are read from lines of their own.
+    """
+
+    if "column" not in rows:
+        return "Line " + rows.line.astype(str) + f" of {filename}"
+
+    lines = rows[f"{field}_line"] if f"{field}_line" in rows else rows.line
+    cells = (", line " + lines.astype(str)).where(lines > 0, "")
+
+    return "Column " + rows.column.astype(str) + cells + f" of {filename}"
+
+
+def batch_frame(filename: str) -> "pd.DataFrame":
+
+    """
+    Returns every line item of a batch file in any format as a long format dataframe of strings, with empty strings
+    for missing values and an empty item for invoices without line items. Each row keeps the line it was read from,
+    and for the wide format its column and the lines of its client and due date, with line 0 for invoices without line
+    items.
+    """
+
+    import pandas as pd
+
+    if filename.endswith(".jsonl"):
+
+        with open(filename) as file:
+            numbered = [(line, text) for line, text in enumerate(file, start=1) if text.strip()]
+
+        # Parsing all lines as one JSON array is much faster than parsing them one at a time
+        records = json.loads(f"[{','.join(text for line, text in numbered)}]")
+
+        rows = pd.DataFrame(records, columns=LONG_COLUMNS, dtype=object).fillna("").astype(str).astype(object)
+        rows["line"] = [line for line, text in numbered]
+
+        return rows
+
+    if ".csv" not in filename:
+        raise ValueError("Batch file must be a .csv or .jsonl file.")
+
+    if is_long_csv(filename):
+
+        rows = pd.read_csv(filename, dtype=object, keep_default_na=False, skipinitialspace=True)
+        rows.columns = LONG_COLUMNS
+        rows["line"] = record_lines(filename, skipinitialspace=True)[1:]  # After the header
+
+        return rows
+
+    return wide_batch_frame(filename)
+
+
+def wide_batch_frame(filename: str) -> "pd.DataFrame":
+
+    """Returns the line items of a wide format batch CSV as a long format dataframe, as batch_frame does."""
+
+    import pandas as pd
+
+    batches = pd.read_csv(filename, dtype=object)
+    records = record_lines(filename)  # Lines of the header and every row pandas read
+
+    # Invoices are numbered by column, and each column ends at its first empty cell
+    clients = [header.split(".")[0] for header in batches.columns]
+    batches.columns = range(1, len(batches.columns) + 1)
+    cells = batches.where(batches.notna().cummin())
+
+    invoices = pd.DataFrame({
+        "invoice": cells.columns.astype(str),
+        "client": clients,
+        "due": cells.iloc[0].fillna("").values if len(cells) else "",
+        "client_line": records[0],
+        "due_line": records[1] if len(cells) else 0,
+    }, index=cells.columns)
+
+    lines = cells.iloc[1:].melt(var_name="column", value_name="cell", ignore_index=False).dropna()
+    parts = lines.cell.str.rsplit(",", n=1, expand=True).reindex(columns=[0, 1]).fillna("").astype(str)
+
+    lines = pd.DataFrame({
+        "column": lines.column.values,
+        "line": [records[index + 1] for index in lines.index],  # After the header
+        "item": parts[0].values,
+        "quantity": parts[1].str.strip().values,
+    })
+
+    # Invoices without line items keep one row with an empty item
+    empty = invoices.index.difference(lines.column)
+    lines = pd.concat([lines, pd.DataFrame({"column": empty, "line": 0, "item": "", "quantity": ""})])
+
+    rows = lines.join(invoices, on="column").sort_values(["column"], kind="stable")
+
+    return rows[LONG_COLUMNS + ["line", "column", "client_line", "due_line"]].reset_index(drop=True)
+
+
+def record_lines(filename: str, **options) -> list[int]:
+
+    """
+    Returns the line of a CSV file each record ends on, leaving out the blank lines pandas skips, so that the records
+    pandas reads are located in the file even when they are quoted over several lines or follow blank lines. The
+    options are those of the csv reader, matching those pandas read the file with.
+    """
+
+    with open(filename, newline="") as file:
+        reader = csv.reader(file, **options)
+        return [reader.line_num for row in reader if len(row) > 1 or row and row[0].strip()]